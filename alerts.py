@@ -0,0 +1,267 @@
+import os
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from app import db
+from models import PriceAlert, User, Subscription
+
+# Seconds between reloads of the alert rules (picks up edits from other processes)
+PRICE_ALERT_RELOAD_INTERVAL = float(os.environ.get("PRICE_ALERT_RELOAD_INTERVAL", "60"))
+
+AlertRule = namedtuple('AlertRule', 'id user_id symbol kind threshold cooldown_minutes')
+
+def alert_level(rule, reference):
+    """Price at which a rule fires; None for percent rules without a previous close"""
+    if rule.kind in ('price_above', 'price_below'):
+        return rule.threshold
+    if not reference:
+        return None
+    if rule.kind == 'percent_up':
+        return reference * (1 + rule.threshold / 100)
+    return reference * (1 - rule.threshold / 100)
+
+class LevelIndex:
+    """
+    Sorted trigger levels (array('d')) with the rule at each level.
+    The rules crossed between two prices are a contiguous slice found
+    with two bisections.
+    """
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self.levels = array('d', (level for level, _ in entries))
+        self.rules = [rule for _, rule in entries]
+
+    def __len__(self):
+        return len(self.levels)
+
+    def crossed_up(self, previous, current):
+        """Rules with previous < level <= current"""
+        return self.rules[bisect_right(self.levels, previous):bisect_right(self.levels, current)]
+
+    def crossed_down(self, previous, current):
+        """Rules with current <= level < previous"""
+        return self.rules[bisect_left(self.levels, current):bisect_left(self.levels, previous)]
+
+class SymbolAlerts:
+    """Upward and downward crossing indexes for one symbol at one reference close"""
+
+    def __init__(self, rules, reference):
+        self.reference = reference
+        up, down = [], []
+        for rule in rules:
+            level = alert_level(rule, reference)
+            if level is None:
+                continue
+            if rule.kind in ('price_above', 'percent_up'):
+                up.append((level, rule))
+            else:
+                down.append((level, rule))
+        self.up = LevelIndex(up)
+        self.down = LevelIndex(down)
+
+    def matches(self, previous, current):
+        if current > previous:
+            return self.up.crossed_up(previous, current)
+        if current < previous:
+            return self.down.crossed_down(previous, current)
+        return []
+
+class AlertEngine:
+    """
+    Evaluates user alerts against every new quote in this process.
+    Rules are held in memory as per-symbol LevelIndexes, so a tick costs
+    two bisections plus the matches rather than a scan over every rule.
+    An alert fires when the price crosses its level between two quotes.
+    Matches are claimed in the DB with a conditional UPDATE on
+    last_triggered_at (the cooldown), so when several processes see the
+    same crossing only one sends; claimed alerts are grouped into one
+    text per user. Loading and sending run on a background thread and
+    never block the quote path.
+    """
+
+    def __init__(self, app, reload_interval=None):
+        self.app = app
+        self.reload_interval = reload_interval or PRICE_ALERT_RELOAD_INTERVAL
+        self._lock = threading.Lock()
+        self._rules_by_symbol = {}
+        self._indexes = {}
+        self._last_price = {}
+        self._fired_at = {}
+        self._loaded_at = None
+        self._reload_pending = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alerts')
+        self.ticks = 0
+        self.matched = 0
+        self.fired = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _schedule_reload(self):
+        with self._lock:
+            stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_interval
+            if not stale or self._reload_pending:
+                return
+            self._reload_pending = True
+        self._executor.submit(self._reload)
+
+    def _reload(self):
+        try:
+            with self.app.app_context():
+                self.load()
+        except Exception as e:
+            logging.error(f"Error loading price alerts: {e}")
+        finally:
+            with self._lock:
+                self._reload_pending = False
+
+    def load(self):
+        """Read every active alert of an active, subscribed user; needs an app context"""
+        rows = db.session.query(
+            PriceAlert.id, PriceAlert.user_id, PriceAlert.symbol, PriceAlert.kind,
+            PriceAlert.threshold, PriceAlert.cooldown_minutes
+        ).join(User, User.id == PriceAlert.user_id).join(
+            Subscription, Subscription.user_id == PriceAlert.user_id
+        ).filter(
+            PriceAlert.is_active.is_(True),
+            User.is_active.is_(True),
+            Subscription.is_active.is_(True),
+        ).all()
+        db.session.commit()
+
+        rules_by_symbol = {}
+        for row in rows:
+            rules_by_symbol.setdefault(row.symbol, []).append(AlertRule(*row))
+        with self._lock:
+            self._rules_by_symbol = rules_by_symbol
+            self._indexes = {}
+            self._loaded_at = time.monotonic()
+        return len(rows)
+
+    def on_quote(self, symbol, price, reference=None):
+        """
+        Check one new quote; reference is the previous session close used by
+        percent rules. Returns the rules matched (sent in the background).
+        """
+        self._schedule_reload()
+        if price is None:
+            return []
+
+        with self._lock:
+            self.ticks += 1
+            previous = self._last_price.get(symbol)
+            self._last_price[symbol] = price
+            if previous is None:
+                return []
+
+            index = self._indexes.get(symbol)
+            if index is None or index.reference != reference:
+                index = SymbolAlerts(self._rules_by_symbol.get(symbol, []), reference)
+                self._indexes[symbol] = index
+
+            now = time.monotonic()
+            matches = [
+                rule for rule in index.matches(previous, price)
+                if now - self._fired_at.get(rule.id, float('-inf')) >= rule.cooldown_minutes * 60
+            ]
+            for rule in matches:
+                self._fired_at[rule.id] = now
+            self.matched += len(matches)
+
+        if matches:
+            self._executor.submit(self._fire, symbol, price, reference, matches)
+        return matches
+
+    def _fire(self, symbol, price, reference, rules):
+        with self.app.app_context():
+            try:
+                self.fire(symbol, price, reference, rules)
+            except Exception as e:
+                logging.error(f"Error sending price alerts for {symbol}: {e}")
+                db.session.rollback()
+
+    def claim(self, rules):
+        """Start the cooldown of each rule in the DB; returns the rules this process won"""
+        now = datetime.utcnow()
+        claimed = []
+        for rule in rules:
+            cutoff = now - timedelta(minutes=rule.cooldown_minutes)
+            result = db.session.execute(
+                PriceAlert.__table__.update().where(
+                    PriceAlert.id == rule.id,
+                    PriceAlert.is_active.is_(True),
+                    or_(PriceAlert.last_triggered_at.is_(None), PriceAlert.last_triggered_at <= cutoff)
+                ).values(last_triggered_at=now)
+            )
+            if result.rowcount:
+                claimed.append(rule)
+        db.session.commit()
+        return claimed
+
+    def fire(self, symbol, price, reference, rules):
+        """Claim matched rules and send one text per user; returns texts sent"""
+        from sms_service import send_alert_messages
+
+        claimed = self.claim(rules)
+        if not claimed:
+            return 0
+
+        by_user = {}
+        for rule in claimed:
+            by_user.setdefault(rule.user_id, []).append(rule)
+        phones = dict(db.session.query(User.id, User.phone_number).filter(User.id.in_(list(by_user))).all())
+
+        messages = {}
+        for user_id, user_rules in by_user.items():
+            phone_number = phones.get(user_id)
+            if phone_number:
+                messages[phone_number] = format_alert_message(symbol, price, reference, user_rules)
+
+        sent = send_alert_messages(messages, price)
+        self.fired += sent
+        logging.info(f"Price alerts for {symbol} at ${price:.2f}: {len(claimed)} alerts, {sent} texts sent")
+        return sent
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rules': sum(len(rules) for rules in self._rules_by_symbol.values()),
+                'symbols': sorted(self._rules_by_symbol),
+                'ticks': self.ticks,
+                'matched': self.matched,
+                'fired': self.fired,
+            }
+
+def format_alert_message(symbol, price, reference, rules):
+    """One SMS body for all of a user's alerts triggered by a quote"""
+    parts = []
+    for rule in rules:
+        if rule.kind == 'price_above':
+            parts.append(f"above ${rule.threshold:.2f}")
+        elif rule.kind == 'price_below':
+            parts.append(f"below ${rule.threshold:.2f}")
+        else:
+            change = (price - reference) / reference * 100
+            parts.append(f"{change:+.1f}% from previous close ${reference:.2f}")
+    return f"{symbol} alert: ${price:.2f}, " + "; ".join(parts)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_alert_engine():
+    """Return the process-wide alert engine"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from app import app
+                _engine = AlertEngine(app)
+    return _engine
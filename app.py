@@ -1,5 +1,6 @@
 import os
 import logging
+import threading
 from dotenv import load_dotenv
 from flask import Flask
 
@@ -17,62 +18,112 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure the database
-import re
-database_url = os.environ.get("DATABASE_URL")
-
-# Check for individual database connection parameters (for Render IPv6 compatibility)
-db_host = os.environ.get("DB_HOST")
-db_port = os.environ.get("DB_PORT")
-db_name = os.environ.get("DB_NAME")
-db_user = os.environ.get("DB_USER")
-db_password = os.environ.get("DB_PASSWORD")
-
-if db_host and db_port and db_name and db_user and db_password:
-    # Use individual parameters (IPv4 compatible)
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-elif database_url:
-    # Use PostgreSQL if DATABASE_URL is set
-    if database_url.startswith("postgres://"):
-        database_url = database_url.replace("postgres://", "postgresql://", 1)
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-else:
+# Startup work that is opt-in: schema upgrades (or run `python migrate_schema.py`)
+# and the background scheduler (web processes only)
+AUTO_UPGRADE_SCHEMA = os.environ.get("AUTO_UPGRADE_SCHEMA", "0") != "0"
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "0") != "0"
+
+_app = None
+_app_lock = threading.RLock()
+_schema_upgraded = False
+_schema_checked = False
+_scheduler_started = False
+
+def _database_uri():
+    database_url = os.environ.get("DATABASE_URL")
+
+    # Check for individual database connection parameters (for Render IPv6 compatibility)
+    db_host = os.environ.get("DB_HOST")
+    db_port = os.environ.get("DB_PORT")
+    db_name = os.environ.get("DB_NAME")
+    db_user = os.environ.get("DB_USER")
+    db_password = os.environ.get("DB_PASSWORD")
+
+    if db_host and db_port and db_name and db_user and db_password:
+        # Use individual parameters (IPv4 compatible)
+        return f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+    if database_url:
+        # Use PostgreSQL if DATABASE_URL is set
+        if database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+        return database_url
+
     # Use SQLite with custom path for Render
     db_path = os.environ.get("DATABASE_PATH", "crwv_moon.db")
     # Ensure the directory exists
     os.makedirs(os.path.dirname(db_path) if os.path.dirname(db_path) else ".", exist_ok=True)
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-# Initialize the app with the extension
-db.init_app(app)
+    return f"sqlite:///{db_path}"
 
-# Template context processor to make settings available globally
-@app.context_processor
 def inject_settings():
+    """Template context processor to make settings available globally"""
     try:
         from models import Settings
-        settings = Settings.get_settings()
+        settings = Settings.get_cached()
         return dict(settings=settings)
     except:
         return dict(settings=None)
 
-with app.app_context():
-    # Import models to ensure tables are created
-    import models
-    db.create_all()
-    
-    # Import routes
-    import routes
-    
-    # Initialize scheduler
-    from scheduler import init_scheduler
-    init_scheduler()
+def create_app(upgrade_schema=None, start_scheduler=None, check_schema=True):
+    """
+    Return the process-wide Flask app, building it on first use
+    Building it only configures Flask and registers models and routes.
+    Schema upgrades and the scheduler run when asked for here or through
+    AUTO_UPGRADE_SCHEMA / SCHEDULER_ENABLED, so scripts and workers that
+    only need the database start quickly. Without an upgrade, the first
+    call checks that every table and added column exists and raises if
+    the database was never migrated (check_schema=False skips this for
+    scripts that create the tables themselves). `from app import app`
+    calls this with the defaults.
+    """
+    global _app, app, _schema_upgraded, _schema_checked, _scheduler_started
+    upgrade_schema = AUTO_UPGRADE_SCHEMA if upgrade_schema is None else upgrade_schema
+    start_scheduler = SCHEDULER_ENABLED if start_scheduler is None else start_scheduler
+
+    with _app_lock:
+        if _app is None:
+            flask_app = Flask(__name__)
+            flask_app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+            flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app, x_proto=1, x_host=1)
+            flask_app.config["SQLALCHEMY_DATABASE_URI"] = _database_uri()
+            flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+                "pool_recycle": 300,
+                "pool_pre_ping": True,
+            }
+            db.init_app(flask_app)
+            flask_app.context_processor(inject_settings)
+
+            # routes registers on `app`, so publish it before importing them
+            _app = app = flask_app
+            with flask_app.app_context():
+                import models
+                import routes
+
+        if upgrade_schema and not _schema_upgraded:
+            with _app.app_context():
+                from migrate_schema import upgrade_schema as run_upgrade
+                run_upgrade(db)
+            _schema_upgraded = True
+        elif check_schema and not _schema_upgraded and not _schema_checked:
+            with _app.app_context():
+                from migrate_schema import missing_schema
+                missing = missing_schema(db)
+            _schema_checked = True
+            if missing:
+                raise RuntimeError(
+                    f"Database is missing {', '.join(missing)}: run `python migrate_schema.py` "
+                    f"or set AUTO_UPGRADE_SCHEMA=1"
+                )
+
+        if start_scheduler and not _scheduler_started:
+            with _app.app_context():
+                from scheduler import init_scheduler
+                init_scheduler()
+            _scheduler_started = True
+
+    return _app
+
+def __getattr__(name):
+    # `app` is created lazily, on the first `from app import app`
+    if name == 'app':
+        return create_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
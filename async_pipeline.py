@@ -0,0 +1,385 @@
+"""
+Asyncio notification pipeline.
+
+One event loop drives every send: messages go to Twilio's REST API over a
+pooled httpx.AsyncClient (HTTP/2 when the h2 package is installed), so
+thousands of sends can be in flight on a single thread. SQLAlchemy work
+(recipient pages, outbox claims, log writes) runs on one dedicated thread
+holding an app context, and never blocks the loop.
+
+httpx is optional (`pip install 'httpx[http2]'`). Without it, sends fall
+back to the blocking Twilio client on the loop's default thread pool.
+
+Used by worker.py --async (outbox delivery) and by
+NOTIFICATION_DELIVERY=async (scheduled fan-outs).
+"""
+
+import os
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from app import db
+from sms_service import (
+    TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_API_BASE, SmsHttpError, messages_path, sender_for, sender_params,
+    SMS_SENDERS,
+    SMS_HTTP_TIMEOUT, NOTIFICATION_LOG_BATCH_SIZE, is_retryable_error, is_throttled, retry_delay, not_sent_result,
+)
+from sms_limits import AimdConcurrency, get_sender_bucket, record_send
+
+# Sends in flight at once on the event loop
+SMS_ASYNC_CONCURRENCY = int(os.environ.get("SMS_ASYNC_CONCURRENCY", "256"))
+# Recipients read from the DB per round trip
+ASYNC_RECIPIENT_PAGE = int(os.environ.get("ASYNC_RECIPIENT_PAGE", "1000"))
+
+class DbThread:
+    """Runs blocking SQLAlchemy calls on one thread that holds an app context"""
+
+    def __init__(self, app):
+        self.app = app
+        self._context = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='async-db',
+                                            initializer=self._enter)
+
+    def _enter(self):
+        self._context = self.app.app_context()
+        self._context.push()
+
+    def _exit(self):
+        db.session.remove()
+        self._context.pop()
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def close(self):
+        if self._context is not None:
+            await self.run(self._exit)
+        self._executor.shutdown(wait=True)
+
+class AsyncSmsClient:
+    """
+    Sends SMS from coroutines. Each message goes out from its recipient's
+    sticky sender, through that sender's shared rate limit and an adaptive
+    (AIMD) concurrency limit of up to `concurrency` requests per sender.
+    Retries match sms_service.send_with_retry, and so does the shape of
+    the results.
+    """
+
+    def __init__(self, concurrency=None):
+        self.concurrency = max(1, concurrency or SMS_ASYNC_CONCURRENCY)
+        # Requests in flight across the whole sender pool
+        self.total_concurrency = self.concurrency * max(1, len(SMS_SENDERS))
+        # sender -> (AimdConcurrency, asyncio.Condition its waiters sleep on)
+        self._limits = {}
+        try:
+            import httpx
+        except ImportError:
+            httpx = None
+        self._httpx = httpx
+        self._client = None
+        self.http2 = False
+
+        if httpx is not None:
+            try:
+                import h2  # noqa: F401
+                # httpx only negotiates HTTP/2 over TLS
+                self.http2 = TWILIO_API_BASE.startswith('https://')
+            except ImportError:
+                pass
+            self._client = httpx.AsyncClient(
+                base_url=TWILIO_API_BASE,
+                auth=(TWILIO_ACCOUNT_SID or '', TWILIO_AUTH_TOKEN or ''),
+                http2=self.http2,
+                timeout=SMS_HTTP_TIMEOUT,
+                limits=httpx.Limits(max_connections=self.total_concurrency,
+                                    max_keepalive_connections=self.total_concurrency),
+            )
+        else:
+            logging.warning("httpx is not installed; async sends fall back to the blocking Twilio client")
+
+    @property
+    def transport(self):
+        if self._client is None:
+            return 'threads'
+        return 'httpx/http2' if self.http2 else 'httpx/http1.1'
+
+    def concurrency_limit(self, sender):
+        """Current adaptive limit for a sender"""
+        limit = self._limits.get(sender)
+        return limit[0].limit if limit else float(self.concurrency)
+
+    async def _post(self, to_phone_number, message, sender):
+        response = await self._client.post(
+            messages_path(),
+            data=dict(sender_params(sender), To=to_phone_number, Body=message),
+        )
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get('message', response.text)
+            except ValueError:
+                detail = response.text
+            raise SmsHttpError(response.status_code, detail)
+        return response.json()['sid']
+
+    def is_retryable_error(self, error):
+        if self._httpx is not None and isinstance(error, self._httpx.TransportError):
+            return True
+        return is_retryable_error(error)
+
+    async def _enter(self, sender, deadline=None):
+        """Wait for a send slot; False if none frees up before deadline"""
+        if sender not in self._limits:
+            self._limits[sender] = (AimdConcurrency(self.concurrency), asyncio.Condition())
+        aimd, slots = self._limits[sender]
+        timeout = None if deadline is None else deadline - time.monotonic()
+        if timeout is not None and timeout <= 0:
+            return False
+        async with slots:
+            try:
+                await asyncio.wait_for(slots.wait_for(aimd.try_enter), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def _leave(self, sender, entered, latency=None, throttled=False):
+        aimd, slots = self._limits[sender]
+        free = aimd.leave(entered, latency=latency, throttled=throttled)
+        async with slots:
+            slots.notify(free)
+
+    async def send(self, to_phone_number, message, deadline=None):
+        """
+        Send one message; returns a result dict and never raises
+        deadline works as in send_with_retry
+        """
+        if self._client is None:
+            from sms_service import send_with_retry
+            return await asyncio.to_thread(send_with_retry, to_phone_number, message, deadline)
+
+        sender = sender_for(to_phone_number)
+        bucket = get_sender_bucket(sender)
+        started = time.perf_counter()
+        attempts = failures = throttles = 0
+        while True:
+            # Take the token last, so sends leave at the paced rate instead of in bursts
+            entered_slot = await self._enter(sender, deadline)
+            if (not entered_slot or not await bucket.acquire_async(deadline)
+                    or (deadline is not None and time.monotonic() >= deadline)):
+                if entered_slot:
+                    await self._leave(sender, time.monotonic())
+                if not attempts:
+                    return not_sent_result(to_phone_number, sender, started)
+                break
+            entered = time.monotonic()
+            attempts += 1
+            try:
+                sid = await self._post(to_phone_number, message, sender)
+            except Exception as e:
+                error = e
+            else:
+                await self._leave(sender, entered, latency=time.monotonic() - entered)
+                return record_send({
+                    'phone_number': to_phone_number,
+                    'sender': sender,
+                    'message_sid': sid,
+                    'error': None,
+                    'retryable': False,
+                    'attempts': attempts,
+                    'throttled': throttles,
+                    'latency': time.perf_counter() - started,
+                })
+
+            if is_throttled(error):
+                throttles += 1
+                await self._leave(sender, entered, throttled=True)
+                await asyncio.to_thread(bucket.penalize)
+                delay = retry_delay(error, failures, throttles, started)
+            else:
+                failures += 1
+                await self._leave(sender, entered)
+                delay = retry_delay(error, failures, throttles, started, retryable=self.is_retryable_error(error))
+            if delay is None or (deadline is not None and time.monotonic() + delay >= deadline):
+                break
+            logging.warning(f"Retrying SMS to {to_phone_number} in {delay:.2f}s (attempt {attempts}): {error}")
+            await asyncio.sleep(delay)
+
+        logging.error(f"Failed to send SMS to {to_phone_number}: {error}")
+        return record_send({
+            'phone_number': to_phone_number,
+            'sender': sender,
+            'message_sid': None,
+            'error': str(error),
+            'retryable': self.is_retryable_error(error),
+            'attempts': attempts,
+            'throttled': throttles,
+            'latency': time.perf_counter() - started,
+        })
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+def _log_results(log_buffer, results, notification_type, price):
+    for result in results:
+        log_buffer.add(result['phone_number'], notification_type, price,
+                       message_sid=result['message_sid'], error=result['error'], sender=result['sender'])
+
+async def dispatch_notifications_async(app, phone_numbers, notification_type, price, prices=None,
+                                       client=None, concurrency=None):
+    """
+    Async counterpart of sms_service.dispatch_notifications (same report)
+    phone_numbers may be a lazy DB stream; it is read in pages on the DB
+    thread while up to `concurrency` sends run on the loop
+    """
+    from sms_service import format_stock_message, recover_spooled_logs, NotificationLogBuffer, fanout_report, tally_sender
+
+    db_thread = DbThread(app)
+    own_client = client is None
+    client = client or AsyncSmsClient(concurrency)
+    concurrency = concurrency or client.total_concurrency
+    semaphore = asyncio.Semaphore(concurrency)
+
+    message = format_stock_message(notification_type, price, prices)
+    fanout_started = time.perf_counter()
+    completion_offsets = []
+    send_latencies = []
+    finished = []
+    in_flight = set()
+    total = sent = failed = retries = throttled = 0
+    senders = {}
+
+    async def send_one(number):
+        try:
+            return await client.send(number, message)
+        finally:
+            semaphore.release()
+
+    def on_done(task):
+        nonlocal sent, failed, retries, throttled
+        in_flight.discard(task)
+        result = task.result()
+        completion_offsets.append(time.perf_counter() - fanout_started)
+        send_latencies.append(result['latency'])
+        retries += result['attempts'] - 1
+        throttled += result['throttled']
+        tally_sender(senders, result)
+        if result['error']:
+            failed += 1
+        else:
+            sent += 1
+        finished.append(result)
+
+    try:
+        await db_thread.run(recover_spooled_logs)
+        log_buffer = await db_thread.run(NotificationLogBuffer)
+        recipients = iter(phone_numbers)
+
+        while True:
+            page = await db_thread.run(lambda: list(islice(recipients, ASYNC_RECIPIENT_PAGE)))
+            if not page:
+                break
+            for number in page:
+                total += 1
+                await semaphore.acquire()
+                task = asyncio.create_task(send_one(number))
+                in_flight.add(task)
+                task.add_done_callback(on_done)
+            if len(finished) >= NOTIFICATION_LOG_BATCH_SIZE:
+                batch, finished[:] = finished[:], []
+                await db_thread.run(_log_results, log_buffer, batch, notification_type, price)
+
+        if in_flight:
+            await asyncio.wait(set(in_flight))
+        await db_thread.run(_log_results, log_buffer, finished, notification_type, price)
+        await db_thread.run(log_buffer.close)
+    finally:
+        if own_client:
+            await client.aclose()
+        await db_thread.close()
+
+    report = fanout_report(notification_type, total, sent, failed, retries, concurrency, fanout_started,
+                           completion_offsets, send_latencies, log_buffer, throttled=throttled, senders=senders,
+                           concurrency_limit=client.concurrency_limit)
+    if total:
+        report['transport'] = client.transport
+    return report
+
+class AsyncOutboxWorker:
+    """
+    Drains the outbox on one event loop: each claimed batch is sent
+    concurrently (up to `concurrency` requests in flight) and recorded with
+    OutboxWorker.record, while claims and writes run on the DB thread.
+    """
+
+    def __init__(self, app, batch_size=None, lease_seconds=None, poll_interval=None, concurrency=None):
+        from outbox import OutboxWorker
+
+        self.app = app
+        self.client = AsyncSmsClient(concurrency)
+        # Reuses the blocking worker's claim/record logic and counters
+        self.worker = OutboxWorker(batch_size=batch_size or max(self.client.total_concurrency, 100),
+                                   lease_seconds=lease_seconds, poll_interval=poll_interval, concurrency=1)
+        self.db_thread = DbThread(app)
+
+    @property
+    def identity(self):
+        return self.worker.identity
+
+    async def run_once(self):
+        from outbox import claim_batch, OUTBOX_MAX_ATTEMPTS
+
+        worker = self.worker
+        deadline = worker.send_deadline(time.monotonic())
+        rows = await self.db_thread.run(claim_batch, worker.identity, worker.batch_size, worker.lease_seconds)
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        to_send = [(row.phone_number, row.message) for row in rows if row.attempts <= OUTBOX_MAX_ATTEMPTS]
+        results = await asyncio.gather(*(self.client.send(number, message, deadline) for number, message in to_send))
+        handled = await self.db_thread.run(worker.record, rows, results)
+        logging.info(f"Outbox batch of {handled} delivered in {time.perf_counter() - started:.2f}s over "
+                     f"{self.client.transport} (totals: {worker.sent} sent, {worker.failed} failed, "
+                     f"{worker.requeued} requeued)")
+        return handled
+
+    async def run(self, stop_event=None, once=False):
+        """Poll until stop_event (a threading.Event) is set, or the queue is empty with once=True"""
+        from outbox import reclaim_expired_leases, purge_finished
+        from sms_service import recover_spooled_logs
+
+        worker = self.worker
+        logging.info(f"Async outbox worker {worker.identity} started "
+                     f"(batch {worker.batch_size}, concurrency {self.client.total_concurrency}, {self.client.transport})")
+        await self.db_thread.run(recover_spooled_logs)
+        last_purge = 0.0
+
+        try:
+            while stop_event is None or not stop_event.is_set():
+                try:
+                    if time.monotonic() - last_purge > 3600:
+                        await self.db_thread.run(purge_finished)
+                        last_purge = time.monotonic()
+                    await self.db_thread.run(reclaim_expired_leases)
+                    handled = await self.run_once()
+                except Exception as e:
+                    logging.error(f"Async outbox worker error: {e}")
+                    await self.db_thread.run(db.session.rollback)
+                    handled = 0
+
+                if handled:
+                    continue
+                if once:
+                    break
+                if stop_event is not None:
+                    await asyncio.to_thread(stop_event.wait, worker.poll_interval)
+                else:
+                    await asyncio.sleep(worker.poll_interval)
+        finally:
+            await self.client.aclose()
+            await self.db_thread.close()
+            worker._executor.shutdown(wait=False)
+        logging.info(f"Async outbox worker {worker.identity} stopped")
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Bulk historical backfill for daily bars.
+
+Fetches history in date-range chunks and writes it with dialect-native
+upserts (INSERT ... ON CONFLICT (symbol, date) DO UPDATE on Postgres and
+SQLite), one statement and one commit per batch of rows. Without --start
+each symbol resumes from its last stored date; symbols with no bars get
+their full history.
+
+    python backfill.py                              # every watched symbol, resume
+    python backfill.py --symbol NVDA --start 2020-01-01 --end 2024-12-31
+    python backfill.py --full                       # re-fetch full history
+"""
+
+import os
+import sys
+import math
+import time
+import logging
+import argparse
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+
+# One-off command: leave scheduled jobs to the web processes
+os.environ.setdefault("SCHEDULER_ENABLED", "0")
+
+from app import app, db
+from models import StockData
+
+# Days of history requested per provider call, and rows per upsert statement
+BACKFILL_CHUNK_DAYS = int(os.environ.get("BACKFILL_CHUNK_DAYS", "365"))
+BACKFILL_BATCH_SIZE = int(os.environ.get("BACKFILL_BATCH_SIZE", "1000"))
+
+def upsert_statement():
+    """INSERT ... ON CONFLICT (symbol, date) DO UPDATE for stock_data"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise ValueError(f"Bulk upserts are not supported on {dialect}")
+
+    statement = dialect_insert(StockData.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=['symbol', 'date'],
+        set_={
+            'open_price': statement.excluded.open_price,
+            'close_price': statement.excluded.close_price,
+            'high_price': statement.excluded.high_price,
+            'low_price': statement.excluded.low_price,
+            'volume': statement.excluded.volume,
+            'last_updated': statement.excluded.last_updated,
+        }
+    )
+
+def _rows_from_history(symbol, hist):
+    """Convert a provider DataFrame into stock_data row dicts, skipping empty bars"""
+    if hist is None or hist.empty:
+        return []
+    now = datetime.utcnow()
+    rows = []
+    for index, open_, close, high, low, volume in zip(
+        hist.index, hist['Open'], hist['Close'], hist['High'], hist['Low'], hist['Volume']
+    ):
+        if close is None or (isinstance(close, float) and math.isnan(close)):
+            continue
+        rows.append({
+            'symbol': symbol,
+            'date': index.date(),
+            'open_price': float(open_),
+            'close_price': float(close),
+            'high_price': float(high),
+            'low_price': float(low),
+            'volume': 0 if volume is None or volume != volume else int(volume),
+            'last_updated': now,
+        })
+    return rows
+
+def last_stored_date(symbol):
+    return db.session.query(func.max(StockData.date)).filter(StockData.symbol == symbol).scalar()
+
+def write_rows(rows, batch_size=None):
+    """Upsert rows in batches; returns the number of rows written"""
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    statement = upsert_statement()
+    for offset in range(0, len(rows), batch_size):
+        db.session.execute(statement, rows[offset:offset + batch_size])
+        db.session.commit()
+    return len(rows)
+
+def backfill_symbol(symbol, start=None, end=None, full=False, chunk_days=None, batch_size=None):
+    """
+    Backfill one symbol and return a report dict
+    start/end are dates (end exclusive, default tomorrow). Without start the
+    symbol resumes from its last stored date, or loads full history.
+    """
+    from market_data import get_provider
+    from stock_service import refresh_change_summary
+
+    chunk_days = chunk_days or BACKFILL_CHUNK_DAYS
+    end = end or date.today() + timedelta(days=1)
+    provider = get_provider()
+
+    if start is None and not full:
+        # Re-fetch the last stored bar too: it may have been written intraday
+        start = last_stored_date(symbol)
+
+    started = time.perf_counter()
+    fetch_seconds = write_seconds = 0.0
+    written = chunks = 0
+
+    if start is None:
+        # Full history: one request, written in batches
+        fetch_started = time.perf_counter()
+        rows = _rows_from_history(symbol, provider.get_history(symbol, period='max'))
+        fetch_seconds += time.perf_counter() - fetch_started
+        write_started = time.perf_counter()
+        written += write_rows(rows, batch_size)
+        write_seconds += time.perf_counter() - write_started
+        chunks = 1
+    else:
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + timedelta(days=chunk_days), end)
+            fetch_started = time.perf_counter()
+            rows = _rows_from_history(symbol, provider.get_history(symbol, start=window_start, end=window_end))
+            fetch_seconds += time.perf_counter() - fetch_started
+            write_started = time.perf_counter()
+            written += write_rows(rows, batch_size)
+            write_seconds += time.perf_counter() - write_started
+            chunks += 1
+            logging.info(f"Backfilled {symbol} {window_start} to {window_end}: {len(rows)} rows")
+            window_start = window_end
+
+    if written:
+        refresh_change_summary(symbol=symbol)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'symbol': symbol,
+        'start': start,
+        'end': end,
+        'rows': written,
+        'chunks': chunks,
+        'seconds': elapsed,
+        'fetch_seconds': fetch_seconds,
+        'write_seconds': write_seconds,
+        'rows_per_second': written / elapsed if elapsed else None,
+        'write_rows_per_second': written / write_seconds if write_seconds else None,
+    }
+
+def backfill(symbols=None, start=None, end=None, full=False, chunk_days=None, batch_size=None):
+    """Backfill several symbols (default: every watched symbol); returns reports"""
+    from stock_service import WATCHED_SYMBOLS
+
+    reports = []
+    for symbol in symbols or WATCHED_SYMBOLS:
+        report = backfill_symbol(symbol.upper(), start=start, end=end, full=full,
+                                 chunk_days=chunk_days, batch_size=batch_size)
+        reports.append(report)
+        rate = f"{report['rows_per_second']:.0f} rows/s" if report['rows_per_second'] else "n/a"
+        write_rate = f"{report['write_rows_per_second']:.0f} rows/s" if report['write_rows_per_second'] else "n/a"
+        print(f"{report['symbol']}: {report['rows']} rows in {report['chunks']} chunks, "
+              f"{report['seconds']:.2f}s ({rate}; fetch {report['fetch_seconds']:.2f}s, "
+              f"write {report['write_seconds']:.2f}s at {write_rate})")
+    return reports
+
+def _parse_date(value):
+    return date.fromisoformat(value)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill daily bars with bulk upserts")
+    parser.add_argument('--symbol', action='append', dest='symbols', help='Symbol to backfill (repeatable)')
+    parser.add_argument('--start', type=_parse_date, help='First date (YYYY-MM-DD); default: resume')
+    parser.add_argument('--end', type=_parse_date, help='Last date, exclusive (YYYY-MM-DD); default: tomorrow')
+    parser.add_argument('--full', action='store_true', help='Fetch full history instead of resuming')
+    parser.add_argument('--chunk-days', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    with app.app_context():
+        reports = backfill(args.symbols, start=args.start, end=args.end, full=args.full,
+                           chunk_days=args.chunk_days, batch_size=args.batch_size)
+    total = sum(report['rows'] for report in reports)
+    seconds = sum(report['seconds'] for report in reports)
+    print(f"Backfilled {total} rows in {seconds:.2f}s")
+    sys.exit(0)
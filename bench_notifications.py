@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Fan-out load benchmark: drives send_daily_notifications against the local
+SMS stand-in (sms_standin.py) and reports throughput, tail latency and the
+cost of writing NotificationLog rows. Every run is a fresh interpreter with
+its own configuration, against a database seeded with exactly that many
+subscribers.
+
+    python bench_notifications.py                        # 10, 1k and 100k recipients, inline and async
+    python bench_notifications.py --sizes 1000 --delivery async --concurrency 512
+    python bench_notifications.py --latency-ms 120 --jitter-ms 80 --throttle-rate 0.02 --json
+    python bench_notifications.py --standin-url http://127.0.0.1:5099   # an already running stand-in
+    python bench_notifications.py --sizes 2000 --senders 4 --max-rps 50 --rate-limit 50   # sender pool scaling
+
+By default the database is a temp SQLite file. --database-url points it at a
+scratch Postgres instead; its users, subscriptions, alerts and notification
+logs are deleted and reseeded. 100k recipients through the inline path at
+the default concurrency (8 threads) and 50 ms latency takes about ten minutes.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Runs inside a child: replace the subscribers with `size` fresh ones
+_SEED = """
+from sqlalchemy import delete
+from app import create_app, db
+from models import User, Subscription, PriceAlert, NotificationLog
+app = create_app(upgrade_schema=True)
+with app.app_context():
+    for model in (NotificationLog, PriceAlert, Subscription, User):
+        db.session.execute(delete(model))
+    for start in range(0, {size}, 10000):
+        db.session.execute(User.__table__.insert(), [
+            {{'name': f'Bench {{i}}', 'phone_number': f'+1555{{i:07d}}', 'password_hash': 'x', 'is_active': True}}
+            for i in range(start, min(start + 10000, {size}))
+        ])
+    db.session.commit()
+    Subscription.backfill()
+"""
+
+# Runs inside a child: one scheduled fan-out, reported as JSON
+_RUN = """
+import os, sys, json, time, resource
+from app import create_app, db
+from models import NotificationLog
+app = create_app()
+with app.app_context():
+    from sms_service import send_daily_notifications
+    started = time.perf_counter()
+    report = send_daily_notifications('open', 123.45)
+    wall = time.perf_counter() - started
+    logged = db.session.query(NotificationLog).count()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+print('BENCH ' + json.dumps({'report': report, 'wall_seconds': wall, 'logged': logged, 'rss_mb': rss_mb}))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+def start_standin(args):
+    """Start sms_standin.py on a free port; returns (process, base_url)"""
+    command = [sys.executable, os.path.join(HERE, 'sms_standin.py'), '--port', '0',
+               '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+               '--error-rate', str(args.error_rate), '--throttle-rate', str(args.throttle_rate),
+               '--max-rps', str(args.max_rps)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('LISTENING '):
+        process.kill()
+        raise RuntimeError("SMS stand-in failed to start")
+    return process, f"http://{line.split()[1]}"
+
+def standin_stats(base_url, reset=False):
+    request = urllib.request.Request(base_url + ('/stats/reset' if reset else '/stats'),
+                                     method='POST' if reset else 'GET')
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+def run_child(code, env):
+    result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, cwd=HERE)
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark child failed:\n{result.stderr[-2000:]}")
+    return result.stdout
+
+def run_fanout(size, delivery, env, base_url):
+    env = dict(env, NOTIFICATION_DELIVERY=delivery)
+    run_child(_SEED.format(size=size), env)
+    standin_stats(base_url, reset=True)
+    for line in run_child(_RUN, env).splitlines():
+        if line.startswith('BENCH '):
+            sample = json.loads(line[len('BENCH '):])
+            break
+    else:
+        raise RuntimeError("Benchmark child printed no report")
+
+    report = sample['report'] or {}
+    duration = report.get('duration') or 0.0
+    flushed = report.get('log_rows_flushed') or 0
+    return {
+        'recipients': size,
+        'delivery': delivery,
+        'transport': report.get('transport', 'threads'),
+        'sent': report.get('sent', 0),
+        'failed': report.get('failed', 0),
+        'retries': report.get('retries', 0),
+        'throttled': report.get('throttled', 0),
+        'concurrency': report.get('concurrency'),
+        'concurrency_limit': report.get('concurrency_limit'),
+        'senders': report.get('senders', {}),
+        'duration_seconds': duration,
+        'wall_seconds': sample['wall_seconds'],
+        'sent_per_second': report.get('sent', 0) / duration if duration else 0.0,
+        'fanout_p50': report.get('fanout_p50'),
+        'fanout_p95': report.get('fanout_p95'),
+        'fanout_p99': report.get('fanout_p99'),
+        'send_p50': report.get('send_p50'),
+        'send_p99': report.get('send_p99'),
+        'log_rows': sample['logged'],
+        'log_flush_seconds': report.get('log_flush_seconds', 0.0),
+        'log_ms_per_1k_rows': report.get('log_flush_seconds', 0.0) * 1000 / flushed * 1000 if flushed else None,
+        'rss_mb': sample['rss_mb'],
+        'standin': standin_stats(base_url),
+    }
+
+def _ms(seconds):
+    return f"{seconds * 1000:.0f}ms" if seconds is not None else "-"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark notification fan-out against the SMS stand-in")
+    parser.add_argument('--sizes', default='10,1000,100000', help='Comma separated recipient counts')
+    parser.add_argument('--delivery', action='append', choices=['inline', 'async'], dest='deliveries',
+                        help='Delivery path (repeatable; default: inline and async)')
+    parser.add_argument('--backend', choices=['twilio', 'http'], default='http', help='SMS_BACKEND for the inline path')
+    parser.add_argument('--concurrency', type=int, help='SMS_MAX_CONCURRENCY and SMS_ASYNC_CONCURRENCY (per sender)')
+    parser.add_argument('--senders', type=int, default=1, help='Sender numbers in the pool (TWILIO_PHONE_NUMBERS)')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='SMS_RATE_LIMIT_PER_SECOND (default 0: let the stand-in throttle)')
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--max-rps', type=float, default=0.0)
+    parser.add_argument('--standin-url', help='Use a running stand-in instead of starting one')
+    parser.add_argument('--database-url', help='Scratch database to use instead of a temp SQLite file (wiped)')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    for name in ('DATABASE_URL', 'DB_HOST'):
+        env.pop(name, None)
+    if args.database_url:
+        env['DATABASE_URL'] = args.database_url
+    else:
+        env['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench_notifications_'), 'bench.db')
+    spool_dir = tempfile.mkdtemp(prefix='bench_spool_')
+    env.update({
+        'SCHEDULER_ENABLED': '0',
+        'AUTO_UPGRADE_SCHEMA': '0',
+        'SMS_BACKEND': args.backend,
+        'TWILIO_ACCOUNT_SID': env.get('TWILIO_ACCOUNT_SID') or 'ACbench',
+        'TWILIO_AUTH_TOKEN': env.get('TWILIO_AUTH_TOKEN') or 'bench',
+        'TWILIO_PHONE_NUMBER': env.get('TWILIO_PHONE_NUMBER') or '+15550000000',
+        'TWILIO_PHONE_NUMBERS': ','.join(f'+1555000{i:04d}' for i in range(args.senders)),
+        'SMS_RATE_LIMIT_PER_SECOND': str(args.rate_limit),
+        'NOTIFICATION_LOG_SPOOL_DIR': spool_dir,
+        'PYTHONPATH': HERE,
+    })
+    if args.concurrency:
+        env['SMS_MAX_CONCURRENCY'] = env['SMS_ASYNC_CONCURRENCY'] = str(args.concurrency)
+
+    standin = None
+    base_url = args.standin_url
+    if not base_url:
+        standin, base_url = start_standin(args)
+    env['TWILIO_API_BASE'] = base_url
+
+    results = []
+    try:
+        for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+            for delivery in args.deliveries or ['inline', 'async']:
+                result = run_fanout(size, delivery, env, base_url)
+                results.append(result)
+                if not args.json:
+                    print(f"{size:>7} {delivery:<6} {result['sent']}/{size} sent in {result['duration_seconds']:.2f}s "
+                          f"({result['sent_per_second']:.0f}/s, {result['transport']})", file=sys.stderr)
+    finally:
+        if standin is not None:
+            standin.terminate()
+            standin.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'recipients':>10} {'delivery':<8} {'transport':<14} {'sent/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+              f"{'send p99':>9} {'retries':>8} {'429s':>6} {'failed':>7} {'log/1k':>8} {'rss':>9}")
+        for result in results:
+            log_cost = result['log_ms_per_1k_rows']
+            print(f"{result['recipients']:>10} {result['delivery']:<8} {result['transport']:<14} "
+                  f"{result['sent_per_second']:>8.0f} {_ms(result['fanout_p50']):>8} {_ms(result['fanout_p95']):>8} "
+                  f"{_ms(result['fanout_p99']):>8} {_ms(result['send_p99']):>9} {result['retries']:>8} "
+                  f"{result['throttled']:>6} {result['failed']:>7} "
+                  f"{(f'{log_cost:.0f}ms' if log_cost is not None else '-'):>8} {result['rss_mb']:>6.1f} MB")
+
+        if args.senders > 1:
+            print(f"\n{'recipients':>10} {'delivery':<8} {'sender':<14} {'sent':>7} {'sent/s':>8} {'429s':>6} {'limit':>7}")
+            for result in results:
+                for sender, counts in sorted(result['senders'].items()):
+                    rate = counts['sent'] / result['duration_seconds'] if result['duration_seconds'] else 0.0
+                    print(f"{result['recipients']:>10} {result['delivery']:<8} {sender:<14} {counts['sent']:>7} "
+                          f"{rate:>8.0f} {counts['throttled']:>6} {counts.get('concurrency_limit', 0):>7.1f}")
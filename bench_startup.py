@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: cold import latency and boot RSS for each way the app
+starts. Every run is a fresh interpreter, so module caches never carry
+over between runs.
+
+    python bench_startup.py                 # 5 runs per scenario, temp SQLite DB
+    python bench_startup.py --runs 10 --json
+    python bench_startup.py --use-env-db    # against DATABASE_URL / DATABASE_PATH
+    python bench_startup.py --importtime    # slowest modules behind `from app import app`
+
+Scenarios:
+    models     - `from app import db; import models` (what lightweight scripts need)
+    app        - `from app import app` (scripts and workers)
+    app+schema - create_app(upgrade_schema=True) (release phase)
+    web        - create_app(start_scheduler=True) (a gunicorn web worker booting)
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+
+SCENARIOS = {
+    'models': "from app import db\nimport models",
+    'app': "from app import app",
+    'app+schema': "from app import create_app\ncreate_app(upgrade_schema=True)",
+    'web': "from app import create_app\ncreate_app(start_scheduler=True)",
+}
+
+# Runs inside the child: time the scenario and report peak RSS as JSON
+_CHILD = """
+import os, sys, json, time, resource
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# ru_maxrss is in bytes on macOS and kilobytes elsewhere
+rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+print('BENCH ' + json.dumps({{'seconds': elapsed, 'rss_mb': rss_mb, 'modules': len(sys.modules)}}))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+def run_once(code, env):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', _CHILD.format(code=code)],
+        env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    wall = time.perf_counter() - started
+    for line in result.stdout.splitlines():
+        if line.startswith('BENCH '):
+            report = json.loads(line[len('BENCH '):])
+            report['wall_seconds'] = wall
+            return report
+    raise RuntimeError(f"Benchmark child failed:\n{result.stderr[-2000:]}")
+
+def importtime(env, top=15):
+    """Slowest modules (cumulative microseconds) behind `from app import app`"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'from app import app'],
+        env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, module = line.split('|')
+        rows.append((int(cumulative_us), module.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+def benchmark(scenarios, runs, env):
+    reports = {}
+    for name in scenarios:
+        samples = [run_once(SCENARIOS[name], env) for _ in range(runs)]
+        seconds = sorted(sample['seconds'] for sample in samples)
+        reports[name] = {
+            'runs': runs,
+            'median_seconds': statistics.median(seconds),
+            'max_seconds': seconds[-1],
+            'median_wall_seconds': statistics.median(sample['wall_seconds'] for sample in samples),
+            'median_rss_mb': statistics.median(sample['rss_mb'] for sample in samples),
+            'modules': samples[-1]['modules'],
+        }
+    return reports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import latency and boot RSS")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), dest='scenarios',
+                        help='Scenario to run (repeatable; default: all)')
+    parser.add_argument('--use-env-db', action='store_true', help='Use the configured database instead of a temp SQLite file')
+    parser.add_argument('--importtime', action='store_true', help='Also list the slowest imports')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('SCHEDULER_ENABLED', '0')
+    env.setdefault('AUTO_UPGRADE_SCHEMA', '0')
+    if not args.use_env_db:
+        for name in ('DATABASE_URL', 'DB_HOST'):
+            env.pop(name, None)
+        env['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench_startup_'), 'bench.db')
+        # The web scenario reads tables, so create them once up front
+        run_once(SCENARIOS['app+schema'], env)
+
+    reports = benchmark(args.scenarios or list(SCENARIOS), args.runs, env)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print(f"{'scenario':<12} {'median':>9} {'max':>9} {'wall':>9} {'rss':>9} {'modules':>8}")
+        for name, report in reports.items():
+            print(f"{name:<12} {report['median_seconds'] * 1000:>7.0f}ms {report['max_seconds'] * 1000:>7.0f}ms "
+                  f"{report['median_wall_seconds'] * 1000:>7.0f}ms {report['median_rss_mb']:>6.1f} MB {report['modules']:>8}")
+
+    if args.importtime:
+        print("\nSlowest imports behind `from app import app` (cumulative):")
+        for cumulative_us, module in importtime(env):
+            print(f"  {cumulative_us / 1000:>8.1f}ms  {module}")
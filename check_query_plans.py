@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check for the hot query paths in routes.py and the
+notification fan-out. Runs EXPLAIN for each query against the configured
+database and exits non-zero if any of them falls back to a sequential
+scan or an explicit sort.
+
+    python check_query_plans.py          # report + exit status
+    python check_query_plans.py -v       # also print every plan
+
+On Postgres, sequential scans are disabled for the session so the check
+reports whether a usable index exists, regardless of table size.
+"""
+
+import sys
+import json
+from datetime import date, datetime, timedelta
+from sqlalchemy import tuple_
+from app import app, db
+from models import NotificationLog, StockData, StockSummary, User, Subscription, SchedulerLease, NotificationOutbox, PriceAlert, IntradayBar
+
+def hot_queries():
+    """(name, statement) pairs mirroring the queries issued on hot paths"""
+    today = date.today()
+    return [
+        ('index: recent notifications',
+         NotificationLog.newest_first().limit(10)),
+        ('logs: newest page',
+         NotificationLog.newest_first().limit(21)),
+        ('logs: older page',
+         NotificationLog.newest_first().filter(
+             tuple_(NotificationLog.sent_at, NotificationLog.id) < tuple_(datetime(2025, 1, 1), 1000)
+         ).limit(21)),
+        ('logs: newer page',
+         NotificationLog.query.filter(
+             tuple_(NotificationLog.sent_at, NotificationLog.id) > tuple_(datetime(2025, 1, 1), 1000)
+         ).order_by(NotificationLog.sent_at.asc(), NotificationLog.id.asc()).limit(21)),
+        ('recipient history',
+         NotificationLog.query.filter(NotificationLog.phone_number == '+10000000000')
+         .order_by(NotificationLog.sent_at.desc()).limit(10)),
+        ('sms senders: delivery counts',
+         NotificationLog.sender_status_query('+10000000000', datetime(2025, 1, 1))),
+        ('spool recovery: logged rows',
+         NotificationLog.logged_keys_query(['+10000000000', '+10000000001'],
+                                           [datetime(2025, 1, 1), datetime(2025, 1, 1, 0, 0, 1)])),
+        ('index: recent stock data',
+         StockData.query.filter_by(symbol='CRWV').order_by(StockData.date.desc()).limit(5)),
+        ('change summary: reference bars',
+         StockData.query.filter(StockData.symbol == 'CRWV',
+                                StockData.date.in_([today, today - timedelta(days=1), today - timedelta(days=9)]))),
+        ('daily bars: watched symbols',
+         StockData.query.filter(StockData.symbol.in_(['CRWV', 'NVDA']), StockData.date == today)),
+        ('change summary: persisted row',
+         StockSummary.query.filter_by(symbol='CRWV')),
+        ('users/settings: active users',
+         User.query.filter_by(is_active=True).order_by(User.id)),
+        ('user settings: price alerts',
+         PriceAlert.query.filter_by(user_id=1).order_by(PriceAlert.id)),
+        ('register: phone lookup',
+         User.query.filter_by(phone_number='+10000000000')),
+        ('fan-out: subscriber page',
+         Subscription._active_query('open').filter(Subscription.user_id > 0)
+         .order_by(Subscription.user_id).limit(1000)),
+        ('intraday: bars since cursor',
+         IntradayBar.after_query('CRWV', datetime(2025, 1, 1))),
+        ('scheduler: lease row',
+         SchedulerLease.query.filter_by(name='scheduler')),
+        ('outbox: claim due rows',
+         NotificationOutbox.query.filter(
+             NotificationOutbox.status == 'pending', NotificationOutbox.available_at <= datetime(2025, 1, 1)
+         ).order_by(NotificationOutbox.available_at, NotificationOutbox.id).limit(100)),
+        ('outbox: expired leases',
+         NotificationOutbox.query.filter(
+             NotificationOutbox.status == 'sending', NotificationOutbox.lease_expires_at < datetime(2025, 1, 1)
+         )),
+    ]
+
+def _compile(statement, dialect):
+    statement = getattr(statement, 'statement', statement)
+    compiled = statement.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positiontup is not None:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    return str(compiled), params
+
+def _sqlite_problems(rows):
+    problems = []
+    for row in rows:
+        detail = row[-1]
+        if detail.startswith('SCAN ') and ' USING ' not in detail:
+            problems.append(detail)
+        elif 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems, '\n'.join(row[-1] for row in rows)
+
+def _postgres_problems(rows):
+    plan = rows[0][0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    problems = []
+
+    def walk(node):
+        if node['Node Type'] == 'Seq Scan':
+            problems.append(f"Seq Scan on {node.get('Relation Name')}")
+        elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+            problems.append(f"{node['Node Type']} on {node.get('Sort Key')}")
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan[0]['Plan'])
+    return problems, json.dumps(plan[0]['Plan'], indent=1)
+
+def check_query_plans(verbose=False):
+    """Explain every hot query; returns a list of (name, problems)"""
+    dialect = db.engine.dialect
+    failures = []
+
+    with db.engine.connect() as connection:
+        if dialect.name == 'postgresql':
+            connection.exec_driver_sql("SET enable_seqscan = off")
+
+        for name, statement in hot_queries():
+            sql, params = _compile(statement, dialect)
+            if dialect.name == 'postgresql':
+                rows = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql, params).fetchall()
+                problems, plan = _postgres_problems(rows)
+            elif dialect.name == 'sqlite':
+                rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+                problems, plan = _sqlite_problems(rows)
+            else:
+                print(f"Unsupported dialect {dialect.name}")
+                return [('dialect', [dialect.name])]
+
+            status = 'FAIL' if problems else 'ok'
+            print(f"[{status}] {name}")
+            for problem in problems:
+                print(f"       {problem}")
+            if verbose:
+                print('       ' + plan.replace('\n', '\n       '))
+            if problems:
+                failures.append((name, problems))
+
+    return failures
+
+if __name__ == "__main__":
+    with app.app_context():
+        failures = check_query_plans(verbose='-v' in sys.argv)
+    if failures:
+        print(f"\n{len(failures)} hot queries fall back to a scan or sort")
+        sys.exit(1)
+    print("\nAll hot queries are index-backed")
@@ -10,9 +10,12 @@ from werkzeug.security import generate_password_hash
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db
+from app import create_app, db
 from models import User
 
+# Inserting users writes their subscriptions too, so the schema must be current
+app = create_app(upgrade_schema=True)
+
 def create_heroku_users():
     """Create users on Heroku with local data"""
     
@@ -0,0 +1,270 @@
+import os
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from app import db
+from models import IntradayBar
+from trading_calendar import EASTERN
+
+# Seconds between samples while the market is open (0 disables the sampler),
+# and seconds between compactions of completed minutes into intraday_bar
+INTRADAY_SAMPLE_INTERVAL = float(os.environ.get("INTRADAY_SAMPLE_INTERVAL", "15"))
+INTRADAY_COMPACT_INTERVAL = float(os.environ.get("INTRADAY_COMPACT_INTERVAL", "60"))
+# Ticks kept in memory per symbol: a 6.5 hour session at 15s needs 1560
+INTRADAY_BUFFER_SIZE = int(os.environ.get("INTRADAY_BUFFER_SIZE", "2048"))
+# Minute bars older than this many days are deleted
+INTRADAY_RETENTION_DAYS = float(os.environ.get("INTRADAY_RETENTION_DAYS", "30"))
+
+class TickRing:
+    """
+    Fixed-size ring of (epoch seconds, price) ticks stored in two array('d')
+    columns: 16 bytes per tick and no per-tick objects. Once full, the
+    oldest tick is overwritten. Timestamps are kept increasing so windows
+    are found by bisection.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._times = array('d', bytes(8 * capacity))
+        self._prices = array('d', bytes(8 * capacity))
+        self._start = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, price):
+        with self._lock:
+            if self._count and timestamp <= self._times[(self._start + self._count - 1) % self.capacity]:
+                return False
+            end = (self._start + self._count) % self.capacity
+            self._times[end] = timestamp
+            self._prices[end] = price
+            if self._count < self.capacity:
+                self._count += 1
+            else:
+                self._start = (self._start + 1) % self.capacity
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._start = 0
+            self._count = 0
+
+    def _ordered(self, column):
+        end = self._start + self._count
+        if end <= self.capacity:
+            return column[self._start:end]
+        return column[self._start:] + column[:end - self.capacity]
+
+    def ticks(self, after=None, before=None):
+        """(times, prices) arrays, oldest first, with after < time < before"""
+        with self._lock:
+            times = self._ordered(self._times)
+            prices = self._ordered(self._prices)
+        lo = bisect_right(times, after) if after is not None else 0
+        hi = bisect_left(times, before) if before is not None else len(times)
+        return times[lo:hi], prices[lo:hi]
+
+def minute_bars(times, prices):
+    """Aggregate ordered ticks into [minute epoch, open, high, low, close, samples] lists"""
+    bars = []
+    for timestamp, price in zip(times, prices):
+        minute = timestamp // 60 * 60
+        if bars and bars[-1][0] == minute:
+            bar = bars[-1]
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[5] += 1
+        else:
+            bars.append([minute, price, price, price, price, 1])
+    return bars
+
+def _upsert_statement():
+    """INSERT ... ON CONFLICT (symbol, minute) DO UPDATE for intraday_bar"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise ValueError(f"Bulk upserts are not supported on {dialect}")
+
+    statement = dialect_insert(IntradayBar.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=['symbol', 'minute'],
+        set_={
+            'open_price': statement.excluded.open_price,
+            'high_price': statement.excluded.high_price,
+            'low_price': statement.excluded.low_price,
+            'close_price': statement.excluded.close_price,
+            'samples': statement.excluded.samples,
+        }
+    )
+
+class IntradaySampler:
+    """
+    Samples the watched symbols' quotes into per-symbol TickRings while the
+    market is open. Every web process samples (the quote cache makes that
+    one batched upstream call per interval) so /api/intraday snapshots are
+    answered from memory; only the scheduler leader compacts completed
+    minutes into intraday_bar. Each process's ring has its own timestamps,
+    so incremental polls (?since=) are answered from intraday_bar, which
+    every worker sees the same. Rings are cleared at the first sample of a
+    new session.
+    """
+
+    def __init__(self, symbols=None, capacity=None):
+        from stock_service import WATCHED_SYMBOLS
+
+        self.symbols = list(symbols or WATCHED_SYMBOLS)
+        self.capacity = capacity or INTRADAY_BUFFER_SIZE
+        self.rings = {symbol: TickRing(self.capacity) for symbol in self.symbols}
+        self.session_date = None
+        # Timestamp of the last tick written to intraday_bar, per symbol
+        self._compacted_through = {symbol: 0.0 for symbol in self.symbols}
+        self._compact_lock = threading.Lock()
+        self._last_purge = 0.0
+        self.samples = 0
+        self.bars_written = 0
+
+    def sample(self):
+        """Record one tick per symbol if the market is open; returns ticks recorded"""
+        from stock_service import get_current_prices, is_market_open
+
+        if not is_market_open():
+            return 0
+
+        today = datetime.now(EASTERN).date()
+        if self.session_date != today:
+            with self._compact_lock:
+                for ring in self.rings.values():
+                    ring.clear()
+                self._compacted_through = {symbol: 0.0 for symbol in self.symbols}
+                self.session_date = today
+
+        prices = get_current_prices(self.symbols)
+        now = time.time()
+        recorded = 0
+        for symbol, price in prices.items():
+            ring = self.rings.get(symbol)
+            if ring is not None and price is not None and ring.append(now, price):
+                recorded += 1
+        self.samples += 1
+        return recorded
+
+    def compact(self):
+        """Upsert every completed, not yet compacted minute; returns bars written"""
+        current_minute = time.time() // 60 * 60
+        rows = []
+        compacted_through = {}
+
+        with self._compact_lock:
+            for symbol, ring in self.rings.items():
+                times, prices = ring.ticks(after=self._compacted_through[symbol], before=current_minute)
+                if not times:
+                    continue
+                for minute, open_, high, low, close, samples in minute_bars(times, prices):
+                    rows.append({
+                        'symbol': symbol,
+                        'minute': datetime.utcfromtimestamp(minute),
+                        'open_price': open_,
+                        'high_price': high,
+                        'low_price': low,
+                        'close_price': close,
+                        'samples': samples,
+                    })
+                compacted_through[symbol] = times[-1]
+
+            if rows:
+                db.session.execute(_upsert_statement(), rows)
+                db.session.commit()
+                self._compacted_through.update(compacted_through)
+                self.bars_written += len(rows)
+                logging.info(f"Compacted {len(rows)} intraday minute bars")
+
+        if time.monotonic() - self._last_purge > 3600:
+            self.purge()
+            self._last_purge = time.monotonic()
+        return len(rows)
+
+    def purge(self, retention_days=None):
+        """Delete minute bars older than the retention window"""
+        retention_days = INTRADAY_RETENTION_DAYS if retention_days is None else retention_days
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        deleted = IntradayBar.query.filter(IntradayBar.minute < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        if deleted:
+            logging.info(f"Purged {deleted} intraday minute bars")
+        return deleted
+
+    def series(self, symbol, after=None, resolution='tick'):
+        """
+        In-memory intraday series for one symbol (no DB access). cursor is
+        the start of the last tick's minute: polling with since=cursor
+        continues from the next compacted minute.
+        """
+        times, prices = self.rings[symbol].ticks(after=after)
+        if resolution == 'minute':
+            points = [
+                {'t': minute, 'open': open_, 'high': high, 'low': low, 'close': close, 'samples': samples}
+                for minute, open_, high, low, close, samples in minute_bars(times, prices)
+            ]
+        else:
+            points = [[timestamp, price] for timestamp, price in zip(times, prices)]
+        cursor = times[-1] // 60 * 60 if times else after
+        return self._payload(symbol, resolution, points, cursor)
+
+    def stored_series(self, symbol, since, resolution='tick'):
+        """
+        Compacted minute bars that start after since (epoch seconds), from
+        intraday_bar, at most one ring's worth per call. At tick resolution
+        each bar is one [minute, close] point.
+        """
+        after = datetime.utcfromtimestamp(since)
+        bars = IntradayBar.after_query(symbol, after).limit(self.capacity).all()
+        points = []
+        for bar in bars:
+            minute = bar.minute.replace(tzinfo=timezone.utc).timestamp()
+            if resolution == 'minute':
+                points.append({'t': minute, 'open': bar.open_price, 'high': bar.high_price,
+                               'low': bar.low_price, 'close': bar.close_price, 'samples': bar.samples})
+            else:
+                points.append([minute, bar.close_price])
+        cursor = bars[-1].minute.replace(tzinfo=timezone.utc).timestamp() if bars else since
+        return self._payload(symbol, resolution, points, cursor)
+
+    def _payload(self, symbol, resolution, points, cursor):
+        return {
+            'symbol': symbol,
+            'session': self.session_date.isoformat() if self.session_date else None,
+            'resolution': resolution,
+            'interval': INTRADAY_SAMPLE_INTERVAL,
+            'points': points,
+            'cursor': cursor,
+        }
+
+    def stats(self):
+        return {
+            'samples': self.samples,
+            'bars_written': self.bars_written,
+            'capacity': self.capacity,
+            'ticks': {symbol: len(ring) for symbol, ring in self.rings.items()},
+        }
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+def get_sampler():
+    """Return the process-wide sampler"""
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = IntradaySampler()
+    return _sampler
@@ -0,0 +1,103 @@
+import os
+import socket
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import SchedulerLease
+
+# Lease length and renewal period (seconds). A standby takes over at most
+# SCHEDULER_LEASE_TTL + SCHEDULER_LEASE_RENEW seconds after the leader dies.
+SCHEDULER_LEASE_TTL = float(os.environ.get("SCHEDULER_LEASE_TTL", "60"))
+SCHEDULER_LEASE_RENEW = float(os.environ.get("SCHEDULER_LEASE_RENEW", str(SCHEDULER_LEASE_TTL / 3)))
+
+class LeaseElector:
+    """
+    Leader election through a lease row in the application database.
+    Works on SQLite and Postgres: acquiring or renewing is a single
+    conditional UPDATE that only succeeds for the current holder or once
+    the previous lease has expired.
+    """
+
+    def __init__(self, name='scheduler', ttl=None):
+        self.name = name
+        self.ttl = ttl or SCHEDULER_LEASE_TTL
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._valid_until = 0.0  # local monotonic deadline of our lease
+
+    def try_acquire(self):
+        """Acquire or renew the lease; returns True if this process leads"""
+        started = time.monotonic()
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+
+        try:
+            result = db.session.execute(
+                update(SchedulerLease).where(
+                    SchedulerLease.name == self.name,
+                    or_(SchedulerLease.holder == self.identity, SchedulerLease.expires_at < now)
+                ).values(holder=self.identity, expires_at=expires_at, renewed_at=now)
+            )
+            acquired = result.rowcount == 1
+
+            if not acquired and db.session.get(SchedulerLease, self.name) is None:
+                db.session.add(SchedulerLease(
+                    name=self.name, holder=self.identity, expires_at=expires_at, renewed_at=now
+                ))
+                db.session.flush()
+                acquired = True
+
+            db.session.commit()
+
+        except IntegrityError:
+            # Another process inserted the lease row first
+            db.session.rollback()
+            acquired = False
+        except Exception as e:
+            logging.error(f"Lease renewal failed for {self.name}: {e}")
+            db.session.rollback()
+            acquired = False
+
+        with self._lock:
+            was_leader = self._is_valid()
+            # Measured from before the UPDATE so local validity never outlives the row
+            self._valid_until = started + self.ttl if acquired else 0.0
+
+        if acquired and not was_leader:
+            logging.info(f"{self.identity} acquired {self.name} leadership")
+        elif was_leader and not acquired:
+            logging.warning(f"{self.identity} lost {self.name} leadership")
+        return acquired
+
+    def _is_valid(self):
+        return time.monotonic() < self._valid_until
+
+    def is_leader(self):
+        """True while this process holds an unexpired lease"""
+        with self._lock:
+            return self._is_valid()
+
+    def release(self):
+        """Give up the lease so a standby can take over immediately"""
+        with self._lock:
+            held = self._is_valid()
+            self._valid_until = 0.0
+        if not held:
+            return
+        try:
+            db.session.execute(
+                update(SchedulerLease).where(
+                    SchedulerLease.name == self.name,
+                    SchedulerLease.holder == self.identity
+                ).values(expires_at=datetime.utcnow())
+            )
+            db.session.commit()
+            logging.info(f"{self.identity} released {self.name} leadership")
+        except Exception as e:
+            logging.error(f"Failed to release lease {self.name}: {e}")
+            db.session.rollback()
@@ -1,4 +1,7 @@
-from app import app
+from app import create_app
+
+# Local development: upgrade the schema and run the scheduler in-process
+app = create_app(upgrade_schema=True, start_scheduler=True)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=True)
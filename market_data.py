@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Market data providers used by stock_service.
+
+The live provider wraps yfinance. The replay provider serves recorded
+quotes and OHLCV bars from a JSON file with optional injected latency, so
+the request path and the scheduler can be exercised without the network.
+
+Select a provider with environment variables:
+    MARKET_DATA_PROVIDER=yfinance|replay
+    MARKET_DATA_REPLAY_FILE=replay/crwv.json
+    MARKET_DATA_REPLAY_LATENCY_MS=150
+    MARKET_DATA_REPLAY_JITTER_MS=50
+
+Record a replay file from live data:
+    python market_data.py record replay/crwv.json --symbol CRWV --period 1y
+"""
+
+import os
+import sys
+import json
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, date
+
+# Approximate trading days per yfinance period string
+PERIOD_BARS = {
+    '1d': 1, '5d': 5, '1mo': 21, '3mo': 63, '6mo': 126,
+    '1y': 252, '2y': 504, '5y': 1260, '10y': 2520,
+}
+
+class MarketDataProvider(ABC):
+    """Interface implemented by every market data source"""
+
+    name = None
+
+    @abstractmethod
+    def get_quote(self, symbol):
+        """Return the latest price for symbol, or None if unavailable"""
+
+    @abstractmethod
+    def get_history(self, symbol, period=None, start=None, end=None):
+        """
+        Return daily OHLCV bars as a DataFrame indexed by date with
+        Open/High/Low/Close/Volume columns (the yfinance shape).
+        Either period ('5d', '1mo', 'max', ...) or start/end (end exclusive).
+        """
+
+    def get_quotes(self, symbols):
+        """
+        Return {symbol: latest price or None} for several symbols
+        Providers override this to fetch the whole basket in one round trip
+        """
+        return {symbol: self.get_quote(symbol) for symbol in symbols}
+
+    def get_histories(self, symbols, period=None, start=None, end=None):
+        """Return {symbol: DataFrame} of daily bars for several symbols"""
+        return {symbol: self.get_history(symbol, period=period, start=start, end=end) for symbol in symbols}
+
+class YFinanceProvider(MarketDataProvider):
+    """Live quotes and bars from Yahoo Finance"""
+
+    name = 'yfinance'
+
+    def get_quote(self, symbol):
+        import yfinance as yf
+
+        info = yf.Ticker(symbol).info
+        # Try to get current price from different fields
+        current_price = info.get('currentPrice') or info.get('regularMarketPrice') or info.get('previousClose')
+        return float(current_price) if current_price else None
+
+    def get_history(self, symbol, period=None, start=None, end=None):
+        import yfinance as yf
+
+        ticker = yf.Ticker(symbol)
+        if start is not None:
+            return ticker.history(start=start, end=end)
+        return ticker.history(period=period or '5d')
+
+    def get_quotes(self, symbols):
+        """Latest one-minute close for every symbol from a single download"""
+        import yfinance as yf
+
+        symbols = list(symbols)
+        if len(symbols) == 1:
+            return {symbols[0]: self.get_quote(symbols[0])}
+
+        frame = yf.download(symbols, period='1d', interval='1m', group_by='ticker',
+                            threads=False, progress=False, auto_adjust=False)
+        quotes = {}
+        for symbol in symbols:
+            quotes[symbol] = _last_close(frame, symbol)
+
+        # Symbols without intraday bars (halted, pre-market) fall back to the quote endpoint
+        for symbol in [symbol for symbol, price in quotes.items() if price is None]:
+            quotes[symbol] = self.get_quote(symbol)
+        return quotes
+
+    def get_histories(self, symbols, period=None, start=None, end=None):
+        """Daily bars for every symbol from a single download"""
+        import yfinance as yf
+
+        symbols = list(symbols)
+        if len(symbols) == 1:
+            return {symbols[0]: self.get_history(symbols[0], period=period, start=start, end=end)}
+
+        if start is not None:
+            frame = yf.download(symbols, start=start, end=end, group_by='ticker',
+                                threads=False, progress=False, auto_adjust=False)
+        else:
+            frame = yf.download(symbols, period=period or '5d', group_by='ticker',
+                                threads=False, progress=False, auto_adjust=False)
+
+        histories = {}
+        for symbol in symbols:
+            if frame is None or frame.empty or symbol not in frame.columns.get_level_values(0):
+                histories[symbol] = None
+                continue
+            histories[symbol] = frame[symbol].dropna(subset=['Close'])
+        return histories
+
+def _last_close(frame, symbol):
+    """Last non-empty Close for symbol in a multi-ticker download, or None"""
+    if frame is None or frame.empty or symbol not in frame.columns.get_level_values(0):
+        return None
+    closes = frame[symbol]['Close'].dropna()
+    return float(closes.iloc[-1]) if not closes.empty else None
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Deterministic provider backed by a recorded JSON file:
+
+        {"symbols": {"CRWV": {
+            "quotes": [101.2, 101.5, ...],
+            "bars": [{"date": "2025-06-02", "open": 1.0, "high": 1.0,
+                      "low": 1.0, "close": 1.0, "volume": 100}, ...]}}}
+
+    Quotes are replayed in order and wrap around; bars are served by date.
+    Every call sleeps latency_ms plus a seeded jitter to mimic the network.
+    """
+
+    name = 'replay'
+
+    def __init__(self, path, latency_ms=0, jitter_ms=0, seed=0):
+        with open(path) as f:
+            data = json.load(f)
+
+        self.path = path
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._quotes = {}
+        self._quote_positions = {}
+        self._bars = {}
+
+        for symbol, series in data.get('symbols', {}).items():
+            symbol = symbol.upper()
+            self._quotes[symbol] = [float(q) for q in series.get('quotes', [])]
+            self._quote_positions[symbol] = 0
+            bars = sorted(series.get('bars', []), key=lambda bar: bar['date'])
+            self._bars[symbol] = [
+                (date.fromisoformat(bar['date'][:10]), bar) for bar in bars
+            ]
+
+        logging.info(f"Loaded replay market data for {sorted(self._bars)} from {path}")
+
+    def _sleep(self):
+        if not self.latency_ms and not self.jitter_ms:
+            return
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0
+        time.sleep((self.latency_ms + jitter) / 1000.0)
+
+    def get_quote(self, symbol):
+        self._sleep()
+        return self._next_quote(symbol)
+
+    def _next_quote(self, symbol):
+        symbol = symbol.upper()
+        quotes = self._quotes.get(symbol)
+        if quotes:
+            with self._lock:
+                position = self._quote_positions[symbol]
+                self._quote_positions[symbol] = (position + 1) % len(quotes)
+            return quotes[position]
+
+        # No recorded quotes: fall back to the last recorded close
+        bars = self._bars.get(symbol)
+        return float(bars[-1][1]['close']) if bars else None
+
+    def get_quotes(self, symbols):
+        # One simulated round trip for the whole basket
+        self._sleep()
+        return {symbol: self._next_quote(symbol) for symbol in symbols}
+
+    def get_histories(self, symbols, period=None, start=None, end=None):
+        self._sleep()
+        return {symbol: self._history(symbol, period, start, end) for symbol in symbols}
+
+    def get_history(self, symbol, period=None, start=None, end=None):
+        self._sleep()
+        return self._history(symbol, period, start, end)
+
+    def _history(self, symbol, period=None, start=None, end=None):
+        import pandas as pd
+
+        bars = self._bars.get(symbol.upper(), [])
+
+        if start is not None:
+            start = _as_date(start)
+            end = _as_date(end) if end is not None else date.max
+            selected = [bar for bar_date, bar in bars if start <= bar_date < end]
+        else:
+            period = period or '5d'
+            if period == 'max':
+                selected = [bar for _, bar in bars]
+            else:
+                selected = [bar for _, bar in bars[-PERIOD_BARS.get(period, 5):]]
+
+        index = pd.DatetimeIndex([pd.Timestamp(bar['date'][:10]) for bar in selected], name='Date')
+        return pd.DataFrame({
+            'Open': [float(bar['open']) for bar in selected],
+            'High': [float(bar['high']) for bar in selected],
+            'Low': [float(bar['low']) for bar in selected],
+            'Close': [float(bar['close']) for bar in selected],
+            'Volume': [int(bar.get('volume') or 0) for bar in selected],
+        }, index=index)
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def create_provider_from_env():
+    """Build the provider selected by MARKET_DATA_PROVIDER"""
+    name = os.environ.get("MARKET_DATA_PROVIDER", "yfinance").lower()
+    if name == 'replay':
+        path = os.environ.get("MARKET_DATA_REPLAY_FILE")
+        if not path:
+            raise ValueError("MARKET_DATA_REPLAY_FILE must be set when MARKET_DATA_PROVIDER=replay")
+        return ReplayProvider(
+            path,
+            latency_ms=float(os.environ.get("MARKET_DATA_REPLAY_LATENCY_MS", "0")),
+            jitter_ms=float(os.environ.get("MARKET_DATA_REPLAY_JITTER_MS", "0")),
+            seed=int(os.environ.get("MARKET_DATA_REPLAY_SEED", "0")),
+        )
+    if name != 'yfinance':
+        raise ValueError(f"Unknown MARKET_DATA_PROVIDER: {name}")
+    return YFinanceProvider()
+
+def get_provider():
+    """Return the process-wide market data provider"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider_from_env()
+                logging.info(f"Using market data provider: {_provider.name}")
+    return _provider
+
+def set_provider(provider):
+    """Replace the process-wide provider (benchmarks and one-off scripts)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+def record_replay_file(path, symbols, period='1y'):
+    """Record live bars and the current quote for symbols into a replay file"""
+    live = YFinanceProvider()
+    data = {'recorded_at': datetime.utcnow().isoformat(), 'symbols': {}}
+
+    for symbol in symbols:
+        hist = live.get_history(symbol, period=period)
+        bars = [
+            {
+                'date': index.date().isoformat(),
+                'open': float(row['Open']),
+                'high': float(row['High']),
+                'low': float(row['Low']),
+                'close': float(row['Close']),
+                'volume': int(row['Volume']),
+            }
+            for index, row in hist.iterrows()
+        ]
+        quote = live.get_quote(symbol)
+        data['symbols'][symbol.upper()] = {
+            'quotes': [quote] if quote is not None else [],
+            'bars': bars,
+        }
+        print(f"Recorded {len(bars)} bars for {symbol}")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1)
+    print(f"Wrote replay file {path}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Market data replay tools")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    record = subcommands.add_parser('record', help='Record live data into a replay file')
+    record.add_argument('path')
+    record.add_argument('--symbol', action='append', dest='symbols', help='Symbol to record (repeatable)')
+    record.add_argument('--period', default='1y')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record_replay_file(args.path, args.symbols or ['CRWV'], args.period)
+        sys.exit(0)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Bring an existing database up to the current schema.
+
+db.create_all() only creates missing tables; it never adds indexes or
+columns to tables that already exist, so those are added here.
+upgrade_schema() runs from the Procfile's release phase, `python main.py`,
+the user-creation scripts, populate_data.py and any process started with
+AUTO_UPGRADE_SCHEMA=1. Other processes only check that the tables and
+added columns exist (missing_schema) and refuse to start if they don't.
+Run it by hand with:
+
+    python migrate_schema.py
+"""
+
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+# Nullable columns added to existing tables after they were created: (table, column)
+ADDED_COLUMNS = [
+    ('notification_log', 'sender'),
+]
+
+# Indexes superseded by newer definitions: (table, index name)
+OBSOLETE_INDEXES = [
+    ('notification_log', 'ix_notification_log_sent_at'),  # replaced by ix_notification_log_sent_at_id
+    ('notification_log', 'ix_notification_log_message_sid'),  # spool recovery uses ix_notification_log_phone_sent_at
+]
+
+def ensure_indexes(db):
+    """Create every index declared on the models that the database lacks"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=db.engine, checkfirst=True)
+                created.append(index.name)
+                logging.info(f"Created index {index.name} on {table.name}")
+            except (OperationalError, ProgrammingError) as e:
+                # Another worker created it first
+                logging.warning(f"Could not create index {index.name}: {e}")
+    return created
+
+def add_missing_columns(db):
+    """Add the nullable ADDED_COLUMNS that existing tables lack; returns their names"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    for table_name, column_name in ADDED_COLUMNS:
+        if table_name not in existing_tables:
+            continue
+        if column_name in {column['name'] for column in inspector.get_columns(table_name)}:
+            continue
+        column = db.metadata.tables[table_name].c[column_name]
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+            added.append(f"{table_name}.{column_name}")
+            logging.info(f"Added column {column_name} to {table_name}")
+        except (OperationalError, ProgrammingError) as e:
+            # Another worker added it first
+            logging.warning(f"Could not add column {column_name} to {table_name}: {e}")
+    return added
+
+def drop_obsolete_indexes(db):
+    """Drop indexes that newer definitions have replaced"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    dropped = []
+
+    for table_name, index_name in OBSOLETE_INDEXES:
+        if table_name not in existing_tables:
+            continue
+        if index_name not in {index['name'] for index in inspector.get_indexes(table_name)}:
+            continue
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+            dropped.append(index_name)
+            logging.info(f"Dropped obsolete index {index_name}")
+        except (OperationalError, ProgrammingError) as e:
+            logging.warning(f"Could not drop index {index_name}: {e}")
+    return dropped
+
+def migrate_stock_data_symbol(db):
+    """
+    Move stock_data from one row per date to one row per (symbol, date).
+    Existing rows are assigned the original symbol, CRWV. Postgres alters
+    the table in place; SQLite cannot drop the inline UNIQUE(date), so the
+    table is rebuilt and the rows copied over.
+    """
+    import models
+
+    inspector = inspect(db.engine)
+    if 'stock_data' not in inspector.get_table_names():
+        return False
+    if 'symbol' in {column['name'] for column in inspector.get_columns('stock_data')}:
+        return False
+
+    table = models.StockData.__table__
+    try:
+        with db.engine.begin() as connection:
+            if db.engine.dialect.name == 'sqlite':
+                for index in inspector.get_indexes('stock_data'):
+                    connection.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+                connection.execute(text("ALTER TABLE stock_data RENAME TO stock_data_single_symbol"))
+                table.create(bind=connection)
+                columns = ', '.join(column.name for column in table.columns if column.name != 'symbol')
+                connection.execute(text(
+                    f"INSERT INTO stock_data ({columns}, symbol) "
+                    f"SELECT {columns}, 'CRWV' FROM stock_data_single_symbol"
+                ))
+                connection.execute(text("DROP TABLE stock_data_single_symbol"))
+            else:
+                connection.execute(text(
+                    "ALTER TABLE stock_data ADD COLUMN symbol VARCHAR(10) NOT NULL DEFAULT 'CRWV'"
+                ))
+                for constraint in inspector.get_unique_constraints('stock_data'):
+                    if constraint['column_names'] == ['date']:
+                        connection.execute(text(f"ALTER TABLE stock_data DROP CONSTRAINT {constraint['name']}"))
+                connection.execute(text(
+                    "ALTER TABLE stock_data ADD CONSTRAINT uq_stock_data_symbol_date UNIQUE (symbol, date)"
+                ))
+        logging.info("Migrated stock_data to per-symbol rows")
+        return True
+    except (OperationalError, ProgrammingError) as e:
+        # Another worker migrated it first
+        logging.warning(f"Could not migrate stock_data to per-symbol rows: {e}")
+        return False
+
+def missing_schema(db):
+    """
+    Model tables, and columns upgrade_schema() adds to existing tables, that
+    the database lacks, as 'table' or 'table.column'; empty if it cannot be
+    reached
+    """
+    import models
+
+    try:
+        inspector = inspect(db.engine)
+        existing = set(inspector.get_table_names())
+        missing = sorted(set(db.metadata.tables) - existing)
+        for table_name, column_name in ADDED_COLUMNS + [('stock_data', 'symbol')]:
+            if table_name in existing and column_name not in {
+                column['name'] for column in inspector.get_columns(table_name)
+            }:
+                missing.append(f"{table_name}.{column_name}")
+    except (OperationalError, ProgrammingError) as e:
+        logging.warning(f"Could not check the database schema: {e}")
+        return []
+    return missing
+
+def upgrade_schema(db):
+    """Create missing tables, columns and indexes; returns the names of new indexes"""
+    import models
+
+    migrate_stock_data_symbol(db)
+    db.create_all()
+    add_missing_columns(db)
+    created = ensure_indexes(db)
+    drop_obsolete_indexes(db)
+    models.Subscription.backfill()
+    return created
+
+if __name__ == "__main__":
+    from app import create_app, db
+
+    app = create_app(check_schema=False)
+
+    with app.app_context():
+        created = upgrade_schema(db)
+        if created:
+            print(f"Created {len(created)} indexes: {', '.join(created)}")
+        else:
+            print("Schema is up to date")
@@ -1,19 +1,236 @@
 #!/usr/bin/env python3
 """
 Migration script to move data from SQLite to Supabase PostgreSQL
+
+Tables are streamed in primary-key order, MIGRATION_BATCH_SIZE rows at a time,
+and written with COPY into a temporary table followed by
+INSERT ... ON CONFLICT DO NOTHING (multi-row upserts on other targets).
+Progress is checkpointed per table after every committed batch, so an
+interrupted run picks up where it stopped when started again against the
+same SQLite file and the same target database.
+
+    python3 migrate_to_supabase.py
+    python3 migrate_to_supabase.py --sqlite instance/crwv_moon.db --batch-size 5000 --yes
+    python3 migrate_to_supabase.py --restart      # ignore the checkpoint file
 """
 
 import os
+import io
+import csv
+import sys
+import json
+import time
 import sqlite3
-from datetime import datetime
+import argparse
+from datetime import datetime, date
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def migrate_to_supabase():
+# Rows read from SQLite and written to Postgres per round trip
+MIGRATION_BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", "5000"))
+MIGRATION_CHECKPOINT_FILE = os.environ.get("MIGRATION_CHECKPOINT_FILE", "instance/migration_checkpoint.json")
+
+class Checkpoint:
+    """Per-table progress (last primary key copied, rows, done) in a JSON file"""
+
+    def __init__(self, path, source, target):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.target = _redacted_url(target)
+        self.tables = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            # Progress only carries over for the same source *and* target:
+            # resuming into a different database would skip rows it never got
+            if (data.get('source'), data.get('target')) == (self.source, self.target):
+                self.tables = data.get('tables', {})
+            else:
+                print(f"⚠️  Checkpoint {path} is for {data.get('source')} -> {data.get('target')}; starting over")
+
+    def get(self, table):
+        return self.tables.setdefault(table, {'last_pk': None, 'rows': 0, 'done': False})
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write then rename, so a crash never leaves a torn checkpoint
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'source': self.source, 'target': self.target, 'tables': self.tables}, f, indent=1)
+        os.replace(temp_path, self.path)
+
+def _redacted_url(url):
+    """The database URL with its password masked, safe to write to the checkpoint file"""
+    from sqlalchemy.engine import make_url
+
+    url = make_url(url)
+    # postgres:// and postgresql:// name the same database
+    if url.drivername == 'postgres':
+        url = url.set(drivername='postgresql')
+    return url.render_as_string(hide_password=True)
+
+def _converter(column):
+    """Turn a raw SQLite value into the Python value for a target column"""
+    from sqlalchemy import Boolean, DateTime, Date
+
+    if isinstance(column.type, Boolean):
+        return lambda value: None if value is None else bool(value)
+    if isinstance(column.type, DateTime):
+        return lambda value: datetime.fromisoformat(value) if isinstance(value, str) else value
+    if isinstance(column.type, Date):
+        return lambda value: date.fromisoformat(value[:10]) if isinstance(value, str) else value
+    return lambda value: value
+
+def _copy_text(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value)
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _source_columns(sqlite_conn, table_name):
+    return [row[1] for row in sqlite_conn.execute(f"PRAGMA table_info({_quote(table_name)})")]
+
+def _copy_batch(raw_conn, table, columns, rows):
+    """COPY rows into a temp table, then insert them skipping existing keys"""
+    column_list = ', '.join(_quote(name) for name in columns)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator='\n')
+    for row in rows:
+        writer.writerow([_copy_text(value) for value in row])
+    buffer.seek(0)
+
+    staging = _quote(f"_migrate_{table.name}")
+    cursor = raw_conn.cursor()
+    try:
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {_quote(table.name)} INCLUDING DEFAULTS)")
+        cursor.execute(f"TRUNCATE {staging}")
+        # Unquoted empty fields are NULL; QUOTE_NONNUMERIC quotes every string
+        cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f"INSERT INTO {_quote(table.name)} ({column_list}) "
+            f"SELECT {column_list} FROM {staging} ON CONFLICT DO NOTHING"
+        )
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _upsert_batch(db, table, columns, rows):
+    """Multi-row INSERT skipping existing keys (non-Postgres targets)"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise ValueError(f"Unsupported target database: {dialect}")
+
+    values = [dict(zip(columns, row)) for row in rows]
+    with db.engine.begin() as connection:
+        # executemany: SQLAlchemy batches these into multi-row VALUES statements
+        connection.execute(dialect_insert(table).on_conflict_do_nothing(), values)
+
+def _reset_sequence(db, table):
+    """Move a Postgres serial past the ids copied from SQLite"""
+    from sqlalchemy import Integer, text
+
+    if db.engine.dialect.name != 'postgresql':
+        return
+    primary_key = list(table.primary_key.columns)
+    if len(primary_key) != 1 or not isinstance(primary_key[0].type, Integer):
+        return
+
+    column = primary_key[0].name
+    with db.engine.begin() as connection:
+        sequence = connection.execute(
+            text("SELECT pg_get_serial_sequence(:table, :column)"),
+            {'table': _quote(table.name), 'column': column}
+        ).scalar()
+        if sequence:
+            connection.execute(text(
+                f"SELECT setval(:sequence, COALESCE((SELECT MAX({_quote(column)}) FROM {_quote(table.name)}), 0) + 1, false)"
+            ), {'sequence': sequence})
+
+def migrate_table(db, sqlite_conn, table, checkpoint, batch_size=None, method='copy'):
+    """
+    Stream one table from SQLite into the target, batch by batch
+    Returns (rows copied this run, seconds)
+    """
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    state = checkpoint.get(table.name)
+    if state['done']:
+        print(f"  ⏭️  {table.name}: already migrated ({state['rows']} rows)")
+        return 0, 0.0
+
+    primary_key = list(table.primary_key.columns)
+    if len(primary_key) != 1:
+        raise ValueError(f"{table.name}: resumable migration needs a single-column primary key")
+    pk_name = primary_key[0].name
+
+    # Only columns present on both sides; new target columns keep their defaults
+    source_columns = set(_source_columns(sqlite_conn, table.name))
+    columns = [column.name for column in table.columns if column.name in source_columns]
+    converters = [_converter(table.columns[name]) for name in columns]
+    pk_index = columns.index(pk_name)
+    column_list = ', '.join(_quote(name) for name in columns)
+
+    raw_conn = db.engine.raw_connection() if method == 'copy' else None
+    started = time.perf_counter()
+    copied = 0
+
+    try:
+        while True:
+            if state['last_pk'] is None:
+                cursor = sqlite_conn.execute(
+                    f"SELECT {column_list} FROM {_quote(table.name)} ORDER BY {_quote(pk_name)} LIMIT ?",
+                    (batch_size,)
+                )
+            else:
+                cursor = sqlite_conn.execute(
+                    f"SELECT {column_list} FROM {_quote(table.name)} WHERE {_quote(pk_name)} > ? "
+                    f"ORDER BY {_quote(pk_name)} LIMIT ?",
+                    (state['last_pk'], batch_size)
+                )
+            raw_rows = cursor.fetchmany(batch_size)
+            if not raw_rows:
+                break
+
+            rows = [tuple(convert(value) for convert, value in zip(converters, raw)) for raw in raw_rows]
+            if method == 'copy':
+                _copy_batch(raw_conn, table, columns, rows)
+            else:
+                _upsert_batch(db, table, columns, rows)
+
+            copied += len(rows)
+            state['rows'] += len(rows)
+            state['last_pk'] = raw_rows[-1][pk_index]
+            checkpoint.save()
+
+            elapsed = time.perf_counter() - started
+            print(f"  {table.name}: {state['rows']} rows ({copied / elapsed:.0f} rows/s)")
+    finally:
+        if raw_conn is not None:
+            raw_conn.close()
+
+    _reset_sequence(db, table)
+    state['done'] = True
+    checkpoint.save()
+    return copied, time.perf_counter() - started
+
+def migrate_to_supabase(sqlite_path="instance/crwv_moon.db", batch_size=None,
+                        checkpoint_path=None, restart=False, assume_yes=False):
     """Migrate data from SQLite to Supabase PostgreSQL"""
-    
+
     # Check if DATABASE_URL is set for Supabase
     database_url = os.environ.get("DATABASE_URL")
     if not database_url:
@@ -21,190 +238,147 @@ def migrate_to_supabase():
         print("Please set your Supabase PostgreSQL connection string:")
         print("export DATABASE_URL='postgresql://postgres:[password]@[host]:5432/postgres'")
         return False
-    
-    if not database_url.startswith("postgresql://"):
+
+    if not database_url.startswith(("postgresql://", "postgres://")):
         print("❌ DATABASE_URL must be a PostgreSQL connection string")
         return False
-    
+
     print("✅ DATABASE_URL found - Supabase PostgreSQL connection detected")
-    
+
     # Check if SQLite database exists
-    sqlite_path = "instance/crwv_moon.db"
     if not os.path.exists(sqlite_path):
         print(f"❌ SQLite database not found at {sqlite_path}")
         return False
-    
+
     print(f"✅ SQLite database found at {sqlite_path}")
-    
+
     # Connect to SQLite database
     sqlite_conn = sqlite3.connect(sqlite_path)
-    sqlite_cursor = sqlite_conn.cursor()
-    
-    # Get table names
-    sqlite_cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = [row[0] for row in sqlite_cursor.fetchall()]
-    print(f"📊 Found tables: {tables}")
-    
-    # Check data counts
-    data_counts = {}
-    for table in tables:
-        sqlite_cursor.execute(f"SELECT COUNT(*) FROM {table}")
-        count = sqlite_cursor.fetchone()[0]
-        data_counts[table] = count
-        print(f"  {table}: {count} records")
-    
-    # Ask for confirmation
-    total_records = sum(data_counts.values())
-    if total_records == 0:
-        print("⚠️  No data found in SQLite database")
-        return True
-    
-    print(f"\n📋 Migration Summary:")
-    print(f"  Total records to migrate: {total_records}")
-    print(f"  Target database: Supabase PostgreSQL")
-    
-    confirm = input("\n🤔 Proceed with migration? (y/N): ").strip().lower()
-    if confirm != 'y':
-        print("❌ Migration cancelled")
-        return False
-    
-    # Import Flask app to handle PostgreSQL connection
+
     try:
-        from app import app, db
-        from models import User, Settings, NotificationLog, StockData
-        
+        # Get table names
+        tables = [row[0] for row in sqlite_conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
+        )]
+        print(f"📊 Found tables: {tables}")
+
+        # Check data counts
+        data_counts = {}
+        for table in tables:
+            data_counts[table] = sqlite_conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+            print(f"  {table}: {data_counts[table]} records")
+
+        total_records = sum(data_counts.values())
+        if total_records == 0:
+            print("⚠️  No data found in SQLite database")
+            return True
+
+        checkpoint_path = checkpoint_path or MIGRATION_CHECKPOINT_FILE
+        if restart and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        checkpoint = Checkpoint(checkpoint_path, sqlite_path, database_url)
+
+        print(f"\n📋 Migration Summary:")
+        print(f"  Total records to migrate: {total_records}")
+        print(f"  Target database: Supabase PostgreSQL")
+        if checkpoint.tables:
+            print(f"  Resuming from checkpoint {checkpoint_path}")
+
+        # Ask for confirmation
+        if not assume_yes:
+            confirm = input("\n🤔 Proceed with migration? (y/N): ").strip().lower()
+            if confirm != 'y':
+                print("❌ Migration cancelled")
+                return False
+
+        # Import Flask app to handle PostgreSQL connection (without the scheduler)
+        os.environ.setdefault("SCHEDULER_ENABLED", "0")
+        # The target may be empty: skip the startup schema check, the tables are created below
+        from app import create_app, db
+        from models import Subscription
+        app = create_app(check_schema=False)
+
         with app.app_context():
             print("\n🔄 Starting migration...")
-            
+
             # Create tables in PostgreSQL (if they don't exist)
             print("📝 Creating tables in PostgreSQL...")
             db.create_all()
-            
-            # Migrate Users table
-            if 'user' in data_counts and data_counts['user'] > 0:
-                print(f"👥 Migrating {data_counts['user']} users...")
-                sqlite_cursor.execute("SELECT * FROM user")
-                users = sqlite_cursor.fetchall()
-                
-                for user_row in users:
-                    # Check if user already exists
-                    existing_user = User.query.filter_by(phone_number=user_row[2]).first()
-                    if not existing_user:
-                        user = User(
-                            id=user_row[0],
-                            name=user_row[1],
-                            phone_number=user_row[2],
-                            password_hash=user_row[3],
-                            is_active=bool(user_row[4]),
-                            created_at=datetime.fromisoformat(user_row[5]) if user_row[5] else datetime.utcnow(),
-                            updated_at=datetime.fromisoformat(user_row[6]) if user_row[6] else datetime.utcnow()
-                        )
-                        db.session.add(user)
-                
-                db.session.commit()
-                print("✅ Users migrated successfully")
-            
-            # Migrate Settings table
-            if 'settings' in data_counts and data_counts['settings'] > 0:
-                print(f"⚙️  Migrating {data_counts['settings']} settings...")
-                sqlite_cursor.execute("SELECT * FROM settings")
-                settings_rows = sqlite_cursor.fetchall()
-                
-                for settings_row in settings_rows:
-                    # Check if settings already exist
-                    existing_settings = Settings.query.first()
-                    if not existing_settings:
-                        settings = Settings(
-                            id=settings_row[0],
-                            phone_number_1=settings_row[1],
-                            phone_number_2=settings_row[2],
-                            phone_number_3=settings_row[3],
-                            phone_number_4=settings_row[4],
-                            notifications_enabled=bool(settings_row[5]),
-                            market_open_time=settings_row[6],
-                            market_close_time=settings_row[7],
-                            settings_password_hash=settings_row[8],
-                            created_at=datetime.fromisoformat(settings_row[9]) if settings_row[9] else datetime.utcnow(),
-                            updated_at=datetime.fromisoformat(settings_row[10]) if settings_row[10] else datetime.utcnow()
-                        )
-                        db.session.add(settings)
-                
-                db.session.commit()
-                print("✅ Settings migrated successfully")
-            
-            # Migrate NotificationLog table
-            if 'notification_log' in data_counts and data_counts['notification_log'] > 0:
-                print(f"📱 Migrating {data_counts['notification_log']} notification logs...")
-                sqlite_cursor.execute("SELECT * FROM notification_log")
-                logs = sqlite_cursor.fetchall()
-                
-                for log_row in logs:
-                    notification = NotificationLog(
-                        id=log_row[0],
-                        notification_type=log_row[1],
-                        stock_price=log_row[2],
-                        phone_number=log_row[3],
-                        message_sid=log_row[4],
-                        status=log_row[5],
-                        error_message=log_row[6],
-                        sent_at=datetime.fromisoformat(log_row[7]) if log_row[7] else datetime.utcnow()
-                    )
-                    db.session.add(notification)
-                
-                db.session.commit()
-                print("✅ Notification logs migrated successfully")
-            
-            # Migrate StockData table
-            if 'stock_data' in data_counts and data_counts['stock_data'] > 0:
-                print(f"📈 Migrating {data_counts['stock_data']} stock data records...")
-                sqlite_cursor.execute("SELECT * FROM stock_data")
-                stock_rows = sqlite_cursor.fetchall()
-                
-                for stock_row in stock_rows:
-                    # Check if record already exists
-                    existing_stock = StockData.query.filter_by(date=stock_row[1]).first()
-                    if not existing_stock:
-                        stock_data = StockData(
-                            id=stock_row[0],
-                            date=datetime.fromisoformat(stock_row[1]).date(),
-                            open_price=stock_row[2],
-                            close_price=stock_row[3],
-                            high_price=stock_row[4],
-                            low_price=stock_row[5],
-                            volume=stock_row[6],
-                            last_updated=datetime.fromisoformat(stock_row[7]) if stock_row[7] else datetime.utcnow()
-                        )
-                        db.session.add(stock_data)
-                
-                db.session.commit()
-                print("✅ Stock data migrated successfully")
-            
+
+            method = 'copy' if db.engine.dialect.name == 'postgresql' and db.engine.dialect.driver == 'psycopg2' else 'upsert'
+            print(f"🚚 Writing with {'COPY' if method == 'copy' else 'multi-row INSERT'}, "
+                  f"{batch_size or MIGRATION_BATCH_SIZE} rows per batch")
+
+            started = time.perf_counter()
+            total_copied = 0
+
+            # Parents before children (user before subscription)
+            for table in db.metadata.sorted_tables:
+                if table.name not in data_counts:
+                    continue
+                copied, seconds = migrate_table(db, sqlite_conn, table, checkpoint,
+                                                batch_size=batch_size, method=method)
+                total_copied += copied
+                if copied:
+                    print(f"✅ {table.name}: {copied} rows in {seconds:.2f}s ({copied / seconds:.0f} rows/s)")
+
+            # Users from databases that predate subscriptions get their default one
+            Subscription.backfill()
+
+            elapsed = time.perf_counter() - started
+            rate = total_copied / elapsed if elapsed else 0
+            print(f"\n📈 Copied {total_copied} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+
+            # Verify migration success
+            from sqlalchemy import text
+            mismatched = []
+            with db.engine.connect() as connection:
+                for table in db.metadata.sorted_tables:
+                    if table.name not in data_counts:
+                        continue
+                    target_count = connection.execute(text(f"SELECT COUNT(*) FROM {_quote(table.name)}")).scalar()
+                    if target_count < data_counts[table.name]:
+                        mismatched.append(f"{table.name} ({target_count}/{data_counts[table.name]})")
+            if mismatched:
+                print(f"⚠️  Fewer rows in the target than in SQLite: {', '.join(mismatched)}")
+                print("   Rows that conflicted with existing data were skipped")
+
             print("\n🎉 Migration completed successfully!")
             print("✅ All data has been migrated to Supabase PostgreSQL")
             print("\n📋 Next steps:")
             print("1. Test your application with the new database")
             print("2. Verify all functionality works correctly")
             print("3. Consider backing up your SQLite database before removing it")
-            
+
             return True
-            
+
     except Exception as e:
         print(f"❌ Migration failed: {e}")
+        print("   Progress is checkpointed; run the script again to resume")
         import traceback
         traceback.print_exc()
         return False
-    
+
     finally:
         sqlite_conn.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a SQLite database into Supabase PostgreSQL")
+    parser.add_argument('--sqlite', default="instance/crwv_moon.db", help='Path to the SQLite database')
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default instance/migration_checkpoint.json)')
+    parser.add_argument('--restart', action='store_true', help='Ignore any checkpoint and start over')
+    parser.add_argument('--yes', action='store_true', help='Do not ask for confirmation')
+    args = parser.parse_args()
+
     print("🚀 CRWV Tracker - Supabase Migration Tool")
     print("=" * 50)
-    
-    success = migrate_to_supabase()
-    
+
+    success = migrate_to_supabase(args.sqlite, batch_size=args.batch_size, checkpoint_path=args.checkpoint,
+                                  restart=args.restart, assume_yes=args.yes)
+
     if success:
         print("\n✅ Migration completed successfully!")
     else:
         print("\n❌ Migration failed!")
-        exit(1)
+        sys.exit(1)
@@ -1,5 +1,18 @@
+import os
+import base64
+import threading
+import time
 from app import db
 from datetime import datetime
+from flask import g, has_app_context
+from sqlalchemy import event, tuple_, text
+
+# Rows fetched per page when streaming notification recipients
+SUBSCRIBER_PAGE_SIZE = int(os.environ.get("SUBSCRIBER_PAGE_SIZE", "1000"))
+
+# Seconds a process trusts its settings snapshot before re-checking the
+# version stamp (updated_at) written by other workers
+SETTINGS_CACHE_TTL = float(os.environ.get("SETTINGS_CACHE_TTL", "30"))
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -52,13 +65,12 @@ class Settings(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def get_phone_numbers(self):
-        """Get list of configured phone numbers"""
-        numbers = []
-        for i in range(1, 5):
-            phone = getattr(self, f'phone_number_{i}')
-            if phone:
-                numbers.append(phone)
-        return numbers
+        """
+        Get list of subscribed phone numbers
+        Legacy helper: recipients now live in Subscription; the
+        phone_number_1..4 columns are no longer read or written
+        """
+        return list(Subscription.iter_phone_numbers('test'))
 
     def has_password_protection(self):
         """Check if settings are password protected"""
@@ -74,22 +86,464 @@ class Settings(db.Model):
             db.session.commit()
         return settings
 
+    @classmethod
+    def get_cached(cls):
+        """
+        Get a read-only snapshot of the settings for display
+        Memoized per app context and shared across the process; the DB is
+        only asked for the version stamp every SETTINGS_CACHE_TTL seconds.
+        Use get_settings() when the row will be modified or for password
+        and access checks, which must not lag behind other workers.
+        """
+        if has_app_context() and 'settings_snapshot' in g:
+            return g.settings_snapshot
+
+        snapshot = _settings_cache.get()
+        if has_app_context():
+            g.settings_snapshot = snapshot
+        return snapshot
+
+class SettingsCache:
+    """Process-wide Settings snapshot validated against updated_at"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stamp = None
+        self._checked_at = 0.0
+
+    def get(self):
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+                return self._snapshot
+
+        # Cheap version check before loading the full row
+        row = db.session.query(Settings.id, Settings.updated_at).order_by(Settings.id).first()
+        with self._lock:
+            if row is not None and self._snapshot is not None and (row.id, row.updated_at) == self._stamp:
+                self._checked_at = time.monotonic()
+                return self._snapshot
+
+        settings = Settings.get_settings()
+        values = {column.name: getattr(settings, column.name) for column in Settings.__table__.columns}
+        # Transient copy: never attached to a session, safe to share across threads
+        snapshot = Settings(**values)
+        with self._lock:
+            self._snapshot = snapshot
+            self._stamp = (settings.id, settings.updated_at)
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._stamp = None
+
+_settings_cache = SettingsCache(SETTINGS_CACHE_TTL)
+
+@event.listens_for(Settings, 'after_update')
+@event.listens_for(Settings, 'after_insert')
+def _invalidate_settings_cache(mapper, connection, target):
+    """Writes in this process are visible immediately; other workers see the new updated_at"""
+    _settings_cache.invalidate()
+    if has_app_context():
+        g.pop('settings_snapshot', None)
+
+class Subscription(db.Model):
+    """Notification subscription and preferences for one user"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, unique=True)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    notify_open = db.Column(db.Boolean, nullable=False, default=True)
+    notify_close = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('subscription', uselist=False, passive_deletes=True))
+
+    __table_args__ = (
+        # Serves the paged recipient scan: active rows in user_id order
+        db.Index('ix_subscription_active_user', 'is_active', 'user_id'),
+    )
+
+    def __repr__(self):
+        return f'<Subscription user={self.user_id} active={self.is_active}>'
+
+    def wants(self, notification_type):
+        """Check whether this subscription receives a notification type"""
+        if notification_type == 'open':
+            return self.notify_open
+        if notification_type == 'close':
+            return self.notify_close
+        return True
+
+    @classmethod
+    def _active_query(cls, notification_type=None):
+        query = db.session.query(cls.user_id, User.phone_number).join(
+            User, User.id == cls.user_id
+        ).filter(
+            cls.is_active.is_(True),
+            User.is_active.is_(True),
+        )
+        if notification_type == 'open':
+            query = query.filter(cls.notify_open.is_(True))
+        elif notification_type == 'close':
+            query = query.filter(cls.notify_close.is_(True))
+        return query
+
+    @classmethod
+    def iter_phone_numbers(cls, notification_type=None, page_size=None):
+        """
+        Yield phone numbers of active subscribers for a notification type
+        Pages through the table by user_id (keyset), so memory stays flat
+        """
+        page_size = page_size or SUBSCRIBER_PAGE_SIZE
+        last_user_id = 0
+        while True:
+            rows = cls._active_query(notification_type).filter(
+                cls.user_id > last_user_id
+            ).order_by(cls.user_id).limit(page_size).all()
+            if not rows:
+                return
+            for user_id, phone_number in rows:
+                if phone_number:
+                    yield phone_number
+            if len(rows) < page_size:
+                return
+            last_user_id = rows[-1][0]
+
+    @classmethod
+    def count_active(cls, notification_type=None):
+        """Count active subscribers for a notification type"""
+        return cls._active_query(notification_type).count()
+
+    @classmethod
+    def count_active_cached(cls, notification_type=None):
+        """
+        count_active() for display, recounted at most every SETTINGS_CACHE_TTL
+        seconds per process; subscription and user writes in this process
+        reset it
+        """
+        with _subscriber_counts_lock:
+            cached = _subscriber_counts.get(notification_type)
+            if cached is not None and time.monotonic() - cached[1] < SETTINGS_CACHE_TTL:
+                return cached[0]
+        count = cls.count_active(notification_type)
+        with _subscriber_counts_lock:
+            _subscriber_counts[notification_type] = (count, time.monotonic())
+        return count
+
+    @classmethod
+    def backfill(cls):
+        """Create default subscriptions for users that have none"""
+        missing = db.session.query(User.id).outerjoin(
+            cls, cls.user_id == User.id
+        ).filter(cls.id.is_(None))
+        user_ids = [user_id for (user_id,) in missing]
+        if user_ids:
+            now = datetime.utcnow()
+            db.session.execute(cls.__table__.insert(), [
+                {'user_id': user_id, 'is_active': True, 'notify_open': True,
+                 'notify_close': True, 'created_at': now, 'updated_at': now}
+                for user_id in user_ids
+            ])
+            db.session.commit()
+        return len(user_ids)
+
+_subscriber_counts = {}  # notification_type -> (count, counted_at monotonic)
+_subscriber_counts_lock = threading.Lock()
+
+@event.listens_for(Subscription, 'after_insert')
+@event.listens_for(Subscription, 'after_update')
+@event.listens_for(Subscription, 'after_delete')
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_subscriber_counts(mapper, connection, target):
+    """Subscription changes in this process show up on the next dashboard render"""
+    with _subscriber_counts_lock:
+        _subscriber_counts.clear()
+
+@event.listens_for(User, 'after_insert')
+def _create_default_subscription(mapper, connection, target):
+    """Every new user (from any script or route) starts subscribed"""
+    now = datetime.utcnow()
+    connection.execute(Subscription.__table__.insert().values(
+        user_id=target.id, is_active=True, notify_open=True, notify_close=True,
+        created_at=now, updated_at=now
+    ))
+
+class PriceAlert(db.Model):
+    """
+    A user's price alert: a price level crossing ('price_above' /
+    'price_below', threshold in dollars) or a move from the previous close
+    ('percent_up' / 'percent_down', threshold in percent). A triggered
+    alert stays quiet for cooldown_minutes.
+    """
+    KINDS = ('price_above', 'price_below', 'percent_up', 'percent_down')
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    symbol = db.Column(db.String(10), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    threshold = db.Column(db.Float, nullable=False)
+    cooldown_minutes = db.Column(db.Integer, nullable=False, default=60)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    last_triggered_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('alerts', passive_deletes=True, order_by='PriceAlert.id'))
+
+    __table_args__ = (
+        # A user's alerts on their settings page
+        db.Index('ix_price_alert_user', 'user_id'),
+    )
+
+    def __repr__(self):
+        return f'<PriceAlert {self.symbol} {self.kind} {self.threshold}>'
+
+    def describe(self):
+        """Human-readable rule, e.g. 'CRWV above $120.00'"""
+        if self.kind == 'price_above':
+            return f"{self.symbol} above ${self.threshold:.2f}"
+        if self.kind == 'price_below':
+            return f"{self.symbol} below ${self.threshold:.2f}"
+        if self.kind == 'percent_up':
+            return f"{self.symbol} up {self.threshold:g}% from previous close"
+        return f"{self.symbol} down {self.threshold:g}% from previous close"
+
+@event.listens_for(PriceAlert, 'after_insert')
+@event.listens_for(PriceAlert, 'after_update')
+@event.listens_for(PriceAlert, 'after_delete')
+def _invalidate_alert_index(mapper, connection, target):
+    """Alert edits in this process rebuild the index on the next quote"""
+    from alerts import get_alert_engine
+    get_alert_engine().invalidate()
+
 class NotificationLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     notification_type = db.Column(db.String(20), nullable=False)  # 'open' or 'close'
     stock_price = db.Column(db.Float, nullable=False)
     phone_number = db.Column(db.String(20), nullable=False)
+    sender = db.Column(db.String(40), nullable=True)  # Number or Messaging Service SID it went out from
     message_sid = db.Column(db.String(100), nullable=True)
     status = db.Column(db.String(20), default='pending')  # 'sent', 'failed', 'pending'
     error_message = db.Column(db.Text, nullable=True)
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'notification_type': self.notification_type,
+            'stock_price': self.stock_price,
+            'phone_number': f"****{self.phone_number[-4:]}" if self.phone_number else None,
+            'sender': self.sender,
+            'message_sid': self.message_sid,
+            'status': self.status,
+            'error_message': self.error_message,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+        }
+
+    @classmethod
+    def newest_first(cls):
+        """Query ordered by the (sent_at, id) keyset, newest first"""
+        return cls.query.order_by(cls.sent_at.desc(), cls.id.desc())
+
+    @classmethod
+    def keyset_page(cls, before=None, after=None, per_page=20):
+        """
+        One page of logs without OFFSET or COUNT(*)
+        before: cursor of the last row seen -> older rows
+        after: cursor of the first row seen -> newer rows
+        """
+        key = tuple_(cls.sent_at, cls.id)
+        if after:
+            rows = cls.query.filter(key > tuple_(*decode_cursor(after))).order_by(
+                cls.sent_at.asc(), cls.id.asc()
+            ).limit(per_page + 1).all()
+            has_more = len(rows) > per_page
+            rows = list(reversed(rows[:per_page]))
+            return KeysetPage(rows, has_newer=has_more, has_older=True)
+
+        query = cls.newest_first()
+        if before:
+            query = query.filter(key < tuple_(*decode_cursor(before)))
+        rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        return KeysetPage(rows[:per_page], has_newer=bool(before), has_older=has_more)
+
+    @classmethod
+    def sender_status_query(cls, sender, since):
+        """Messages per status sent from one sender since a time"""
+        return db.session.query(cls.status, db.func.count()).filter(
+            cls.sender == sender, cls.sent_at >= since
+        ).group_by(cls.status)
+
+    @classmethod
+    def logged_keys_query(cls, phone_numbers, sent_ats):
+        """(phone_number, notification_type, sent_at) of stored rows, used to skip already-logged spool rows"""
+        return db.session.query(cls.phone_number, cls.notification_type, cls.sent_at).filter(
+            cls.phone_number.in_(phone_numbers), cls.sent_at.in_(sent_ats)
+        )
+
+    @classmethod
+    def sender_counts(cls, senders, since):
+        """{sender: {status: count}} since a time, one index range scan per sender"""
+        return {sender: dict(cls.sender_status_query(sender, since).all()) for sender in senders}
+
+    @classmethod
+    def approximate_count(cls):
+        """
+        Row count from planner statistics (Postgres) or the max rowid
+        (SQLite) instead of a COUNT(*) over the whole table
+        """
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            estimate = db.session.execute(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = 'notification_log'::regclass"
+            )).scalar()
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        elif dialect == 'sqlite':
+            return db.session.execute(text("SELECT max(rowid) FROM notification_log")).scalar() or 0
+        return cls.query.count()
+
+def encode_cursor(row):
+    """Opaque cursor for a (sent_at, id) position"""
+    raw = f"{row.sent_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on malformed input"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sent_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(sent_at), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+class KeysetPage:
+    """One page of keyset-paginated rows with cursors to its neighbours"""
+
+    def __init__(self, items, has_newer, has_older):
+        self.items = items
+        self.has_newer = has_newer and bool(items)
+        self.has_older = has_older and bool(items)
+        self.newer_cursor = encode_cursor(items[0]) if self.has_newer else None
+        self.older_cursor = encode_cursor(items[-1]) if self.has_older else None
+
+# Newest-first listings on the dashboard and /logs, keyset (sent_at, id)
+db.Index('ix_notification_log_sent_at_id', NotificationLog.sent_at.desc(), NotificationLog.id.desc())
+# Per-recipient history, newest first; also serves spool recovery lookups
+db.Index('ix_notification_log_phone_sent_at', NotificationLog.phone_number, NotificationLog.sent_at.desc())
+# Per-sender delivery counts
+db.Index('ix_notification_log_sender_status_sent_at', NotificationLog.sender, NotificationLog.status,
+         NotificationLog.sent_at)
+# Active users listed on /users and /settings, in id order
+db.Index('ix_user_active_id', User.id,
+         postgresql_where=User.is_active == True,  # noqa: E712
+         sqlite_where=User.is_active == True)  # noqa: E712
     
 class StockData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, nullable=False, unique=True)
+    date = db.Column(db.Date, nullable=False)
     open_price = db.Column(db.Float, nullable=True)
     close_price = db.Column(db.Float, nullable=True)
     high_price = db.Column(db.Float, nullable=True)
     low_price = db.Column(db.Float, nullable=True)
     volume = db.Column(db.BigInteger, nullable=True)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    # Added after the single-symbol schema; kept last so existing column order is unchanged
+    symbol = db.Column(db.String(10), nullable=False, default='CRWV', server_default='CRWV')
+
+    __table_args__ = (
+        # One bar per symbol per day; also serves "latest N bars for a symbol"
+        db.UniqueConstraint('symbol', 'date', name='uq_stock_data_symbol_date'),
+    )
+
+class StockSummary(db.Model):
+    """Precomputed daily/weekly change inputs, refreshed when new bars arrive"""
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(10), nullable=False, unique=True)
+    as_of = db.Column(db.Date, nullable=False)  # Eastern trading date the closes are relative to
+    current_price = db.Column(db.Float, nullable=True)
+    today_close = db.Column(db.Float, nullable=True)
+    yesterday_close = db.Column(db.Float, nullable=True)
+    week_ago_close = db.Column(db.Float, nullable=True)
+    daily_change_percent = db.Column(db.Float, nullable=True)
+    weekly_change_percent = db.Column(db.Float, nullable=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IntradayBar(db.Model):
+    """One-minute OHLC bar compacted from the intraday sampler's ticks"""
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(10), nullable=False)
+    minute = db.Column(db.DateTime, nullable=False)  # UTC start of the minute
+    open_price = db.Column(db.Float, nullable=False)
+    high_price = db.Column(db.Float, nullable=False)
+    low_price = db.Column(db.Float, nullable=False)
+    close_price = db.Column(db.Float, nullable=False)
+    samples = db.Column(db.Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        # Upsert target; also serves "a symbol's bars for a day"
+        db.UniqueConstraint('symbol', 'minute', name='uq_intraday_bar_symbol_minute'),
+    )
+
+    @classmethod
+    def after_query(cls, symbol, after):
+        """A symbol's bars that start after a UTC datetime, oldest first"""
+        return cls.query.filter(cls.symbol == symbol, cls.minute > after).order_by(cls.minute)
+
+class SchedulerLease(db.Model):
+    """Leader lease row: the holder runs scheduled jobs until expires_at"""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(120), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    renewed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SmsSenderBucket(db.Model):
+    """
+    Token bucket for one sending number, shared by every process that
+    sends from it. tokens is the balance at refilled_at (epoch seconds);
+    version turns each take into a compare-and-swap.
+    """
+    sender = db.Column(db.String(40), primary_key=True)
+    rate = db.Column(db.Float, nullable=False)
+    burst = db.Column(db.Float, nullable=False)
+    tokens = db.Column(db.Float, nullable=False)
+    refilled_at = db.Column(db.Float, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class NotificationOutbox(db.Model):
+    """
+    One pending SMS per recipient, written by the scheduler and drained by
+    worker.py. idempotency_key is unique so enqueueing the same event twice
+    (a retried job, a leader handover) never queues a second message.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(120), nullable=False, unique=True)
+    notification_type = db.Column(db.String(20), nullable=False)
+    stock_price = db.Column(db.Float, nullable=False)
+    phone_number = db.Column(db.String(20), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    lease_owner = db.Column(db.String(120), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    message_sid = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Claim query: pending rows in arrival order, and expired leases
+        db.Index('ix_notification_outbox_status_available', 'status', 'available_at', 'id'),
+        db.Index('ix_notification_outbox_status_lease', 'status', 'lease_expires_at'),
+    )
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.idempotency_key} {self.status}>'
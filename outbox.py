@@ -0,0 +1,340 @@
+import os
+import socket
+import logging
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import update, delete, bindparam, insert
+from app import db
+from models import NotificationOutbox
+
+# Rows a worker claims per round trip, and how long it may hold them before
+# another worker is allowed to reclaim them (seconds)
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_LEASE_SECONDS = float(os.environ.get("OUTBOX_LEASE_SECONDS", "120"))
+# Workers stop starting sends this many seconds before a batch's lease
+# expires (covers a send in flight and recording the batch); unsent rows
+# go back to the queue without counting as an attempt
+OUTBOX_LEASE_MARGIN = float(os.environ.get("OUTBOX_LEASE_MARGIN", "30"))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "2"))
+# Deliveries per row before it is marked failed, and the requeue backoff
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE_DELAY = float(os.environ.get("OUTBOX_RETRY_BASE_DELAY", "30"))
+OUTBOX_RETRY_MAX_DELAY = float(os.environ.get("OUTBOX_RETRY_MAX_DELAY", "900"))
+# Delivered and failed rows are purged after this many days
+OUTBOX_RETENTION_DAYS = float(os.environ.get("OUTBOX_RETENTION_DAYS", "7"))
+# Rows per INSERT when enqueueing a fan-out
+OUTBOX_ENQUEUE_CHUNK = int(os.environ.get("OUTBOX_ENQUEUE_CHUNK", "1000"))
+
+def _insert_ignoring_duplicates():
+    """
+    INSERT for the outbox that skips rows whose idempotency_key exists
+    Where conflicts are skipped, it returns the ids of the rows it wrote
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        # No portable ON CONFLICT: duplicates raise IntegrityError instead
+        return insert(NotificationOutbox.__table__)
+    table = NotificationOutbox.__table__
+    return dialect_insert(table).on_conflict_do_nothing(index_elements=['idempotency_key']).returning(table.c.id)
+
+def event_key(notification_type: str) -> str:
+    """Identifies one scheduled send, e.g. 'open:2025-06-02' (Eastern date)"""
+    today = datetime.now(pytz.timezone('US/Eastern')).date()
+    return f"{notification_type}:{today.isoformat()}"
+
+def enqueue_notifications(phone_numbers, notification_type: str, price: float, key=None, prices=None) -> dict:
+    """
+    Write one outbox row per recipient, in chunks of OUTBOX_ENQUEUE_CHUNK
+    The message body is rendered once, at enqueue time
+    Recipients already queued for the same event are skipped
+    Returns {'total': recipients seen, 'enqueued': new rows}
+    """
+    from sms_service import format_stock_message
+
+    key = key or event_key(notification_type)
+    message = format_stock_message(notification_type, price, prices)
+    statement = _insert_ignoring_duplicates()
+    now = datetime.utcnow()
+    total = enqueued = 0
+    chunk = []
+
+    def write(rows):
+        result = db.session.execute(statement, rows)
+        # rowcount is -1 for executemany on some drivers and counts skipped
+        # rows on others, so count the ids RETURNING gave back instead.
+        # Without ON CONFLICT a duplicate raises, so every row was written
+        written = len(result.all()) if result.returns_rows else len(rows)
+        db.session.commit()
+        return written
+
+    for number in phone_numbers:
+        total += 1
+        chunk.append({
+            'idempotency_key': f"{key}:{number}",
+            'notification_type': notification_type,
+            'stock_price': price,
+            'phone_number': number,
+            'message': message,
+            'status': 'pending',
+            'attempts': 0,
+            'available_at': now,
+            'created_at': now,
+        })
+        if len(chunk) >= OUTBOX_ENQUEUE_CHUNK:
+            enqueued += write(chunk)
+            chunk = []
+    if chunk:
+        enqueued += write(chunk)
+
+    logging.info(f"Enqueued {enqueued}/{total} {notification_type} notifications ({key})")
+    return {'total': total, 'enqueued': enqueued}
+
+def reclaim_expired_leases() -> int:
+    """Return rows held by a worker that died mid-batch to the queue"""
+    result = db.session.execute(
+        update(NotificationOutbox).where(
+            NotificationOutbox.status == 'sending',
+            NotificationOutbox.lease_expires_at < datetime.utcnow()
+        ).values(status='pending', lease_owner=None, lease_expires_at=None)
+    )
+    db.session.commit()
+    if result.rowcount:
+        logging.warning(f"Reclaimed {result.rowcount} outbox rows from expired leases")
+    return result.rowcount
+
+def claim_batch(worker_id: str, batch_size=None, lease_seconds=None) -> list:
+    """
+    Lease up to batch_size due rows to worker_id
+    Candidates are read in (available_at, id) order; on Postgres with
+    SKIP LOCKED so concurrent workers pick disjoint rows. The conditional
+    UPDATE makes the claim safe on SQLite as well: a row already taken by
+    another worker no longer matches status == 'pending'.
+    """
+    batch_size = batch_size or OUTBOX_BATCH_SIZE
+    lease_seconds = lease_seconds or OUTBOX_LEASE_SECONDS
+    now = datetime.utcnow()
+
+    candidates = db.session.query(NotificationOutbox.id).filter(
+        NotificationOutbox.status == 'pending',
+        NotificationOutbox.available_at <= now
+    ).order_by(NotificationOutbox.available_at, NotificationOutbox.id).limit(batch_size)
+    if db.engine.dialect.name == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+    ids = [row_id for (row_id,) in candidates]
+
+    if not ids:
+        db.session.commit()
+        return []
+
+    db.session.execute(
+        update(NotificationOutbox).where(
+            NotificationOutbox.id.in_(ids),
+            NotificationOutbox.status == 'pending'
+        ).values(
+            status='sending',
+            lease_owner=worker_id,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            attempts=NotificationOutbox.attempts + 1
+        ).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    return NotificationOutbox.query.filter(
+        NotificationOutbox.id.in_(ids),
+        NotificationOutbox.lease_owner == worker_id,
+        NotificationOutbox.status == 'sending'
+    ).order_by(NotificationOutbox.id).all()
+
+def purge_finished(retention_days=None) -> int:
+    """Delete sent and failed rows older than the retention window"""
+    retention_days = OUTBOX_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    result = db.session.execute(
+        delete(NotificationOutbox).where(
+            NotificationOutbox.status.in_(['sent', 'failed']),
+            NotificationOutbox.created_at < cutoff
+        )
+    )
+    db.session.commit()
+    if result.rowcount:
+        logging.info(f"Purged {result.rowcount} finished outbox rows")
+    return result.rowcount
+
+def pending_count() -> int:
+    """Rows waiting for delivery (including leased ones)"""
+    return NotificationOutbox.query.filter(
+        NotificationOutbox.status.in_(['pending', 'sending'])
+    ).count()
+
+class OutboxWorker:
+    """
+    Drains the outbox: claim a batch, send it with bounded concurrency,
+    then record every outcome in one executemany UPDATE guarded by the
+    lease owner. Delivery is at-least-once: if a worker dies after the
+    provider accepted a message but before the UPDATE commits, the row is
+    resent once its lease expires.
+    """
+
+    def __init__(self, batch_size=None, lease_seconds=None, poll_interval=None, concurrency=None):
+        from sms_service import send_concurrency
+
+        self.batch_size = batch_size or OUTBOX_BATCH_SIZE
+        self.lease_seconds = lease_seconds or OUTBOX_LEASE_SECONDS
+        self.poll_interval = poll_interval or OUTBOX_POLL_INTERVAL
+        self.concurrency = max(1, concurrency or send_concurrency())
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='outbox')
+        self._last_purge = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.requeued = 0
+
+    def _retry_delay(self, attempts):
+        return random.uniform(0, min(OUTBOX_RETRY_MAX_DELAY, OUTBOX_RETRY_BASE_DELAY * (2 ** (attempts - 1))))
+
+    def send_deadline(self, claimed_at):
+        """
+        time.monotonic() after which no send of a batch claimed at claimed_at
+        may start, so retries and rate-limit waits never outlive the lease
+        and hand rows still being sent to another worker
+        """
+        return claimed_at + max(self.lease_seconds - OUTBOX_LEASE_MARGIN, self.lease_seconds / 2)
+
+    def deliver(self, rows, claimed_at=None):
+        """Send a claimed batch and record the outcomes; returns rows handled"""
+        from sms_service import send_with_retry
+
+        deadline = self.send_deadline(time.monotonic() if claimed_at is None else claimed_at)
+        to_send = [row for row in rows if row.attempts <= OUTBOX_MAX_ATTEMPTS]
+        results = list(self._executor.map(
+            lambda row: send_with_retry(row.phone_number, row.message, deadline), to_send
+        ))
+        return self.record(rows, results)
+
+    def record(self, rows, results):
+        """
+        Write the outcome of a claimed batch in one executemany UPDATE
+        results holds one send result per row with attempts <= OUTBOX_MAX_ATTEMPTS,
+        in order; rows past that limit are marked failed without a send
+        """
+        from sms_service import NotificationLogBuffer
+
+        # Rows whose lease expired too often (e.g. a message that kills the worker)
+        give_up = [row for row in rows if row.attempts > OUTBOX_MAX_ATTEMPTS]
+        to_send = [row for row in rows if row.attempts <= OUTBOX_MAX_ATTEMPTS]
+
+        now = datetime.utcnow()
+        updates = []
+        log_buffer = NotificationLogBuffer()
+
+        for row in give_up:
+            error = f"Gave up after {row.attempts - 1} delivery attempts"
+            updates.append({'row_id': row.id, 'owner': self.identity, 'new_status': 'failed', 'sid': None,
+                            'error': error, 'available': row.available_at, 'sent': None,
+                            'tries': row.attempts})
+            log_buffer.add(row.phone_number, row.notification_type, row.stock_price, error=error)
+            self.failed += 1
+
+        for row, result in zip(to_send, results):
+            if not result['error']:
+                updates.append({'row_id': row.id, 'owner': self.identity, 'new_status': 'sent',
+                                'sid': result['message_sid'], 'error': None,
+                                'available': row.available_at, 'sent': now, 'tries': row.attempts})
+                log_buffer.add(row.phone_number, row.notification_type, row.stock_price,
+                               message_sid=result['message_sid'], sender=result['sender'])
+                self.sent += 1
+            elif not result['attempts']:
+                # Reached the lease deadline before its turn: back to the queue as is
+                updates.append({'row_id': row.id, 'owner': self.identity, 'new_status': 'pending',
+                                'sid': None, 'error': row.last_error, 'available': now, 'sent': None,
+                                'tries': row.attempts - 1})
+                self.requeued += 1
+            elif result['retryable'] and row.attempts < OUTBOX_MAX_ATTEMPTS:
+                # Includes messages still throttled at the deadline, so they
+                # back off in the queue instead of holding the lease
+                delay = self._retry_delay(row.attempts)
+                updates.append({'row_id': row.id, 'owner': self.identity, 'new_status': 'pending',
+                                'sid': None, 'error': result['error'],
+                                'available': now + timedelta(seconds=delay), 'sent': None,
+                                'tries': row.attempts})
+                self.requeued += 1
+            else:
+                updates.append({'row_id': row.id, 'owner': self.identity, 'new_status': 'failed',
+                                'sid': None, 'error': result['error'],
+                                'available': row.available_at, 'sent': None, 'tries': row.attempts})
+                log_buffer.add(row.phone_number, row.notification_type, row.stock_price, error=result['error'],
+                               sender=result['sender'])
+                self.failed += 1
+
+        table = NotificationOutbox.__table__
+        db.session.execute(
+            table.update().where(
+                table.c.id == bindparam('row_id'),
+                table.c.lease_owner == bindparam('owner')
+            ).values(
+                status=bindparam('new_status'),
+                message_sid=bindparam('sid'),
+                last_error=bindparam('error'),
+                available_at=bindparam('available'),
+                sent_at=bindparam('sent'),
+                attempts=bindparam('tries'),
+                lease_owner=None,
+                lease_expires_at=None
+            ),
+            updates
+        )
+        db.session.commit()
+        log_buffer.close()
+        return len(updates)
+
+    def run_once(self):
+        """Claim and deliver one batch; returns the number of rows handled"""
+        claimed_at = time.monotonic()
+        rows = claim_batch(self.identity, self.batch_size, self.lease_seconds)
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        handled = self.deliver(rows, claimed_at)
+        logging.info(f"Outbox batch of {handled} delivered in {time.perf_counter() - started:.2f}s "
+                     f"(totals: {self.sent} sent, {self.failed} failed, {self.requeued} requeued)")
+        return handled
+
+    def run(self, stop_event=None, once=False):
+        """Poll until stop_event is set (or the queue is empty, with once=True)"""
+        from sms_service import recover_spooled_logs
+
+        logging.info(f"Outbox worker {self.identity} started "
+                     f"(batch {self.batch_size}, concurrency {self.concurrency})")
+        recover_spooled_logs()
+
+        while stop_event is None or not stop_event.is_set():
+            try:
+                if time.monotonic() - self._last_purge > 3600:
+                    purge_finished()
+                    self._last_purge = time.monotonic()
+                reclaim_expired_leases()
+                handled = self.run_once()
+            except Exception as e:
+                logging.error(f"Outbox worker error: {e}")
+                db.session.rollback()
+                handled = 0
+
+            if handled:
+                continue
+            if once:
+                break
+            if stop_event is not None:
+                stop_event.wait(self.poll_interval)
+            else:
+                time.sleep(self.poll_interval)
+
+        self._executor.shutdown(wait=True)
+        logging.info(f"Outbox worker {self.identity} stopped")
@@ -1,45 +1,44 @@
 #!/usr/bin/env python3
 
-from app import app, db
+from app import create_app, db
+
+# A new install starts from an empty database; build the app before the
+# imports below use it
+app = create_app(upgrade_schema=True)
+
 from models import StockData
-from stock_service import get_stock_history
-from datetime import datetime, timedelta
+from stock_service import WATCHED_SYMBOLS, STOCK_SYMBOL
+from backfill import backfill_symbol
+from datetime import date, timedelta
 import logging
 
 def populate_historical_data():
     """Populate historical stock data if none exists"""
     with app.app_context():
-        # Check if we have any stock data
-        existing_data = StockData.query.count()
-        print(f'Existing stock data records: {existing_data}')
-        
-        if existing_data == 0:
-            print('No historical data found. Fetching from yfinance...')
-            
-            # Get historical data
-            hist_data = get_stock_history('5d')
-            if hist_data is not None and not hist_data.empty:
-                for date, row in hist_data.iterrows():
-                    stock_data = StockData(
-                        date=date.date(),
-                        open_price=float(row['Open']),
-                        close_price=float(row['Close']),
-                        high_price=float(row['High']),
-                        low_price=float(row['Low']),
-                        volume=int(row['Volume'])
-                    )
-                    db.session.add(stock_data)
-                
-                db.session.commit()
-                print(f'Added {len(hist_data)} historical records')
-            else:
-                print('Failed to fetch historical data')
+        for symbol in WATCHED_SYMBOLS:
+            populate_symbol(symbol)
         
         # Show recent data for chart
-        recent_data = StockData.query.order_by(StockData.date.desc()).limit(5).all()
+        recent_data = StockData.query.filter_by(symbol=STOCK_SYMBOL).order_by(StockData.date.desc()).limit(5).all()
         print(f'Recent data for chart: {len(recent_data)} records')
         for stock in recent_data:
             print(f'{stock.date}: Close=${stock.close_price}')
 
+def populate_symbol(symbol):
+    """Populate recent stock data for one symbol if none exists"""
+    # Check if we have any stock data
+    existing_data = StockData.query.filter_by(symbol=symbol).count()
+    print(f'Existing {symbol} stock data records: {existing_data}')
+    
+    if existing_data == 0:
+        print(f'No historical data found for {symbol}. Fetching from yfinance...')
+        
+        # Last week of bars through the bulk upsert path (see backfill.py for more)
+        report = backfill_symbol(symbol, start=date.today() - timedelta(days=7))
+        if report['rows']:
+            print(f"Added {report['rows']} historical records for {symbol}")
+        else:
+            print(f'Failed to fetch historical data for {symbol}')
+
 if __name__ == '__main__':
     populate_historical_data()
\ No newline at end of file
@@ -0,0 +1,140 @@
+import os
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+# Seconds between producer ticks and between keep-alive comments
+PRICE_STREAM_INTERVAL = float(os.environ.get("PRICE_STREAM_INTERVAL", "5"))
+PRICE_STREAM_KEEPALIVE = float(os.environ.get("PRICE_STREAM_KEEPALIVE", "15"))
+# Seconds a stream stays open before it ends and the browser reconnects
+# (after the `retry:` delay); keeps every request below the worker timeout
+PRICE_STREAM_MAX_SECONDS = float(os.environ.get("PRICE_STREAM_MAX_SECONDS", "25"))
+
+class PriceBroadcaster:
+    """
+    One producer thread per process that reads the change summary once per
+    tick and wakes every connected stream. Clients share a single
+    snapshot + version counter instead of holding their own queues, so the
+    cost of a tick does not grow with the number of open dashboards.
+    """
+
+    def __init__(self, app, interval=None, keepalive=None, max_seconds=None):
+        self.app = app
+        self.interval = interval or PRICE_STREAM_INTERVAL
+        self.keepalive = keepalive or PRICE_STREAM_KEEPALIVE
+        self.max_seconds = max_seconds or PRICE_STREAM_MAX_SECONDS
+        self._condition = threading.Condition()
+        self._data = None
+        self._payload = None
+        self._version = 0
+        self._subscribers = 0
+        self._thread = None
+        self.ticks = 0
+
+    def _snapshot(self):
+        from stock_service import get_change_summary, is_market_open, STOCK_SYMBOL
+
+        with self.app.app_context():
+            summary = get_change_summary() or {}
+            return {
+                'symbol': summary.get('symbol', STOCK_SYMBOL),
+                'current_price': summary.get('current_price'),
+                'daily_change_percent': summary.get('daily_change_percent'),
+                'weekly_change_percent': summary.get('weekly_change_percent'),
+                'market_open': is_market_open(),
+            }
+
+    def _run(self):
+        logging.info("Price stream producer started")
+        while True:
+            with self._condition:
+                if self._subscribers == 0:
+                    self._thread = None
+                    logging.info("Price stream producer stopped (no subscribers)")
+                    return
+
+            try:
+                snapshot = self._snapshot()
+                self.ticks += 1
+                self.publish(snapshot)
+            except Exception as e:
+                logging.error(f"Price stream tick failed: {e}")
+
+            time.sleep(self.interval)
+
+    def publish(self, snapshot):
+        """Wake every stream if the snapshot changed"""
+        with self._condition:
+            if snapshot == self._data:
+                return
+            self._data = snapshot
+            self._version += 1
+            self._payload = json.dumps({
+                'data': snapshot,
+                'version': self._version,
+                'updated_at': datetime.utcnow().isoformat() + 'Z',
+            })
+            self._condition.notify_all()
+
+    def _subscribe(self):
+        with self._condition:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='price-stream', daemon=True)
+                self._thread.start()
+
+    def _unsubscribe(self):
+        with self._condition:
+            self._subscribers -= 1
+
+    def stream(self):
+        """
+        Generator of server-sent events for one client
+        Ends after max_seconds; EventSource reconnects on its own and gets
+        the current snapshot first, so no update is lost
+        """
+        self._subscribe()
+        try:
+            yield f"retry: {int(self.interval * 1000)}\n\n"
+            seen = 0
+            ends_at = time.monotonic() + self.max_seconds
+            while True:
+                remaining = ends_at - time.monotonic()
+                if remaining <= 0:
+                    return
+                with self._condition:
+                    if self._version == seen:
+                        self._condition.wait(min(self.keepalive, remaining))
+                    version, payload = self._version, self._payload
+
+                if version != seen and payload is not None:
+                    seen = version
+                    yield f"event: price\nid: {version}\ndata: {payload}\n\n"
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            self._unsubscribe()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'subscribers': self._subscribers,
+                'version': self._version,
+                'ticks': self.ticks,
+                'interval': self.interval,
+                'max_seconds': self.max_seconds,
+            }
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+def get_broadcaster(app):
+    """Return the process-wide broadcaster"""
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                _broadcaster = PriceBroadcaster(app)
+    return _broadcaster
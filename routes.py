@@ -1,11 +1,22 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, Response
 from app import app, db
-from models import Settings, NotificationLog, StockData, User
-from stock_service import get_current_stock_price, get_stock_history
-from sms_service import send_stock_notification
+from models import Settings, NotificationLog, StockData, User, Subscription, PriceAlert
+from stock_service import get_current_stock_price, get_stock_history, get_quote_cache_stats, get_change_summary, get_change_summaries, STOCK_SYMBOL, WATCHED_SYMBOLS
+from sms_service import dispatch_notifications
+from price_stream import get_broadcaster
 from werkzeug.security import generate_password_hash, check_password_hash
+import os
+import json
+import hashlib
 import logging
 
+# Cache lifetimes (seconds) for /api/stock-data, tuned to market hours:
+# short while prices move, long while the market is closed
+STOCK_DATA_MAX_AGE_OPEN = int(os.environ.get("STOCK_DATA_MAX_AGE_OPEN", "10"))
+STOCK_DATA_SWR_OPEN = int(os.environ.get("STOCK_DATA_SWR_OPEN", "20"))
+STOCK_DATA_MAX_AGE_CLOSED = int(os.environ.get("STOCK_DATA_MAX_AGE_CLOSED", "300"))
+STOCK_DATA_SWR_CLOSED = int(os.environ.get("STOCK_DATA_SWR_CLOSED", "3600"))
+
 @app.route('/')
 def index():
     """Homepage showing current stock data and recent notifications"""
@@ -30,16 +41,10 @@ def index():
         hours_until_open = None
         
         if not market_open:
-            # Find next market open time
-            next_open = now_eastern.replace(hour=9, minute=30, second=0, microsecond=0)
-            
-            # If it's past 4 PM today, market opens tomorrow
-            if now_eastern.hour >= 16:
-                next_open += timedelta(days=1)
-            
-            # Skip weekends
-            while next_open.weekday() >= 5:  # Saturday = 5, Sunday = 6
-                next_open += timedelta(days=1)
+            # Find next market open time (skips weekends and exchange holidays)
+            from trading_calendar import next_market_open
+            from stock_service import get_market_hours
+            next_open = next_market_open(now_eastern, get_market_hours()[0])
             
             # Calculate hours until market opens
             time_diff = next_open - now_eastern
@@ -47,88 +52,23 @@ def index():
             market_open_time = next_open.strftime('%I:%M %p ET')
         
         # Get recent notifications
-        recent_notifications = NotificationLog.query.order_by(
-            NotificationLog.sent_at.desc()
-        ).limit(10).all()
+        recent_notifications = NotificationLog.newest_first().limit(10).all()
         
         # Get recent stock data
-        recent_stock_data = StockData.query.order_by(
+        recent_stock_data = StockData.query.filter_by(symbol=STOCK_SYMBOL).order_by(
             StockData.date.desc()
         ).limit(5).all()
         
-        # Calculate daily percentage change vs yesterday's close
-        daily_change_percent = None
-        yesterday_close = None
-        
-        # Calculate 7-day percentage change
-        weekly_change_percent = None
-        week_ago_close = None
+        # Daily and weekly change come from the precomputed summary (no queries)
+        summary = get_change_summary() or {}
+        daily_change_percent = summary.get('daily_change_percent')
+        weekly_change_percent = summary.get('weekly_change_percent')
         
-        # Try to calculate daily change even if current_price is None
-        from datetime import date, timedelta
-        from stock_service import get_daily_stock_data
-        
-        # Get today's close price
-        today_close = current_price
-        if current_price is None or not market_open:
-            # Try to get today's close price from database or fetch it
-            today_data = StockData.query.filter_by(date=date.today()).first()
-            if today_data and today_data.close_price:
-                today_close = today_data.close_price
-            else:
-                # Fetch today's close price
-                today_stock_data = get_daily_stock_data()
-                if today_stock_data and today_stock_data.get('close'):
-                    today_close = today_stock_data['close']
-        
-        # Only calculate if we have a price to work with
-        if today_close:
-            # Daily change calculation
-            yesterday = date.today() - timedelta(days=1)
-            
-            # Skip weekends - get last trading day
-            while yesterday.weekday() >= 5:  # Saturday = 5, Sunday = 6
-                yesterday -= timedelta(days=1)
-            
-            yesterday_data = StockData.query.filter_by(date=yesterday).first()
-            
-            if yesterday_data and yesterday_data.close_price:
-                yesterday_close = yesterday_data.close_price
-            elif recent_stock_data and len(recent_stock_data) >= 2:
-                # Fallback to most recent close price
-                yesterday_close = recent_stock_data[1].close_price
-            
-            if yesterday_close:
-                daily_change_percent = ((today_close - yesterday_close) / yesterday_close) * 100
-                logging.info(f"Daily change calculated: {daily_change_percent:.2f}% (today close: {today_close}, yesterday close: {yesterday_close})")
-            else:
-                logging.warning(f"No yesterday close price found for daily change calculation")
-        else:
-            logging.warning(f"No price data available for daily change calculation")
-            
-            # Weekly change calculation (7 trading days ago)
-            week_ago = date.today() - timedelta(days=7)
-            
-            # Skip weekends to get 7 trading days ago
-            trading_days_back = 0
-            while trading_days_back < 7:
-                if week_ago.weekday() < 5:  # Monday-Friday
-                    trading_days_back += 1
-                if trading_days_back < 7:
-                    week_ago -= timedelta(days=1)
-            
-            week_ago_data = StockData.query.filter_by(date=week_ago).first()
-            
-            if week_ago_data and week_ago_data.close_price:
-                week_ago_close = week_ago_data.close_price
-            elif recent_stock_data and len(recent_stock_data) >= 7:
-                # Fallback to 7th most recent close price
-                week_ago_close = recent_stock_data[6].close_price
-            
-            if week_ago_close:
-                weekly_change_percent = ((current_price - week_ago_close) / week_ago_close) * 100
+        # The other watched symbols share the batched quote fetch
+        watchlist = get_change_summaries(WATCHED_SYMBOLS[1:]) if len(WATCHED_SYMBOLS) > 1 else []
         
-        settings = Settings.get_settings()
+        settings = Settings.get_cached()
+        subscriber_count = Subscription.count_active_cached()
         
         return render_template('index.html', 
                              current_price=current_price,
@@ -140,6 +80,9 @@ def index():
                              hours_until_open=hours_until_open,
                              recent_notifications=recent_notifications,
                              recent_stock_data=recent_stock_data,
+                             watchlist=watchlist,
+                             stock_symbol=STOCK_SYMBOL,
+                             subscriber_count=subscriber_count,
                              settings=settings)
     except Exception as e:
         logging.error(f"Error loading homepage: {e}")
@@ -154,10 +97,14 @@ def index():
                              hours_until_open=None,
                              recent_notifications=[],
                              recent_stock_data=[],
-                             settings=Settings.get_settings())
+                             watchlist=[],
+                             stock_symbol=STOCK_SYMBOL,
+                             subscriber_count=0,
+                             settings=Settings.get_cached())
 
 def check_settings_access():
     """Check if user has access to settings"""
+    # Uncached: a changed or cleared password must apply on every worker at once
     settings_obj = Settings.get_settings()
     if settings_obj.has_password_protection():
         return session.get('settings_authenticated', False)
@@ -230,22 +177,6 @@ def user_settings(user_id):
     
     if request.method == 'POST':
         try:
-            # Handle password change
-            if 'new_password' in request.form:
-                new_password = request.form.get('new_password', '').strip()
-                confirm_password = request.form.get('confirm_password', '').strip()
-                
-                if new_password:
-                    if new_password == confirm_password:
-                        user.password_hash = generate_password_hash(new_password)
-                        flash('Password updated successfully!', 'success')
-                    else:
-                        flash('Passwords do not match.', 'error')
-                        return render_template('user_settings.html', user=user)
-                else:
-                    flash('Password cannot be empty.', 'error')
-                    return render_template('user_settings.html', user=user)
-            
             # Update phone number
             new_phone = request.form.get('phone_number', '').strip()
             if new_phone and new_phone != user.phone_number:
@@ -253,7 +184,7 @@ def user_settings(user_id):
                 existing_user = User.query.filter_by(phone_number=new_phone).first()
                 if existing_user and existing_user.id != user.id:
                     flash('This phone number is already registered to another user.', 'error')
-                    return render_template('user_settings.html', user=user)
+                    return render_template('user_settings.html', user=user, watched_symbols=WATCHED_SYMBOLS)
                 user.phone_number = new_phone
             
             # Update name
@@ -261,6 +192,15 @@ def user_settings(user_id):
             if new_name:
                 user.name = new_name
             
+            # Update notification preferences
+            subscription = user.subscription
+            if subscription is None:
+                subscription = Subscription(user_id=user.id)
+                db.session.add(subscription)
+            subscription.is_active = 'notifications_active' in request.form
+            subscription.notify_open = 'notify_open' in request.form
+            subscription.notify_close = 'notify_close' in request.form
+            
             db.session.commit()
             flash('Settings updated successfully!', 'success')
             return redirect(url_for('user_settings', user_id=user_id))
@@ -270,7 +210,76 @@ def user_settings(user_id):
             db.session.rollback()
             flash('Error updating settings. Please try again.', 'error')
     
-    return render_template('user_settings.html', user=user)
+    return render_template('user_settings.html', user=user, watched_symbols=WATCHED_SYMBOLS)
+
+@app.route('/user/settings/<int:user_id>/password', methods=['POST'])
+def change_user_password(user_id):
+    """Change a user's password (its own form, so saving other settings never touches it)"""
+    user = User.query.get_or_404(user_id)
+    if not check_user_access(user_id):
+        return redirect(url_for('user_login', user_id=user_id))
+    
+    new_password = request.form.get('new_password', '').strip()
+    confirm_password = request.form.get('confirm_password', '').strip()
+    
+    if not new_password:
+        flash('Password cannot be empty.', 'error')
+    elif new_password != confirm_password:
+        flash('Passwords do not match.', 'error')
+    else:
+        try:
+            user.password_hash = generate_password_hash(new_password)
+            db.session.commit()
+            flash('Password updated successfully!', 'success')
+        except Exception as e:
+            logging.error(f"Error updating password for user {user_id}: {e}")
+            db.session.rollback()
+            flash('Error updating password. Please try again.', 'error')
+    return redirect(url_for('user_settings', user_id=user_id))
+
+@app.route('/user/<int:user_id>/alerts', methods=['POST'])
+def create_price_alert(user_id):
+    """Add a price alert for a user"""
+    user = User.query.get_or_404(user_id)
+    if not check_user_access(user_id):
+        return redirect(url_for('user_login', user_id=user_id))
+    
+    symbol = request.form.get('symbol', STOCK_SYMBOL).upper()
+    kind = request.form.get('kind', '')
+    threshold = request.form.get('threshold', type=float)
+    cooldown = request.form.get('cooldown_minutes', 60, type=int)
+    
+    if symbol not in WATCHED_SYMBOLS or kind not in PriceAlert.KINDS:
+        flash('Unknown symbol or alert type.', 'error')
+    elif threshold is None or threshold <= 0:
+        flash('The alert threshold must be a positive number.', 'error')
+    elif cooldown is None or cooldown < 1:
+        flash('The cooldown must be at least one minute.', 'error')
+    else:
+        try:
+            alert = PriceAlert(user_id=user.id, symbol=symbol, kind=kind,
+                               threshold=threshold, cooldown_minutes=cooldown)
+            db.session.add(alert)
+            db.session.commit()
+            flash(f'Alert added: {alert.describe()}.', 'success')
+        except Exception as e:
+            logging.error(f"Error adding price alert: {e}")
+            db.session.rollback()
+            flash('Error adding alert. Please try again.', 'error')
+    
+    return redirect(url_for('user_settings', user_id=user_id))
+
+@app.route('/user/<int:user_id>/alerts/<int:alert_id>/delete', methods=['POST'])
+def delete_price_alert(user_id, alert_id):
+    """Remove one of a user's price alerts"""
+    if not check_user_access(user_id):
+        return redirect(url_for('user_login', user_id=user_id))
+    
+    alert = PriceAlert.query.filter_by(id=alert_id, user_id=user_id).first_or_404()
+    db.session.delete(alert)
+    db.session.commit()
+    flash('Alert removed.', 'info')
+    return redirect(url_for('user_settings', user_id=user_id))
 
 @app.route('/users')
 def users():
@@ -357,22 +366,27 @@ def settings():
                     session.pop('settings_authenticated', None)
                     flash('Password protection disabled.', 'info')
             
-            # Update phone numbers from users
-            users = User.query.filter_by(is_active=True).order_by(User.id).all()
-            phone_numbers = [user.phone_number for user in users if user.phone_number]
-            
-            # Update the settings with current user phone numbers
-            settings_obj.phone_number_1 = phone_numbers[0] if len(phone_numbers) > 0 else None
-            settings_obj.phone_number_2 = phone_numbers[1] if len(phone_numbers) > 1 else None
-            settings_obj.phone_number_3 = phone_numbers[2] if len(phone_numbers) > 2 else None
-            settings_obj.phone_number_4 = phone_numbers[3] if len(phone_numbers) > 3 else None
-            
             # Update notification settings
             settings_obj.notifications_enabled = 'notifications_enabled' in request.form
-            settings_obj.market_open_time = request.form.get('market_open_time', '09:30')
-            settings_obj.market_close_time = request.form.get('market_close_time', '16:00')
+            from stock_service import parse_market_time
+            try:
+                open_time = parse_market_time(request.form.get('market_open_time', '09:30'))
+                close_time = parse_market_time(request.form.get('market_close_time', '16:00'))
+            except ValueError:
+                flash('Market times must be in HH:MM format.', 'error')
+                return render_template('settings.html', settings=settings_obj)
+            if open_time >= close_time:
+                flash('Market open time must be before market close time.', 'error')
+                return render_template('settings.html', settings=settings_obj)
+            settings_obj.market_open_time = open_time.strftime('%H:%M')
+            settings_obj.market_close_time = close_time.strftime('%H:%M')
             
             db.session.commit()
+            
+            # Apply new market hours to this process now; other processes
+            # pick them up on their next schedule sync
+            from scheduler import sync_schedule
+            sync_schedule()
             flash('Settings updated successfully!', 'success')
             return redirect(url_for('settings'))
             
@@ -389,10 +403,7 @@ def settings():
 def test_notification():
     """Send a test notification to verify SMS functionality"""
     try:
-        settings_obj = Settings.get_settings()
-        
-        phone_numbers = settings_obj.get_phone_numbers()
-        if not phone_numbers:
+        if not Subscription.count_active('test'):
             flash('Please configure at least one phone number first.', 'error')
             return redirect(url_for('settings'))
         
@@ -403,13 +414,8 @@ def test_notification():
             return redirect(url_for('settings'))
         
         # Send test notifications to all configured numbers
-        sent_count = 0
-        for phone_number in phone_numbers:
-            try:
-                send_stock_notification(phone_number, 'test', current_price)
-                sent_count += 1
-            except Exception as e:
-                logging.error(f"Failed to send test notification to {phone_number}: {e}")
+        report = dispatch_notifications(Subscription.iter_phone_numbers('test'), 'test', current_price)
+        sent_count = report['sent']
         
         if sent_count > 0:
             flash(f'Test notification sent to {sent_count} number(s)!', 'success')
@@ -424,110 +430,177 @@ def test_notification():
 
 @app.route('/api/stock-data')
 def api_stock_data():
-    """API endpoint for current stock data"""
+    """API endpoint for current stock data (cacheable, supports conditional GET)"""
     try:
-        current_price = get_current_stock_price()
+        from stock_service import is_market_open
         
-        # Calculate daily percentage change vs yesterday's close
-        daily_change_percent = None
-        yesterday_close = None
+        symbol = request.args.get('symbol', STOCK_SYMBOL).upper()
+        if symbol not in WATCHED_SYMBOLS:
+            response = jsonify({
+                'success': False,
+                'error': f'{symbol} is not a watched symbol',
+                'watched_symbols': WATCHED_SYMBOLS
+            })
+            return response, 404
         
-        # Calculate 7-day percentage change
-        weekly_change_percent = None
-        week_ago_close = None
+        current_price = get_current_stock_price(symbol=symbol)
         
-        # Try to calculate daily change even if current_price is None
-        from datetime import date, timedelta
-        from stock_service import get_daily_stock_data, is_market_open
+        # Daily and weekly change come from the precomputed summary (no queries)
+        summary = get_change_summary(symbol) or {}
         
-        # Check if market is open
-        market_open = is_market_open()
+        payload = {
+            'success': True,
+            'current_price': current_price,
+            'daily_change_percent': summary.get('daily_change_percent'),
+            'weekly_change_percent': summary.get('weekly_change_percent'),
+            'yesterday_close': summary.get('yesterday_close'),
+            'week_ago_close': summary.get('week_ago_close'),
+            'symbol': symbol
+        }
+        response = jsonify(payload)
         
-        # Get today's close price
-        today_close = current_price
-        if current_price is None or not market_open:
-            # Try to get today's close price from database or fetch it
-            today_data = StockData.query.filter_by(date=date.today()).first()
-            if today_data and today_data.close_price:
-                today_close = today_data.close_price
-            else:
-                # Fetch today's close price
-                today_stock_data = get_daily_stock_data()
-                if today_stock_data and today_stock_data.get('close'):
-                    today_close = today_stock_data['close']
+        # Strong ETag from the quote content: identical across workers, so a
+        # CDN or browser revalidation gets a 304 until the price changes
+        version = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        response.set_etag(version)
         
-        # Only calculate if we have a price to work with
-        if today_close:
-            # Daily change calculation
-            yesterday = date.today() - timedelta(days=1)
-            
-            # Skip weekends - get last trading day
-            while yesterday.weekday() >= 5:  # Saturday = 5, Sunday = 6
-                yesterday -= timedelta(days=1)
-            
-            yesterday_data = StockData.query.filter_by(date=yesterday).first()
-            
-            if yesterday_data and yesterday_data.close_price:
-                yesterday_close = yesterday_data.close_price
-            else:
-                # Fallback to most recent close price
-                recent_stock_data = StockData.query.order_by(StockData.date.desc()).limit(2).all()
-                if recent_stock_data and len(recent_stock_data) >= 2:
-                    yesterday_close = recent_stock_data[1].close_price
-            
-            if yesterday_close:
-                daily_change_percent = ((today_close - yesterday_close) / yesterday_close) * 100
-            
-            # Weekly change calculation (7 trading days ago)
-            week_ago = date.today() - timedelta(days=7)
-            
-            # Skip weekends to get 7 trading days ago
-            trading_days_back = 0
-            while trading_days_back < 7:
-                if week_ago.weekday() < 5:  # Monday-Friday
-                    trading_days_back += 1
-                if trading_days_back < 7:
-                    week_ago -= timedelta(days=1)
-            
-            week_ago_data = StockData.query.filter_by(date=week_ago).first()
-            
-            if week_ago_data and week_ago_data.close_price:
-                week_ago_close = week_ago_data.close_price
-            else:
-                # Fallback to 7th most recent close price
-                recent_stock_data = StockData.query.order_by(StockData.date.desc()).limit(7).all()
-                if recent_stock_data and len(recent_stock_data) >= 7:
-                    week_ago_close = recent_stock_data[6].close_price
-            
-            if week_ago_close:
-                weekly_change_percent = ((current_price - week_ago_close) / week_ago_close) * 100
+        response.cache_control.public = True
+        if is_market_open():
+            response.cache_control.max_age = STOCK_DATA_MAX_AGE_OPEN
+            response.cache_control.stale_while_revalidate = STOCK_DATA_SWR_OPEN
+        else:
+            response.cache_control.max_age = STOCK_DATA_MAX_AGE_CLOSED
+            response.cache_control.stale_while_revalidate = STOCK_DATA_SWR_CLOSED
         
-        return jsonify({
-            'success': True,
-            'current_price': current_price,
-            'daily_change_percent': daily_change_percent,
-            'weekly_change_percent': weekly_change_percent,
-            'yesterday_close': yesterday_close,
-            'week_ago_close': week_ago_close,
-            'symbol': 'CRWV'
-        })
+        return response.make_conditional(request)
     except Exception as e:
         logging.error(f"API error: {e}")
-        return jsonify({
+        response = jsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        })
+        response.cache_control.no_store = True
+        return response, 500
+
+@app.route('/api/intraday')
+def api_intraday():
+    """
+    Today's sampled prices for a symbol. The full series comes from this
+    process's memory; ?since= polls come from the shared intraday_bar table
+    so they stay consistent whichever worker answers
+    """
+    from intraday import get_sampler
+    
+    symbol = request.args.get('symbol', STOCK_SYMBOL).upper()
+    if symbol not in WATCHED_SYMBOLS:
+        return jsonify({
+            'success': False,
+            'error': f'{symbol} is not a watched symbol',
+            'watched_symbols': WATCHED_SYMBOLS
+        }), 404
+    
+    resolution = request.args.get('resolution', 'tick')
+    if resolution not in ('tick', 'minute'):
+        return jsonify({'success': False, 'error': "resolution must be 'tick' or 'minute'"}), 400
+    
+    # Incremental polling: only minutes after ?since= (the previous response's cursor)
+    since = request.args.get('since', type=float)
+    
+    if since is None:
+        payload = get_sampler().series(symbol, resolution=resolution)
+    else:
+        payload = get_sampler().stored_series(symbol, since, resolution=resolution)
+    payload['success'] = True
+    response = jsonify(payload)
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/stock-stream')
+def api_stock_stream():
+    """Server-sent events stream of price and change updates"""
+    return Response(
+        get_broadcaster(app).stream(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable proxy buffering (nginx)
+        }
+    )
+
+@app.route('/api/quote-cache')
+def api_quote_cache():
+    """API endpoint exposing quote cache hit/miss counters and upstream latency"""
+    from intraday import get_sampler
+    from alerts import get_alert_engine
+    return jsonify({
+        'success': True,
+        'quote_cache': get_quote_cache_stats(),
+        'price_stream': get_broadcaster(app).stats(),
+        'intraday': get_sampler().stats(),
+        'alerts': get_alert_engine().stats()
+    })
+
+@app.route('/api/sms-senders')
+def api_sms_senders():
+    """API endpoint with per-sender delivery counts (last 24 hours, all processes) and this process's limits"""
+    from datetime import datetime, timedelta
+    from sms_service import SMS_SENDERS
+    from sms_limits import sender_stats, get_sender_bucket
+
+    try:
+        since = datetime.utcnow() - timedelta(hours=24)
+        counts = NotificationLog.sender_counts(SMS_SENDERS, since)
+        live = sender_stats()
+        senders = [{
+            'sender': sender,
+            'rate_per_second': get_sender_bucket(sender).rate,
+            'last_24h': counts.get(sender, {}),
+            'process': live.get(sender),
+        } for sender in SMS_SENDERS]
+        return jsonify({'success': True, 'senders': senders})
+    except Exception as e:
+        logging.error(f"Error in SMS senders API: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/logs')
 def logs():
     """View notification logs"""
-    page = request.args.get('page', 1, type=int)
     per_page = 20
+    try:
+        notifications = NotificationLog.keyset_page(
+            before=request.args.get('before'),
+            after=request.args.get('after'),
+            per_page=per_page
+        )
+    except ValueError:
+        return redirect(url_for('logs'))
     
-    notifications = NotificationLog.query.order_by(
-        NotificationLog.sent_at.desc()
-    ).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    approximate_total = NotificationLog.approximate_count()
+    
+    return render_template('logs.html', notifications=notifications, approximate_total=approximate_total)
+
+@app.route('/api/logs')
+def api_logs():
+    """API endpoint for notification logs with cursor pagination"""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    try:
+        page = NotificationLog.keyset_page(
+            before=request.args.get('before'),
+            after=request.args.get('after'),
+            per_page=limit
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     
-    return render_template('logs.html', notifications=notifications)
+    response = {
+        'success': True,
+        'items': [notification.to_dict() for notification in page.items],
+        'newer_cursor': page.newer_cursor,
+        'older_cursor': page.older_cursor,
+    }
+    if request.args.get('count') == 'approximate':
+        response['approximate_total'] = NotificationLog.approximate_count()
+    return jsonify(response)
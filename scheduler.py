@@ -1,97 +1,252 @@
 import logging
+import functools
 from datetime import datetime, time
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from stock_service import get_current_stock_price, get_daily_stock_data, is_market_open
+from apscheduler.triggers.interval import IntervalTrigger
+from stock_service import (get_current_prices, get_daily_stock_data_batch, is_market_open,
+                           load_market_hours, STOCK_SYMBOL, MARKET_HOURS_SYNC_INTERVAL)
 from sms_service import send_daily_notifications
-from app import app
+from leadership import LeaseElector, SCHEDULER_LEASE_RENEW
+from trading_calendar import get_calendar, EASTERN, EARLY_CLOSE
+from intraday import get_sampler, INTRADAY_SAMPLE_INTERVAL, INTRADAY_COMPACT_INTERVAL
+from app import app, db
 
 scheduler = None
+elector = LeaseElector('scheduler')
+# (open, close) the notification jobs are currently scheduled for
+_scheduled_hours = None
 
+def leader_only(func):
+    """Run a scheduled job only in the process holding the scheduler lease"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not elector.is_leader():
+            logging.info(f"Skipping {func.__name__}: {elector.identity} is on standby")
+            return None
+        return func(*args, **kwargs)
+    return wrapper
+
+def trading_session_only(func):
+    """Skip a scheduled job on weekends and exchange holidays"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        today = datetime.now(EASTERN).date()
+        calendar = get_calendar(today)
+        if not calendar.is_session(today):
+            reason = calendar.holiday_name(today) or 'weekend'
+            logging.info(f"Skipping {func.__name__}: {today} is not a trading session ({reason})")
+            return None
+        return func(*args, **kwargs)
+    return wrapper
+
+def _weekday_trigger(at):
+    """Monday-Friday cron trigger at a US/Eastern time of day"""
+    return CronTrigger(day_of_week='mon-fri', hour=at.hour, minute=at.minute, timezone='US/Eastern')
+
+def _notification_triggers(open_time, close_time):
+    """Triggers for the open, close and early-close jobs"""
+    return {
+        'market_open_notification': _weekday_trigger(open_time),
+        'market_close_notification': _weekday_trigger(close_time),
+        # Early closes (day after Thanksgiving, Christmas Eve, July 3)
+        'market_early_close_notification': _weekday_trigger(min(close_time, EARLY_CLOSE)),
+    }
+
+def sync_schedule():
+    """
+    Reschedule the notification jobs if the configured market hours changed
+    Runs in every process on an interval, so an edit on the settings page
+    reaches all workers without a restart. Market hours are read through the
+    Settings cache: most runs cost no query at all. Processes without a
+    scheduler still refresh their cached market hours here.
+    """
+    global _scheduled_hours
+    try:
+        with app.app_context():
+            hours = load_market_hours()
+        if scheduler is None or hours == _scheduled_hours:
+            return
+        for job_id, trigger in _notification_triggers(*hours).items():
+            scheduler.reschedule_job(job_id, trigger=trigger)
+        _scheduled_hours = hours
+        logging.info(f"Rescheduled market notifications for {hours[0]:%H:%M} open, {hours[1]:%H:%M} close ET")
+    except Exception as e:
+        logging.error(f"Error syncing notification schedule: {e}")
+
+def sample_intraday():
+    """Record a tick per watched symbol in this process's intraday buffer"""
+    with app.app_context():
+        try:
+            get_sampler().sample()
+        except Exception as e:
+            logging.error(f"Error sampling intraday prices: {e}")
+
+@leader_only
+def compact_intraday():
+    """Write completed intraday minutes to intraday_bar"""
+    with app.app_context():
+        try:
+            get_sampler().compact()
+        except Exception as e:
+            logging.error(f"Error compacting intraday bars: {e}")
+            db.session.rollback()
+
+def renew_leadership():
+    """Heartbeat: acquire or renew the scheduler lease"""
+    with app.app_context():
+        elector.try_acquire()
+
+@leader_only
+@trading_session_only
 def send_market_open_notification():
     """Send market open notification"""
     with app.app_context():
         try:
             logging.info("Sending market open notification")
             
-            # Get current stock price
-            current_price = get_current_stock_price()
+            # Get current prices for every watched symbol in one batched call
+            # (bypass the quote cache TTL for the alert)
+            prices = get_current_prices(force_refresh=True)
+            current_price = prices.get(STOCK_SYMBOL)
             if current_price is None:
                 logging.error("Could not fetch current stock price for market open notification")
                 return
             
             # Send notifications
-            send_daily_notifications('open', current_price)
+            send_daily_notifications('open', current_price, prices)
             
         except Exception as e:
             logging.error(f"Error in market open notification: {e}")
 
-def send_market_close_notification():
-    """Send market close notification"""
+@leader_only
+@trading_session_only
+def send_market_close_notification(early_close=False):
+    """
+    Send market close notification
+    Scheduled at both the early (13:00) and regular close; each run only
+    sends if it matches today's session close
+    """
+    if get_calendar().is_early_close(datetime.now(EASTERN).date()) != early_close:
+        return
+    
     with app.app_context():
         try:
             logging.info("Sending market close notification")
             
-            # Get daily stock data which should include closing price
-            today_data = get_daily_stock_data()
-            if today_data is None or today_data.get('close') is None:
-                # Fallback to current price
-                current_price = get_current_stock_price()
-                if current_price is None:
-                    logging.error("Could not fetch stock price for market close notification")
-                    return
-                close_price = current_price
-            else:
-                close_price = today_data['close']
+            # Get daily stock data which should include closing prices
+            bars = get_daily_stock_data_batch()
+            prices = {
+                symbol: bar['close'] if bar and bar.get('close') is not None else None
+                for symbol, bar in bars.items()
+            }
+            
+            # Fallback to current prices for symbols without a bar yet
+            missing = [symbol for symbol, price in prices.items() if price is None]
+            if missing:
+                prices.update(get_current_prices(missing, force_refresh=True))
+            
+            close_price = prices.get(STOCK_SYMBOL)
+            if close_price is None:
+                logging.error("Could not fetch stock price for market close notification")
+                return
             
             # Send notifications
-            send_daily_notifications('close', close_price)
+            send_daily_notifications('close', close_price, prices)
             
         except Exception as e:
             logging.error(f"Error in market close notification: {e}")
 
 def init_scheduler():
     """Initialize the background scheduler"""
-    global scheduler
+    global scheduler, _scheduled_hours
     
     try:
         scheduler = BackgroundScheduler()
         
-        # Schedule market open notification (Monday-Friday at 9:30 AM EST)
+        # Every worker runs the scheduler, but only the lease holder sends.
+        # Standbys keep trying so one takes over when the leader dies.
+        renew_leadership()
+        scheduler.add_job(
+            func=renew_leadership,
+            trigger=IntervalTrigger(seconds=SCHEDULER_LEASE_RENEW),
+            id='scheduler_leadership',
+            name='Scheduler Leadership Heartbeat',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        
+        # Market open/close notifications at the configured market hours
+        with app.app_context():
+            hours = load_market_hours()
+        triggers = _notification_triggers(*hours)
+        
         scheduler.add_job(
             func=send_market_open_notification,
-            trigger=CronTrigger(
-                day_of_week='mon-fri',  # Monday through Friday
-                hour=9,
-                minute=30,
-                timezone='US/Eastern'
-            ),
+            trigger=triggers['market_open_notification'],
             id='market_open_notification',
             name='Market Open Notification',
             replace_existing=True
         )
         
-        # Schedule market close notification (Monday-Friday at 4:00 PM EST)
         scheduler.add_job(
             func=send_market_close_notification,
-            trigger=CronTrigger(
-                day_of_week='mon-fri',  # Monday through Friday
-                hour=16,
-                minute=0,
-                timezone='US/Eastern'
-            ),
+            trigger=triggers['market_close_notification'],
             id='market_close_notification',
             name='Market Close Notification',
             replace_existing=True
         )
         
+        scheduler.add_job(
+            func=send_market_close_notification,
+            trigger=triggers['market_early_close_notification'],
+            args=[True],
+            id='market_early_close_notification',
+            name='Market Early Close Notification',
+            replace_existing=True
+        )
+        _scheduled_hours = hours
+        
+        # Pick up market hours changed from any process
+        scheduler.add_job(
+            func=sync_schedule,
+            trigger=IntervalTrigger(seconds=MARKET_HOURS_SYNC_INTERVAL),
+            id='market_hours_sync',
+            name='Market Hours Sync',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        
+        # Intraday ticks are sampled in every process, compacted by the leader
+        if INTRADAY_SAMPLE_INTERVAL > 0:
+            scheduler.add_job(
+                func=sample_intraday,
+                trigger=IntervalTrigger(seconds=INTRADAY_SAMPLE_INTERVAL),
+                id='intraday_sample',
+                name='Intraday Price Sample',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            scheduler.add_job(
+                func=compact_intraday,
+                trigger=IntervalTrigger(seconds=INTRADAY_COMPACT_INTERVAL),
+                id='intraday_compact',
+                name='Intraday Minute Bar Compaction',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+        
         # Start the scheduler
         scheduler.start()
         logging.info("Scheduler initialized and started successfully")
         
         # Register shutdown handler
         import atexit
-        atexit.register(lambda: scheduler.shutdown())
+        atexit.register(stop_scheduler)
         
     except Exception as e:
         logging.error(f"Failed to initialize scheduler: {e}")
@@ -102,3 +257,5 @@ def stop_scheduler():
     if scheduler and scheduler.running:
         scheduler.shutdown()
         logging.info("Scheduler stopped")
+    with app.app_context():
+        elector.release()
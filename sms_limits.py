@@ -0,0 +1,358 @@
+import os
+import math
+import asyncio
+import logging
+import threading
+import time
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from models import SmsSenderBucket
+from sms_service import SMS_RATE_LIMIT_PER_SECOND, SMS_MAX_CONCURRENCY
+
+# Per-sender send rates (messages/second) overriding SMS_RATE_LIMIT_PER_SECOND,
+# e.g. "+15551234567=1,+18005550100=3" (long codes 1, toll-free 3, short codes 100)
+SMS_SENDER_RATE_LIMITS = os.environ.get("SMS_SENDER_RATE_LIMITS", "")
+# 'db' shares each number's bucket across processes; 'process' keeps it local
+SMS_RATE_LIMIT_SCOPE = os.environ.get("SMS_RATE_LIMIT_SCOPE", "db").lower()
+# Seconds of tokens a process takes from the shared bucket per DB round trip
+SMS_TOKEN_LEASE_SECONDS = float(os.environ.get("SMS_TOKEN_LEASE_SECONDS", "0.2"))
+
+# Adaptive concurrency: the starting point (it doubles per round trip until
+# the first sign of congestion), the floor, and how many times the best
+# latency seen a send may take before it counts as congestion
+SMS_INITIAL_CONCURRENCY = int(os.environ.get("SMS_INITIAL_CONCURRENCY", "8"))
+SMS_MIN_CONCURRENCY = int(os.environ.get("SMS_MIN_CONCURRENCY", "1"))
+SMS_LATENCY_TOLERANCE = float(os.environ.get("SMS_LATENCY_TOLERANCE", "3"))
+
+def parse_sender_limits(value):
+    """Parse "number=rate,..." into {number: rate}; bad entries are logged and skipped"""
+    limits = {}
+    for entry in (value or '').split(','):
+        if not entry.strip():
+            continue
+        sender, _, rate = entry.partition('=')
+        try:
+            limits[sender.strip()] = float(rate)
+        except ValueError:
+            logging.error(f"Ignoring bad SMS_SENDER_RATE_LIMITS entry: {entry!r}")
+    return limits
+
+class SenderTokenBucket:
+    """
+    Send-rate limit for one sending number. With the 'db' scope the bucket
+    is an SmsSenderBucket row shared by every process: a process takes a
+    lease of SMS_TOKEN_LEASE_SECONDS worth of tokens with a compare-and-swap
+    UPDATE and hands them out locally, so the database sees a few writes a
+    second per process rather than one per message. If the database is
+    unavailable the bucket falls back to this process alone.
+    """
+
+    def __init__(self, sender, rate, burst=None, shared=True, lease_seconds=None):
+        self.sender = sender
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.shared = shared
+        self.lease_size = max(1, min(math.ceil(rate * (lease_seconds or SMS_TOKEN_LEASE_SECONDS)), int(self.burst)))
+        self._lock = threading.Lock()
+        self._lease_lock = threading.Lock()
+        self._reserve = 0
+        self._engine = None
+        # Local bucket state, used by the 'process' scope and as the fallback
+        self._tokens = self.burst
+        self._updated = time.time()
+        self.leases = 0
+        self.penalties = 0
+
+    def _get_engine(self):
+        if self._engine is None:
+            from app import app, db
+            with app.app_context():
+                self._engine = db.engine
+        return self._engine
+
+    def _refill(self, tokens, refilled_at, now):
+        return min(self.burst, tokens + max(now - refilled_at, 0.0) * self.rate)
+
+    def _lease_local(self, wanted):
+        with self._lock:
+            now = time.time()
+            self._tokens = self._refill(self._tokens, self._updated, now)
+            self._updated = now
+            granted = min(wanted, int(self._tokens))
+            self._tokens -= granted
+            return granted, (1 - self._tokens) / self.rate
+
+    def _lease_shared(self, wanted):
+        table = SmsSenderBucket.__table__
+        engine = self._get_engine()
+        for _ in range(10):
+            now = time.time()
+            try:
+                with engine.begin() as connection:
+                    row = connection.execute(select(table).where(table.c.sender == self.sender)).first()
+                    if row is None:
+                        granted = min(wanted, int(self.burst))
+                        connection.execute(table.insert().values(
+                            sender=self.sender, rate=self.rate, burst=self.burst,
+                            tokens=self.burst - granted, refilled_at=now, version=0
+                        ))
+                        return granted, 0.0
+
+                    tokens = self._refill(row.tokens, row.refilled_at, now)
+                    if tokens < wanted:
+                        # Wait for a whole lease rather than writing for every token
+                        return 0, (wanted - tokens) / self.rate
+                    result = connection.execute(update(table).where(
+                        table.c.sender == self.sender, table.c.version == row.version
+                    ).values(tokens=tokens - wanted, refilled_at=now, rate=self.rate,
+                             burst=self.burst, version=row.version + 1))
+                    if result.rowcount == 1:
+                        return wanted, 0.0
+            except IntegrityError:
+                pass  # Another process created the row first
+        # Lost every compare-and-swap: the bucket is busy, try again shortly
+        return 0, 1 / self.rate
+
+    def _lease(self):
+        """Top up the local reserve; returns seconds to wait if it is still empty"""
+        with self._lease_lock:
+            with self._lock:
+                if self._reserve > 0:
+                    return 0.0
+            if self.shared:
+                try:
+                    granted, wait = self._lease_shared(self.lease_size)
+                except Exception as e:
+                    logging.error(f"Shared SMS rate limit for {self.sender} unavailable, limiting locally: {e}")
+                    granted, wait = self._lease_local(self.lease_size)
+            else:
+                granted, wait = self._lease_local(self.lease_size)
+            with self._lock:
+                self.leases += 1
+                self._reserve += granted
+            return 0.0 if granted else max(wait, 0.001)
+
+    def _take(self):
+        with self._lock:
+            if self._reserve > 0:
+                self._reserve -= 1
+                return True
+            return False
+
+    def acquire(self, deadline=None):
+        """
+        Block until this sender may send one message; returns False instead
+        if no token is due before deadline (time.monotonic())
+        """
+        if self.rate <= 0:
+            return True
+        while not self._take():
+            wait = self._lease()
+            if wait:
+                if deadline is not None and time.monotonic() + wait >= deadline:
+                    return False
+                time.sleep(wait)
+        return True
+
+    async def acquire_async(self, deadline=None):
+        """acquire() for coroutines; waits on the loop instead of a thread"""
+        if self.rate <= 0:
+            return True
+        while not self._take():
+            wait = await asyncio.to_thread(self._lease)
+            if wait:
+                if deadline is not None and time.monotonic() + wait >= deadline:
+                    return False
+                await asyncio.sleep(wait)
+        return True
+
+    def penalize(self):
+        """
+        The provider throttled this sender: drop the local reserve and empty
+        the shared bucket, so every process backs off before the next send
+        """
+        if self.rate <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._reserve = 0
+            self._tokens = 0.0
+            self._updated = now
+            self.penalties += 1
+        if not self.shared:
+            return
+        try:
+            table = SmsSenderBucket.__table__
+            with self._get_engine().begin() as connection:
+                connection.execute(update(table).where(table.c.sender == self.sender).values(
+                    tokens=0.0, refilled_at=now, version=table.c.version + 1
+                ))
+        except Exception as e:
+            logging.error(f"Failed to share SMS throttle for {self.sender}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {'rate': self.rate, 'shared': self.shared, 'leases': self.leases,
+                    'penalties': self.penalties, 'reserve': self._reserve}
+
+class AimdConcurrency:
+    """
+    Concurrency limit for sends, adapted AIMD style. It starts at
+    SMS_INITIAL_CONCURRENCY and doubles every round trip (slow start) until
+    the first decrease, then grows by about one per round trip of
+    successful sends. It halves on a 429 and shrinks by 10% when latency
+    climbs past SMS_LATENCY_TOLERANCE times the best seen.
+    Only sends that started after the last decrease can decrease it again,
+    so one burst of 429s halves it once. enter/leave gate threads;
+    coroutines use try_enter with an asyncio.Condition.
+    """
+
+    def __init__(self, maximum, minimum=None, initial=None):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum or SMS_MIN_CONCURRENCY, self.maximum))
+        self.limit = float(min(max(initial or SMS_INITIAL_CONCURRENCY, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.best_latency = None
+        self.decreases = 0
+        self._decreased_at = 0.0
+        self._changed = threading.Condition()
+
+    def try_enter(self):
+        with self._changed:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def enter(self, deadline=None):
+        """Block until a send slot is free; False if none frees up before deadline"""
+        with self._changed:
+            while self.in_flight >= int(self.limit):
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return False
+                self._changed.wait(timeout)
+            self.in_flight += 1
+            return True
+
+    def _decrease(self, started, factor):
+        if started < self._decreased_at:
+            return
+        self.limit = max(self.minimum, self.limit * factor)
+        self._decreased_at = time.monotonic()
+        self.decreases += 1
+
+    def leave(self, started, latency=None, throttled=False):
+        """
+        Free a slot and adapt the limit: started is when the request went
+        out, latency is given for a successful send, throttled for a 429.
+        Returns the number of free slots.
+        """
+        with self._changed:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease(started, 0.5)
+            elif latency is not None:
+                if self.best_latency is None or latency < self.best_latency:
+                    self.best_latency = latency
+                if latency > self.best_latency * SMS_LATENCY_TOLERANCE:
+                    self._decrease(started, 0.9)
+                elif self.decreases:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1)
+            free = max(int(self.limit) - self.in_flight, 0)
+            self._changed.notify(free)
+            return free
+
+    def stats(self):
+        with self._changed:
+            return {'limit': round(self.limit, 2), 'in_flight': self.in_flight,
+                    'decreases': self.decreases, 'best_latency': self.best_latency}
+
+_buckets = {}
+_concurrency = {}
+_registry_lock = threading.Lock()
+
+def get_sender_bucket(sender):
+    """Return the process-wide token bucket for a sender (a number or Messaging Service SID)"""
+    bucket = _buckets.get(sender)
+    if bucket is None:
+        with _registry_lock:
+            bucket = _buckets.get(sender)
+            if bucket is None:
+                rate = parse_sender_limits(SMS_SENDER_RATE_LIMITS).get(sender, SMS_RATE_LIMIT_PER_SECOND)
+                bucket = SenderTokenBucket(sender, rate, shared=SMS_RATE_LIMIT_SCOPE == 'db')
+                _buckets[sender] = bucket
+    return bucket
+
+def get_sender_concurrency(sender):
+    """Return the process-wide adaptive concurrency limit for threads sending from a sender"""
+    limit = _concurrency.get(sender)
+    if limit is None:
+        with _registry_lock:
+            limit = _concurrency.get(sender)
+            if limit is None:
+                limit = AimdConcurrency(SMS_MAX_CONCURRENCY)
+                _concurrency[sender] = limit
+    return limit
+
+class SenderMetrics:
+    """Send outcomes for one sender in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.attempts = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record(self, result):
+        with self._lock:
+            if result['error']:
+                self.failed += 1
+            else:
+                self.sent += 1
+            self.throttled += result['throttled']
+            self.attempts += result['attempts']
+            self.latency_total += result['latency']
+            self.latency_max = max(self.latency_max, result['latency'])
+
+    def stats(self):
+        with self._lock:
+            messages = self.sent + self.failed
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'throttled': self.throttled,
+                'attempts': self.attempts,
+                'latency_avg': self.latency_total / messages if messages else None,
+                'latency_max': self.latency_max,
+            }
+
+_metrics = {}
+
+def record_send(result):
+    """Count a send result (from send_with_retry or AsyncSmsClient) against its sender; returns it"""
+    sender = result['sender']
+    metrics = _metrics.get(sender)
+    if metrics is None:
+        with _registry_lock:
+            metrics = _metrics.setdefault(sender, SenderMetrics())
+    metrics.record(result)
+    return result
+
+def sender_stats():
+    """Rate limit, concurrency and send counts of every sender used by this process"""
+    with _registry_lock:
+        senders = set(_buckets) | set(_concurrency) | set(_metrics)
+    return {
+        sender: {
+            'bucket': _buckets[sender].stats() if sender in _buckets else None,
+            'concurrency': _concurrency[sender].stats() if sender in _concurrency else None,
+            'sends': _metrics[sender].stats() if sender in _metrics else None,
+        }
+        for sender in sorted(senders, key=str)
+    }
@@ -1,8 +1,17 @@
 import os
+import json
+import fcntl
+import glob
+import hashlib
 import logging
+import random
+import uuid
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 import pytz
-from twilio.rest import Client
+from sqlalchemy import insert
 from app import db
 from models import NotificationLog
 
@@ -10,111 +19,681 @@ from models import NotificationLog
 TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.environ.get("TWILIO_PHONE_NUMBER")
+# Or send through a Twilio Messaging Service (its SID starts with MG)
+TWILIO_MESSAGING_SERVICE_SID = os.environ.get("TWILIO_MESSAGING_SERVICE_SID")
+# Pool of senders, comma separated: phone numbers and/or Messaging Service
+# SIDs. Each recipient always gets the same one. Defaults to the single
+# sender above.
+TWILIO_PHONE_NUMBERS = os.environ.get("TWILIO_PHONE_NUMBERS", "")
+# Twilio REST API base URL (point it at sms_standin.py for local load tests)
+TWILIO_API_BASE = os.environ.get("TWILIO_API_BASE", "https://api.twilio.com")
 
-def send_twilio_message(to_phone_number: str, message: str) -> str:
+# How messages are sent: 'twilio' uses the Twilio SDK; 'http' POSTs straight
+# to the Twilio-compatible Messages endpoint at TWILIO_API_BASE
+SMS_BACKEND = os.environ.get("SMS_BACKEND", "twilio").lower()
+
+# Fan-out configuration (concurrency is per sender in the pool)
+SMS_MAX_CONCURRENCY = int(os.environ.get("SMS_MAX_CONCURRENCY", "8"))
+SMS_RATE_LIMIT_PER_SECOND = float(os.environ.get("SMS_RATE_LIMIT_PER_SECOND", "25"))
+SMS_MAX_RETRIES = int(os.environ.get("SMS_MAX_RETRIES", "3"))
+SMS_RETRY_BASE_DELAY = float(os.environ.get("SMS_RETRY_BASE_DELAY", "0.5"))
+SMS_RETRY_MAX_DELAY = float(os.environ.get("SMS_RETRY_MAX_DELAY", "8"))
+SMS_HTTP_TIMEOUT = float(os.environ.get("SMS_HTTP_TIMEOUT", "10"))
+# How long a message keeps retrying 429s (which do not count toward
+# SMS_MAX_RETRIES) before it is given up as retryable; outbox sends also
+# stop at their batch's lease deadline
+SMS_THROTTLE_MAX_WAIT = float(os.environ.get("SMS_THROTTLE_MAX_WAIT", "300"))
+
+# NotificationLog batching: rows per INSERT/commit and the local spool used
+# to recover rows if the process dies before they are flushed
+NOTIFICATION_LOG_BATCH_SIZE = int(os.environ.get("NOTIFICATION_LOG_BATCH_SIZE", "500"))
+NOTIFICATION_LOG_SPOOL_DIR = os.environ.get("NOTIFICATION_LOG_SPOOL_DIR", "instance/notification_spool")
+
+# How scheduled notifications are delivered: 'inline' sends from the
+# scheduler thread; 'async' sends from an event loop on that thread
+# (async_pipeline); 'outbox' enqueues rows for worker.py to deliver
+NOTIFICATION_DELIVERY = os.environ.get("NOTIFICATION_DELIVERY", "inline").lower()
+
+_client = None
+_client_lock = threading.Lock()
+_http_session = None
+
+def parse_senders(pool, messaging_service_sid=None, phone_number=None):
+    """Sender pool from TWILIO_PHONE_NUMBERS, else the single service or number"""
+    senders = [sender.strip() for sender in (pool or '').split(',') if sender.strip()]
+    if not senders:
+        senders = [sender for sender in (messaging_service_sid, phone_number) if sender][:1]
+    return list(dict.fromkeys(senders))
+
+SMS_SENDERS = parse_senders(TWILIO_PHONE_NUMBERS, TWILIO_MESSAGING_SERVICE_SID, TWILIO_PHONE_NUMBER)
+
+def sender_for(to_phone_number: str) -> str:
+    """
+    Sticky sender for a recipient, by rendezvous (highest random weight)
+    hashing: each recipient always gets the same sender, and adding or
+    removing a sender only moves the recipients it gains or loses
     """
-    Send SMS message via Twilio
+    if len(SMS_SENDERS) <= 1:
+        return SMS_SENDERS[0] if SMS_SENDERS else 'default'
+    return max(SMS_SENDERS, key=lambda sender: hashlib.blake2b(
+        f"{sender}|{to_phone_number}".encode(), digest_size=8).digest())
+
+def sender_params(sender: str) -> dict:
+    """Messages API form field naming a sender"""
+    if sender.startswith('MG'):
+        return {'MessagingServiceSid': sender}
+    return {'From': sender}
+
+def send_concurrency() -> int:
+    """Concurrent sends per process: SMS_MAX_CONCURRENCY for each sender in the pool"""
+    return max(1, SMS_MAX_CONCURRENCY) * max(1, len(SMS_SENDERS))
+
+def get_twilio_client():
+    """
+    Return the process-wide Twilio client
+    One pooled HTTP session is shared by every send so connections are reused
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # Imported here: twilio and requests are slow to import and
+                # most processes never send a message
+                from twilio.rest import Client
+                from twilio.http.http_client import TwilioHttpClient
+                from requests.adapters import HTTPAdapter
+
+                http_client = TwilioHttpClient(pool_connections=True, timeout=SMS_HTTP_TIMEOUT)
+                # Keep one pooled connection per concurrent sender
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=send_concurrency())
+                http_client.session.mount('https://', adapter)
+                http_client.session.mount('http://', adapter)
+                client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=http_client)
+                client.api.base_url = TWILIO_API_BASE
+                _client = client
+    return _client
+
+def get_http_session():
+    """Return the process-wide requests session used by the 'http' backend"""
+    global _http_session
+    if _http_session is None:
+        with _client_lock:
+            if _http_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                session.auth = (TWILIO_ACCOUNT_SID or '', TWILIO_AUTH_TOKEN or '')
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=send_concurrency())
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
+
+class SmsHttpError(Exception):
+    """Non-2xx response from a Twilio-compatible Messages endpoint"""
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+def messages_path():
+    """Path of the Messages resource under TWILIO_API_BASE"""
+    return f"/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
+
+def send_http_message(to_phone_number: str, message: str, sender: str) -> str:
+    """POST one message to the Messages endpoint; returns its SID"""
+    response = get_http_session().post(
+        TWILIO_API_BASE.rstrip('/') + messages_path(),
+        data=dict(sender_params(sender), To=to_phone_number, Body=message),
+        timeout=SMS_HTTP_TIMEOUT,
+    )
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get('message', response.text)
+        except ValueError:
+            detail = response.text
+        raise SmsHttpError(response.status_code, detail)
+    return response.json()['sid']
+
+def send_twilio_message(to_phone_number: str, message: str, sender=None) -> str:
+    """
+    Send SMS message via Twilio (or the Twilio-compatible API, per SMS_BACKEND)
+    sender defaults to the recipient's sticky sender from the pool
     Returns message SID on success, raises exception on failure
     """
+    sender = sender or sender_for(to_phone_number)
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        
-        message_obj = client.messages.create(
-            body=message,
-            from_=TWILIO_PHONE_NUMBER,
-            to=to_phone_number
-        )
-        
-        logging.info(f"Message sent with SID: {message_obj.sid}")
-        return message_obj.sid
-        
+        if SMS_BACKEND == 'http':
+            sid = send_http_message(to_phone_number, message, sender)
+        elif sender.startswith('MG'):
+            sid = get_twilio_client().messages.create(
+                body=message,
+                messaging_service_sid=sender,
+                to=to_phone_number
+            ).sid
+        else:
+            client = get_twilio_client()
+            sid = client.messages.create(
+                body=message,
+                from_=sender,
+                to=to_phone_number
+            ).sid
+
+        logging.info(f"Message sent with SID: {sid}")
+        return sid
+
     except Exception as e:
-        logging.error(f"Failed to send SMS to {to_phone_number}: {e}")
+        if is_throttled(e):
+            logging.warning(f"Throttled sending SMS to {to_phone_number}: {e}")
+        else:
+            logging.error(f"Failed to send SMS to {to_phone_number}: {e}")
         raise
 
-def send_stock_notification(phone_number: str, notification_type: str, price: float) -> bool:
+def is_throttled(error) -> bool:
+    """The provider rejected the send with a 429 (rate limit)"""
+    return getattr(error, 'status', None) == 429
+
+def is_retryable_error(error) -> bool:
+    """Throttling, server errors and network failures are worth retrying"""
+    from twilio.base.exceptions import TwilioRestException
+    from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+
+    if isinstance(error, (TwilioRestException, SmsHttpError)):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (RequestsConnectionError, Timeout))
+
+def retry_delay(error, failures: int, throttles: int, started: float, retryable=None):
     """
-    Send stock price notification
-    notification_type: 'open', 'close', or 'test'
-    Returns True on success, False on failure
+    Seconds to wait before retrying a failed send, or None to give up.
+    429s are retried (with backoff) until SMS_THROTTLE_MAX_WAIT has passed;
+    other transient errors up to SMS_MAX_RETRIES times. retryable
+    overrides is_retryable_error for clients with their own error types.
     """
-    try:
-        # Get current time in Eastern timezone
-        eastern = pytz.timezone('US/Eastern')
-        now_eastern = datetime.now(eastern)
-        
-        # Format the message (simplified for better deliverability)
+    if is_throttled(error):
+        if time.perf_counter() - started >= SMS_THROTTLE_MAX_WAIT:
+            return None
+        return random.uniform(0, min(SMS_RETRY_MAX_DELAY, SMS_RETRY_BASE_DELAY * (2 ** min(throttles - 1, 16))))
+    if retryable is None:
+        retryable = is_retryable_error(error)
+    if failures > SMS_MAX_RETRIES or not retryable:
+        return None
+    return random.uniform(0, min(SMS_RETRY_MAX_DELAY, SMS_RETRY_BASE_DELAY * (2 ** (failures - 1))))
+
+def not_sent_result(to_phone_number: str, sender, started: float) -> dict:
+    """Result for a message that reached its deadline before its first attempt"""
+    return {
+        'phone_number': to_phone_number,
+        'sender': sender,
+        'message_sid': None,
+        'error': 'Deadline reached before sending',
+        'retryable': True,
+        'attempts': 0,
+        'throttled': 0,
+        'latency': time.perf_counter() - started,
+    }
+
+def send_with_retry(to_phone_number: str, message: str, deadline=None) -> dict:
+    """
+    Send one message through the sender's shared rate limit and adaptive
+    concurrency limit, retrying transient failures with exponential
+    backoff and full jitter (429s until SMS_THROTTLE_MAX_WAIT)
+    deadline (time.monotonic()) is when to stop starting sends, e.g. before
+    an outbox lease expires; a message not yet tried comes back with
+    attempts == 0. Returns a result dict; never raises
+    """
+    from sms_limits import get_sender_bucket, get_sender_concurrency, record_send
+
+    sender = sender_for(to_phone_number)
+    bucket = get_sender_bucket(sender)
+    concurrency = get_sender_concurrency(sender)
+    started = time.perf_counter()
+    attempts = failures = throttles = 0
+    error = None
+
+    while True:
+        # Take the token last, so sends leave at the paced rate instead of in bursts
+        entered_slot = concurrency.enter(deadline)
+        if not entered_slot or not bucket.acquire(deadline) or (deadline is not None and time.monotonic() >= deadline):
+            if entered_slot:
+                concurrency.leave(time.monotonic())
+            if not attempts:
+                return not_sent_result(to_phone_number, sender, started)
+            break
+        entered = time.monotonic()
+        attempts += 1
+        try:
+            sid = send_twilio_message(to_phone_number, message, sender)
+        except Exception as e:
+            error = e
+        else:
+            concurrency.leave(entered, latency=time.monotonic() - entered)
+            return record_send({
+                'phone_number': to_phone_number,
+                'sender': sender,
+                'message_sid': sid,
+                'error': None,
+                'retryable': False,
+                'attempts': attempts,
+                'throttled': throttles,
+                'latency': time.perf_counter() - started,
+            })
+
+        if is_throttled(error):
+            throttles += 1
+            concurrency.leave(entered, throttled=True)
+            bucket.penalize()
+        else:
+            failures += 1
+            concurrency.leave(entered)
+        delay = retry_delay(error, failures, throttles, started)
+        if delay is None or (deadline is not None and time.monotonic() + delay >= deadline):
+            break
+        logging.warning(f"Retrying SMS to {to_phone_number} in {delay:.2f}s (attempt {attempts}): {error}")
+        time.sleep(delay)
+
+    return record_send({
+        'phone_number': to_phone_number,
+        'sender': sender,
+        'message_sid': None,
+        'error': str(error),
+        'retryable': is_retryable_error(error),
+        'attempts': attempts,
+        'throttled': throttles,
+        'latency': time.perf_counter() - started,
+    })
+
+def format_stock_message(notification_type: str, price: float, prices=None) -> str:
+    """
+    Format the SMS body for a notification type
+    price is the primary symbol's price; prices ({symbol: price}, watch
+    order) lists every watched symbol in one message
+    """
+    from stock_service import STOCK_SYMBOL
+
+    # Get current time in Eastern timezone
+    eastern = pytz.timezone('US/Eastern')
+    now_eastern = datetime.now(eastern)
+    at = now_eastern.strftime('%I:%M %p ET')
+
+    others = [(symbol, value) for symbol, value in (prices or {}).items()
+              if symbol != STOCK_SYMBOL and value is not None]
+    if others:
+        quotes = ", ".join(f"{symbol} ${value:.2f}" for symbol, value in [(STOCK_SYMBOL, price)] + others)
         if notification_type == 'open':
-            message = f"CRWV opened at ${price:.2f} at {now_eastern.strftime('%I:%M %p ET')}"
+            return f"Market open {at}: {quotes}"
         elif notification_type == 'close':
-            message = f"CRWV closed at ${price:.2f} at {now_eastern.strftime('%I:%M %p ET')}"
+            return f"Market close {at}: {quotes}"
         elif notification_type == 'test':
-            message = f"Test: CRWV price is ${price:.2f} at {now_eastern.strftime('%I:%M %p ET')}. Notifications working."
+            return f"Test: {quotes} at {at}. Notifications working."
         else:
-            message = f"CRWV: ${price:.2f} at {now_eastern.strftime('%I:%M %p ET')}"
-        
-        # Send the message
-        message_sid = send_twilio_message(phone_number, message)
-        
-        # Log the notification
+            return f"{quotes} at {at}"
+
+    # Format the message (simplified for better deliverability)
+    if notification_type == 'open':
+        return f"{STOCK_SYMBOL} opened at ${price:.2f} at {at}"
+    elif notification_type == 'close':
+        return f"{STOCK_SYMBOL} closed at ${price:.2f} at {at}"
+    elif notification_type == 'test':
+        return f"Test: {STOCK_SYMBOL} price is ${price:.2f} at {at}. Notifications working."
+    else:
+        return f"{STOCK_SYMBOL}: ${price:.2f} at {at}"
+
+def log_notification(phone_number: str, notification_type: str, price: float, message_sid=None, error=None,
+                     sender=None):
+    """Record the outcome of one send in NotificationLog"""
+    try:
         log_entry = NotificationLog(
             notification_type=notification_type,
             stock_price=price,
             phone_number=phone_number,
+            sender=sender,
             message_sid=message_sid,
-            status='sent'
+            status='failed' if error else 'sent',
+            error_message=error
         )
         db.session.add(log_entry)
         db.session.commit()
-        
-        logging.info(f"Stock notification sent successfully to {phone_number}")
-        return True
-        
-    except Exception as e:
-        logging.error(f"Failed to send stock notification to {phone_number}: {e}")
-        
-        # Log the failed notification
+    except Exception as log_error:
+        logging.error(f"Failed to log notification for {phone_number}: {log_error}")
+        db.session.rollback()
+
+class NotificationLogBuffer:
+    """
+    Buffers NotificationLog rows for one fan-out and writes them with a bulk
+    INSERT per chunk, one commit each. Every row is first appended to a
+    locked spool file; the file is removed once all rows are committed, so
+    a crash mid-batch leaves the rows on disk for recover_spooled_logs().
+    """
+
+    def __init__(self, batch_size=None, spool_dir=None):
+        self.batch_size = batch_size or NOTIFICATION_LOG_BATCH_SIZE
+        self.spool_dir = spool_dir or NOTIFICATION_LOG_SPOOL_DIR
+        self._rows = []
+        self._spool = None
+        self.flushed = 0
+        self.flush_seconds = 0.0
+
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self.spool_path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}.jsonl")
+            self._spool = open(self.spool_path, 'a')
+            # Held until close(); recovery skips spools that are still locked
+            fcntl.flock(self._spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            logging.error(f"Notification log spool unavailable, batching without crash recovery: {e}")
+            self._spool = None
+
+    def add(self, phone_number, notification_type, price, message_sid=None, error=None, sender=None):
+        row = {
+            'notification_type': notification_type,
+            'stock_price': price,
+            'phone_number': phone_number,
+            'sender': sender,
+            'message_sid': message_sid,
+            'status': 'failed' if error else 'sent',
+            'error_message': error,
+            'sent_at': datetime.utcnow(),
+        }
+        if self._spool:
+            self._spool.write(json.dumps(dict(row, sent_at=row['sent_at'].isoformat())) + "\n")
+            self._spool.flush()
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Bulk insert buffered rows in one transaction; keeps them on failure"""
+        if not self._rows:
+            return True
+        started = time.perf_counter()
         try:
-            log_entry = NotificationLog(
-                notification_type=notification_type,
-                stock_price=price,
-                phone_number=phone_number,
-                status='failed',
-                error_message=str(e)
-            )
-            db.session.add(log_entry)
+            db.session.execute(insert(NotificationLog), self._rows)
             db.session.commit()
-        except Exception as log_error:
-            logging.error(f"Failed to log notification error: {log_error}")
-        
+        except Exception as e:
+            logging.error(f"Failed to flush {len(self._rows)} notification log rows (kept in spool): {e}")
+            db.session.rollback()
+            return False
+
+        self.flushed += len(self._rows)
+        self.flush_seconds += time.perf_counter() - started
+        self._rows = []
+        if self._spool:
+            # Everything spooled so far is committed
+            self._spool.truncate(0)
+            self._spool.seek(0)
+        return True
+
+    def close(self):
+        """Flush remaining rows and release the spool"""
+        flushed = self.flush()
+        if self._spool:
+            path = self.spool_path
+            if flushed:
+                os.remove(path)
+            fcntl.flock(self._spool, fcntl.LOCK_UN)
+            self._spool.close()
+            self._spool = None
+        return flushed
+
+def recover_spooled_logs(spool_dir=None):
+    """
+    Insert NotificationLog rows left behind by a fan-out that died before
+    flushing. Rows that were committed before the crash are skipped.
+    Returns the number of rows recovered.
+    """
+    spool_dir = spool_dir or NOTIFICATION_LOG_SPOOL_DIR
+    recovered = 0
+
+    for path in glob.glob(os.path.join(spool_dir, '*.jsonl')):
+        try:
+            with open(path, 'r+') as spool:
+                try:
+                    fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Owned by a fan-out that is still running
+
+                rows = []
+                for line in spool:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final write
+                    row['sent_at'] = datetime.fromisoformat(row['sent_at'])
+                    row.setdefault('sender', None)  # Spooled before senders were logged
+                    rows.append(row)
+
+                # The spool is truncated only after its rows are committed, so
+                # a crash in between leaves rows that are already stored.
+                # (phone_number, notification_type, sent_at) identifies a
+                # spooled row whether or not it got a message SID.
+                existing = set()
+                for start in range(0, len(rows), NOTIFICATION_LOG_BATCH_SIZE):
+                    chunk = rows[start:start + NOTIFICATION_LOG_BATCH_SIZE]
+                    existing.update(NotificationLog.logged_keys_query(
+                        {row['phone_number'] for row in chunk}, {row['sent_at'] for row in chunk}
+                    ))
+                rows = [row for row in rows
+                        if (row['phone_number'], row['notification_type'], row['sent_at']) not in existing]
+
+                if rows:
+                    db.session.execute(insert(NotificationLog), rows)
+                    db.session.commit()
+                    recovered += len(rows)
+            os.remove(path)
+        except Exception as e:
+            logging.error(f"Failed to recover notification log spool {path}: {e}")
+            db.session.rollback()
+
+    if recovered:
+        logging.warning(f"Recovered {recovered} spooled notification log rows")
+    return recovered
+
+def send_stock_notification(phone_number: str, notification_type: str, price: float) -> bool:
+    """
+    Send stock price notification
+    notification_type: 'open', 'close', or 'test'
+    Returns True on success, False on failure
+    """
+    message = format_stock_message(notification_type, price)
+
+    # Send the message (throttling and transient errors are retried)
+    result = send_with_retry(phone_number, message)
+
+    if result['error']:
+        logging.error(f"Failed to send stock notification to {phone_number}: {result['error']}")
+
+        # Log the failed notification
+        log_notification(phone_number, notification_type, price, error=result['error'], sender=result['sender'])
         return False
 
-def send_daily_notifications(notification_type: str, price: float):
+    # Log the notification
+    log_notification(phone_number, notification_type, price, message_sid=result['message_sid'],
+                     sender=result['sender'])
+
+    logging.info(f"Stock notification sent successfully to {phone_number}")
+    return True
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def dispatch_notifications(phone_numbers, notification_type: str, price: float, prices=None) -> dict:
     """
-    Send notifications to all configured phone numbers
-    notification_type: 'open' or 'close'
+    Send one notification to many numbers with bounded concurrency
+    phone_numbers may be any iterable (e.g. a paged DB stream); it is consumed
+    lazily with at most a few batches of sends in flight
+    Worker threads only talk to the SMS provider; log rows are buffered and
+    bulk-inserted from the calling thread (which owns the DB session)
+    Returns a report with counts and fan-out latency percentiles
+    """
+    recover_spooled_logs()
+
+    message = format_stock_message(notification_type, price, prices)
+    fanout_started = time.perf_counter()
+    completion_offsets = []
+    send_latencies = []
+    total = sent = failed = retries = throttled = 0
+
+    senders = {}
+    workers = send_concurrency()
+    max_in_flight = workers * 4
+    log_buffer = NotificationLogBuffer()
+
+    def collect(done):
+        nonlocal sent, failed, retries, throttled
+        for future in done:
+            result = future.result()
+            completion_offsets.append(time.perf_counter() - fanout_started)
+            send_latencies.append(result['latency'])
+            retries += result['attempts'] - 1
+            throttled += result['throttled']
+            tally_sender(senders, result)
+
+            if result['error']:
+                failed += 1
+            else:
+                sent += 1
+            log_buffer.add(result['phone_number'], notification_type, price,
+                           message_sid=result['message_sid'], error=result['error'], sender=result['sender'])
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sms-fanout') as executor:
+        in_flight = set()
+        for number in phone_numbers:
+            total += 1
+            in_flight.add(executor.submit(send_with_retry, number, message))
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+        done, _ = wait(in_flight)
+        collect(done)
+
+    log_buffer.close()
+    from sms_limits import get_sender_concurrency
+    return fanout_report(notification_type, total, sent, failed, retries, workers, fanout_started,
+                         completion_offsets, send_latencies, log_buffer, throttled=throttled, senders=senders,
+                         concurrency_limit=lambda sender: get_sender_concurrency(sender).limit)
+
+def tally_sender(senders, result):
+    """Add one send result to a fan-out's per-sender counts"""
+    counts = senders.setdefault(result['sender'], {'sent': 0, 'failed': 0, 'throttled': 0})
+    counts['failed' if result['error'] else 'sent'] += 1
+    counts['throttled'] += result['throttled']
+
+def fanout_report(notification_type, total, sent, failed, retries, concurrency, fanout_started,
+                  completion_offsets, send_latencies, log_buffer, throttled=0, senders=None,
+                  concurrency_limit=None) -> dict:
+    """
+    Summarize a fan-out: counts, latency percentiles, log write cost and a
+    per-sender breakdown (concurrency_limit maps a sender to its current
+    adaptive limit)
+    """
+    if not total:
+        return {'total': 0, 'sent': 0, 'failed': 0, 'retries': 0, 'duration': 0.0}
+
+    completion_offsets.sort()
+    send_latencies.sort()
+    report = {
+        'total': total,
+        'sent': sent,
+        'failed': failed,
+        'retries': retries,
+        # 429s from the provider, retried rather than failed
+        'throttled': throttled,
+        'concurrency': concurrency,
+        'duration': time.perf_counter() - fanout_started,
+        # Time from fan-out start until each recipient's message was accepted
+        'fanout_p50': _percentile(completion_offsets, 50),
+        'fanout_p95': _percentile(completion_offsets, 95),
+        'fanout_p99': _percentile(completion_offsets, 99),
+        'fanout_max': completion_offsets[-1],
+        # Provider round trip per message, including retries
+        'send_p50': _percentile(send_latencies, 50),
+        'send_p99': _percentile(send_latencies, 99),
+        # DB cost of writing the NotificationLog rows
+        'log_rows_flushed': log_buffer.flushed,
+        'log_flush_seconds': log_buffer.flush_seconds,
+        'senders': senders or {},
+    }
+    if concurrency_limit is not None:
+        for sender, counts in report['senders'].items():
+            counts['concurrency_limit'] = round(concurrency_limit(sender), 2)
+        report['concurrency_limit'] = round(sum(counts['concurrency_limit'] for counts in report['senders'].values()), 2)
+
+    logging.info(
+        f"Fan-out {notification_type}: {sent}/{total} sent, {failed} failed, "
+        f"{retries} retries ({throttled} throttled) in {report['duration']:.2f}s "
+        f"(p50 {report['fanout_p50']:.2f}s, p95 {report['fanout_p95']:.2f}s, p99 {report['fanout_p99']:.2f}s)"
+    )
+    return report
+
+def send_alert_messages(messages, price: float) -> int:
+    """
+    Send price alert texts ({phone_number: message}) and log them as 'alert'
+    Returns the number sent; nothing is sent while notifications are disabled
     """
     from models import Settings
-    
+
+    if not messages:
+        return 0
+    if not Settings.get_cached().notifications_enabled:
+        logging.info("Notifications are disabled; dropping price alerts")
+        return 0
+
+    sent = 0
+    for phone_number, message in messages.items():
+        result = send_with_retry(phone_number, message)
+        log_notification(phone_number, 'alert', price, message_sid=result['message_sid'], error=result['error'],
+                         sender=result['sender'])
+        if not result['error']:
+            sent += 1
+    return sent
+
+def send_daily_notifications(notification_type: str, price: float, prices=None):
+    """
+    Send notifications to every active subscriber
+    Recipients are streamed from the subscription table in pages, then
+    either sent inline or enqueued for worker.py (NOTIFICATION_DELIVERY)
+    notification_type: 'open' or 'close'
+    price: primary symbol price (logged); prices: {symbol: price} for the message
+    """
+    from models import Settings, Subscription
+
     try:
-        settings = Settings.get_settings()
-        
+        settings = Settings.get_cached()
+
         if not settings.notifications_enabled:
             logging.info("Notifications are disabled")
             return
-        
-        phone_numbers = settings.get_phone_numbers()
-        
-        if not phone_numbers:
-            logging.warning("No phone numbers configured for notifications")
-            return
-        
-        success_count = 0
-        for phone_number in phone_numbers:
-            if send_stock_notification(phone_number, notification_type, price):
-                success_count += 1
-        
-        logging.info(f"Daily {notification_type} notifications sent to {success_count}/{len(phone_numbers)} numbers")
-        
+
+        recipients = Subscription.iter_phone_numbers(notification_type)
+        if NOTIFICATION_DELIVERY == 'outbox':
+            from outbox import enqueue_notifications
+            report = enqueue_notifications(recipients, notification_type, price, prices=prices)
+            if not report['total']:
+                logging.warning("No active subscribers for notifications")
+            return report
+
+        if NOTIFICATION_DELIVERY == 'async':
+            import asyncio
+            from app import app
+            from async_pipeline import dispatch_notifications_async
+            report = asyncio.run(dispatch_notifications_async(app, recipients, notification_type, price, prices))
+        else:
+            report = dispatch_notifications(recipients, notification_type, price, prices)
+
+        if not report['total']:
+            logging.warning("No active subscribers for notifications")
+            return report
+
+        logging.info(f"Daily {notification_type} notifications sent to {report['sent']}/{report['total']} numbers")
+        return report
+
     except Exception as e:
         logging.error(f"Error sending daily notifications: {e}")
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Twilio's Messages endpoint, for load tests and local
+development. Point the app at it with SMS_BACKEND=http (or the default
+SDK backend) and TWILIO_API_BASE:
+
+    python sms_standin.py --port 5099 --latency-ms 80 --jitter-ms 40
+    python sms_standin.py --error-rate 0.01 --throttle-rate 0.02 --max-rps 500
+
+    TWILIO_API_BASE=http://127.0.0.1:5099 SMS_BACKEND=http python main.py
+
+POST /2010-04-01/Accounts/<sid>/Messages.json accepts the same form fields
+as Twilio (To, From, Body) and answers like Twilio does: 201 with a message
+resource, 400 for a missing field, 429 when throttled and 500 for an
+injected error. --max-rps applies to each sender separately, like Twilio's
+per-number limits. GET /stats returns counters and POST /stats/reset clears
+them. Uses only the standard library: one asyncio loop serves every
+keep-alive connection, so it keeps up with thousands of concurrent senders.
+"""
+
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+MESSAGES_SUFFIX = '/Messages.json'
+
+class StandinConfig:
+    """Latency and failure injection for the stand-in"""
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0, error_rate=0.0, throttle_rate=0.0, max_rps=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+
+class StandinStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.accepted = 0
+        self.throttled = 0
+        self.errors = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = 0
+        self.accepted_by_sender = {}
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'requests': self.requests,
+            'accepted': self.accepted,
+            'throttled': self.throttled,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'max_in_flight': self.max_in_flight,
+            'connections': self.connections,
+            'seconds': elapsed,
+            'accepted_per_second': self.accepted / elapsed if elapsed else 0.0,
+            'accepted_by_sender': dict(self.accepted_by_sender),
+        }
+
+class StandinServer:
+    """
+    Minimal HTTP/1.1 server speaking the subset of Twilio's API the app
+    uses. max_rps is enforced per sender (From or MessagingServiceSid) with
+    a token bucket, so a sender that goes faster than its limit gets 429s,
+    like it would from Twilio.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or StandinConfig()
+        self.stats = StandinStats()
+        self._buckets = {}  # sender -> (tokens, updated)
+
+    def _take_token(self, sender):
+        rate = self.config.max_rps
+        if rate <= 0:
+            return True
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(sender, (rate, now))
+        tokens = min(rate, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        self._buckets[sender] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def _delay(self):
+        config = self.config
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        return max(delay, 0.0) / 1000.0
+
+    async def create_message(self, path, body):
+        """Handle one Messages POST; returns (status, payload)"""
+        stats = self.stats
+        await asyncio.sleep(self._delay())
+
+        form = {key: values[0] for key, values in parse_qs(body.decode('utf-8', 'replace')).items()}
+        sender = form.get('From') or form.get('MessagingServiceSid')
+        if not self._take_token(sender) or random.random() < self.config.throttle_rate:
+            stats.throttled += 1
+            return 429, {'code': 20429, 'message': 'Too Many Requests', 'status': 429}
+        if random.random() < self.config.error_rate:
+            stats.errors += 1
+            return 500, {'code': 20500, 'message': 'Internal Server Error', 'status': 500}
+
+        for field, value in (('To', form.get('To')), ('From', sender), ('Body', form.get('Body'))):
+            if not value:
+                stats.rejected += 1
+                return 400, {'code': 21604, 'message': f"A '{field}' parameter is required.", 'status': 400}
+
+        stats.accepted += 1
+        stats.accepted_by_sender[sender] = stats.accepted_by_sender.get(sender, 0) + 1
+        account_sid = path.split('/')[3]
+        now = datetime.now(timezone.utc).strftime('%a, %d %b %Y %H:%M:%S +0000')
+        return 201, {
+            'sid': 'SM' + uuid.uuid4().hex,
+            'account_sid': account_sid,
+            'to': form['To'],
+            'from': form.get('From'),
+            'messaging_service_sid': form.get('MessagingServiceSid'),
+            'body': form['Body'],
+            'status': 'queued',
+            'num_segments': '1',
+            'direction': 'outbound-api',
+            'api_version': '2010-04-01',
+            'date_created': now,
+            'date_updated': now,
+            'error_code': None,
+            'error_message': None,
+        }
+
+    async def route(self, method, path, body):
+        if method == 'POST' and path.startswith('/2010-04-01/Accounts/') and path.endswith(MESSAGES_SUFFIX):
+            return await self.create_message(path, body)
+        if method == 'GET' and path == '/stats':
+            return 200, self.stats.as_dict()
+        if method == 'POST' and path == '/stats/reset':
+            self.stats.reset()
+            return 200, self.stats.as_dict()
+        return 404, {'code': 20404, 'message': 'The requested resource was not found', 'status': 404}
+
+    async def handle(self, reader, writer):
+        stats = self.stats
+        stats.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                stats.requests += 1
+                stats.in_flight += 1
+                stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+                try:
+                    status, payload = await self.route(method, target.split('?', 1)[0], body)
+                finally:
+                    stats.in_flight -= 1
+
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        address = server.sockets[0].getsockname()
+        logging.info(f"SMS stand-in listening on http://{address[0]}:{address[1]}")
+        if ready is not None:
+            ready(address)
+        async with server:
+            await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for Twilio's Messages API")
+    parser.add_argument('--host', default=os.environ.get('SMS_STANDIN_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SMS_STANDIN_PORT', '5099')),
+                        help='Port to listen on (0 picks a free one)')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Mean response latency')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Uniform +/- jitter on the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of sends answered with a 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of sends answered with a 429')
+    parser.add_argument('--max-rps', type=float, default=0.0,
+                        help='Accepted sends per second per sender before 429s (0 = no limit)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    config = StandinConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.max_rps)
+
+    def announce(address):
+        # Machine-readable line for harnesses that start the stand-in on port 0
+        print(f"LISTENING {address[0]}:{address[1]}", flush=True)
+
+    try:
+        asyncio.run(StandinServer(config).serve(args.host, args.port, ready=announce))
+    except KeyboardInterrupt:
+        sys.exit(0)
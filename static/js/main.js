@@ -248,7 +248,7 @@ async function refreshPrice() {
         priceElement.className = 'text-info';
         
         // Fetch new data
-        const data = await apiCall('/api/stock-data');
+        const data = await apiCall('/api/stock-data', { cache: 'no-cache' });
         
         if (data.success && data.current_price) {
             // Update price
@@ -1,89 +1,332 @@
-import yfinance as yf
+import os
 import logging
-from datetime import datetime, date
+import threading
+import time
+from datetime import datetime, date, timedelta
 import pytz
 from app import db
-from models import StockData
+from flask import has_app_context
+from models import StockData, StockSummary, Settings
+from market_data import get_provider
+from trading_calendar import get_calendar, REGULAR_OPEN, REGULAR_CLOSE
 
-STOCK_SYMBOL = "CRWV"
+# Symbols to track, comma separated; the first is the primary symbol shown
+# on the dashboard and used when no symbol is given
+WATCHED_SYMBOLS = [
+    symbol.strip().upper()
+    for symbol in os.environ.get("WATCHED_SYMBOLS", "CRWV").split(",")
+    if symbol.strip()
+] or ["CRWV"]
+STOCK_SYMBOL = WATCHED_SYMBOLS[0]
 
-def get_current_stock_price():
+# Quote cache configuration (seconds)
+QUOTE_CACHE_TTL = float(os.environ.get("QUOTE_CACHE_TTL", "15"))
+QUOTE_CACHE_STALE_TTL = float(os.environ.get("QUOTE_CACHE_STALE_TTL", "120"))
+QUOTE_FETCH_TIMEOUT = float(os.environ.get("QUOTE_FETCH_TIMEOUT", "30"))
+
+# How long a process trusts its in-memory change summary before re-reading
+# the persisted row (picks up bars written by other processes)
+CHANGE_SUMMARY_MAX_AGE = float(os.environ.get("CHANGE_SUMMARY_MAX_AGE", "300"))
+
+# How often a process re-reads market_open_time / market_close_time from
+# Settings (seconds); the scheduler reschedules its jobs on the same cadence
+MARKET_HOURS_SYNC_INTERVAL = float(os.environ.get("MARKET_HOURS_SYNC_INTERVAL", "60"))
+
+class QuoteCache:
     """
-    Fetch current stock price for CRWV
-    Returns the current price or None if failed
+    Process-wide quote cache shared by every caller of get_current_stock_price.
+    Fresh entries are served directly, stale entries are served while a single
+    background refresh runs, and concurrent misses share one upstream fetch.
+    Whenever an upstream call is made, the rest of the watched basket rides
+    along, so one tick costs one batched request however many symbols exist.
+    """
+
+    def __init__(self, fetch_many, ttl, stale_ttl, fetch_timeout, on_update=None, companions=None):
+        self._fetch_many = fetch_many  # symbols -> {symbol: price or None}
+        self._on_update = on_update
+        self._companions = companions or (lambda: [])
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.fetch_timeout = fetch_timeout
+        self._lock = threading.Lock()
+        self._entries = {}  # symbol -> (price, fetched_at monotonic)
+        self._inflight = {}  # symbol -> threading.Event for the running fetch
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'fetches': 0,
+            'symbols_fetched': 0,
+            'fetch_errors': 0,
+            'fetch_seconds_total': 0.0,
+            'fetch_seconds_max': 0.0,
+            'last_fetch_seconds': None,
+        }
+
+    def get(self, symbol, force_refresh=False):
+        """Return the cached price for symbol, fetching upstream at most once at a time"""
+        return self.get_many([symbol], force_refresh=force_refresh).get(symbol)
+
+    def get_many(self, symbols, force_refresh=False):
+        """Return {symbol: price or None}, fetching every missing symbol in one upstream call"""
+        symbols = list(symbols)
+        now = time.monotonic()
+        prices = {}
+        fetch = []        # fetched by this caller before returning
+        background = []   # stale: served now, refreshed in the background
+        waits = set()     # fetches already running in other threads
+
+        with self._lock:
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                if entry and not force_refresh:
+                    age = now - entry[1]
+                    if age < self.ttl:
+                        self._stats['hits'] += 1
+                        prices[symbol] = entry[0]
+                        continue
+                    if age < self.ttl + self.stale_ttl:
+                        self._stats['stale_hits'] += 1
+                        prices[symbol] = entry[0]
+                        if symbol not in self._inflight:
+                            background.append(symbol)
+                        continue
+
+                self._stats['misses'] += 1
+                event = self._inflight.get(symbol)
+                if event is None:
+                    fetch.append(symbol)
+                else:
+                    self._stats['coalesced'] += 1
+                    waits.add(event)
+
+            group = fetch or background
+            if group:
+                for symbol in self._companions():
+                    if symbol not in self._inflight and symbol not in fetch and symbol not in background:
+                        group.append(symbol)
+
+            fetch_event = background_event = None
+            if fetch:
+                fetch_event = threading.Event()
+                for symbol in fetch:
+                    self._inflight[symbol] = fetch_event
+            if background:
+                background_event = threading.Event()
+                for symbol in background:
+                    self._inflight[symbol] = background_event
+
+        if background:
+            threading.Thread(
+                target=self._refresh, args=(background, background_event),
+                name='quote-refresh', daemon=True
+            ).start()
+        if fetch:
+            self._refresh(fetch, fetch_event)
+        for event in waits:
+            event.wait(self.fetch_timeout)
+
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                if symbol not in prices:
+                    entry = self._entries.get(symbol)
+                    if entry and now - entry[1] < self.ttl + self.stale_ttl:
+                        prices[symbol] = entry[0]
+                    else:
+                        # Never pass off an expired price as current
+                        if entry:
+                            logging.warning(f"Quote for {symbol} unavailable; cached price is {now - entry[1]:.0f}s old")
+                        prices[symbol] = None
+        return prices
+
+    def _refresh(self, symbols, event):
+        started = time.perf_counter()
+        prices = {}
+        try:
+            prices = self._fetch_many(symbols) or {}
+        except Exception as e:
+            logging.error(f"Quote refresh failed for {symbols}: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            fetched_at = time.monotonic()
+            with self._lock:
+                self._stats['fetches'] += 1
+                self._stats['symbols_fetched'] += len(symbols)
+                self._stats['fetch_seconds_total'] += elapsed
+                self._stats['fetch_seconds_max'] = max(self._stats['fetch_seconds_max'], elapsed)
+                self._stats['last_fetch_seconds'] = elapsed
+                for symbol in symbols:
+                    price = prices.get(symbol)
+                    if price is None:
+                        self._stats['fetch_errors'] += 1
+                    else:
+                        self._entries[symbol] = (price, fetched_at)
+                    if self._inflight.get(symbol) is event:
+                        del self._inflight[symbol]
+            event.set()
+
+        if self._on_update:
+            for symbol in symbols:
+                if prices.get(symbol) is None:
+                    continue
+                try:
+                    self._on_update(symbol, prices[symbol])
+                except Exception as e:
+                    logging.error(f"Quote update listener failed for {symbol}: {e}")
+
+    def invalidate(self, symbol=None):
+        """Drop one symbol (or everything) from the cache"""
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol, None)
+
+    def stats(self):
+        """Snapshot of hit/miss counters and upstream latency"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['symbols'] = sorted(self._entries)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['stale_hits']) / lookups if lookups else None
+        stats['fetch_seconds_avg'] = (
+            stats['fetch_seconds_total'] / stats['fetches'] if stats['fetches'] else None
+        )
+        stats['ttl'] = self.ttl
+        stats['stale_ttl'] = self.stale_ttl
+        return stats
+
+def _fetch_current_stock_prices(symbols):
+    """
+    Fetch current prices for several symbols in one provider call
+    Returns {symbol: price or None}
     """
     try:
-        ticker = yf.Ticker(STOCK_SYMBOL)
-        info = ticker.info
-        
-        # Try to get current price from different fields
-        current_price = info.get('currentPrice') or info.get('regularMarketPrice') or info.get('previousClose')
-        
-        if current_price:
-            logging.info(f"Retrieved current price for {STOCK_SYMBOL}: ${current_price}")
-            return float(current_price)
-        else:
-            logging.warning(f"No current price found for {STOCK_SYMBOL}")
-            return None
-            
+        quotes = get_provider().get_quotes(symbols)
     except Exception as e:
-        logging.error(f"Error fetching current stock price for {STOCK_SYMBOL}: {e}")
-        return None
+        logging.error(f"Error fetching current stock prices for {symbols}: {e}")
+        return {}
 
-def get_stock_history(period="5d"):
+    prices = {}
+    for symbol in symbols:
+        price = quotes.get(symbol)
+        if price:
+            prices[symbol] = float(price)
+        else:
+            logging.warning(f"No current price found for {symbol}")
+            prices[symbol] = None
+    logging.info(f"Retrieved current prices: {prices}")
+    return prices
+
+quote_cache = QuoteCache(
+    _fetch_current_stock_prices,
+    ttl=QUOTE_CACHE_TTL,
+    stale_ttl=QUOTE_CACHE_STALE_TTL,
+    fetch_timeout=QUOTE_FETCH_TIMEOUT,
+    on_update=lambda symbol, price: _on_quote_update(symbol, price),
+    companions=lambda: WATCHED_SYMBOLS,
+)
+
+def get_current_stock_price(force_refresh=False, symbol=None):
     """
-    Fetch historical stock data for CRWV
+    Get the current price for symbol (default: the primary symbol) through
+    the process-wide quote cache
+    Pass force_refresh=True to bypass the TTL (e.g. for scheduled notifications)
+    Returns the current price or None if failed
+    """
+    return quote_cache.get(symbol or STOCK_SYMBOL, force_refresh=force_refresh)
+
+def get_current_prices(symbols=None, force_refresh=False):
+    """Return {symbol: price or None} for the watched symbols, in watch order"""
+    return quote_cache.get_many(symbols or WATCHED_SYMBOLS, force_refresh=force_refresh)
+
+def get_quote_cache_stats():
+    """Return quote cache hit/miss counters and upstream latency"""
+    return quote_cache.stats()
+
+def get_stock_history(period="5d", symbol=None):
+    """
+    Fetch historical stock data for symbol (default: the primary symbol)
     Returns DataFrame or None if failed
     """
+    symbol = symbol or STOCK_SYMBOL
     try:
-        ticker = yf.Ticker(STOCK_SYMBOL)
-        hist = ticker.history(period=period)
+        hist = get_provider().get_history(symbol, period=period)
         
-        if not hist.empty:
-            logging.info(f"Retrieved {len(hist)} days of history for {STOCK_SYMBOL}")
+        if hist is not None and not hist.empty:
+            logging.info(f"Retrieved {len(hist)} days of history for {symbol}")
             return hist
         else:
-            logging.warning(f"No historical data found for {STOCK_SYMBOL}")
+            logging.warning(f"No historical data found for {symbol}")
             return None
             
     except Exception as e:
-        logging.error(f"Error fetching stock history for {STOCK_SYMBOL}: {e}")
+        logging.error(f"Error fetching stock history for {symbol}: {e}")
         return None
 
-def get_daily_stock_data(target_date=None):
+def _bar_dict(row):
+    return {
+        'open': row.open_price,
+        'close': row.close_price,
+        'high': row.high_price,
+        'low': row.low_price,
+        'volume': row.volume
+    }
+
+def get_daily_stock_data(target_date=None, symbol=None):
     """
     Get opening and closing prices for a specific date
     Returns dict with open and close prices or None if failed
     """
+    symbol = symbol or STOCK_SYMBOL
+    return get_daily_stock_data_batch(target_date, [symbol]).get(symbol)
+
+def get_daily_stock_data_batch(target_date=None, symbols=None):
+    """
+    Get the daily bar for several symbols (default: every watched symbol)
+    Bars stored within the last hour are reused; the rest are fetched with
+    one batched provider call and saved
+    Returns {symbol: bar dict or None}
+    """
     if target_date is None:
         target_date = date.today()
+    symbols = list(symbols or WATCHED_SYMBOLS)
+    results = {symbol: None for symbol in symbols}
     
     try:
-        # Check if we already have this data in our database
-        existing_data = StockData.query.filter_by(date=target_date).first()
+        # Check which bars we already have in our database
+        existing = {
+            row.symbol: row for row in StockData.query.filter(
+                StockData.symbol.in_(symbols), StockData.date == target_date
+            )
+        }
         
         # If we have recent data (within last hour), use it
-        if existing_data and existing_data.last_updated:
-            time_diff = datetime.utcnow() - existing_data.last_updated
-            if time_diff.total_seconds() < 3600:  # 1 hour
-                return {
-                    'open': existing_data.open_price,
-                    'close': existing_data.close_price,
-                    'high': existing_data.high_price,
-                    'low': existing_data.low_price,
-                    'volume': existing_data.volume
-                }
+        missing = []
+        for symbol in symbols:
+            row = existing.get(symbol)
+            if row and row.last_updated and (datetime.utcnow() - row.last_updated).total_seconds() < 3600:
+                results[symbol] = _bar_dict(row)
+            else:
+                missing.append(symbol)
         
-        # Fetch fresh data from yfinance
-        ticker = yf.Ticker(STOCK_SYMBOL)
+        if not missing:
+            return results
         
-        # Get data for the specific date
-        end_date = target_date + datetime.timedelta(days=1)
-        hist = ticker.history(start=target_date, end=end_date)
+        # Fetch fresh data for the specific date from the market data provider
+        end_date = target_date + timedelta(days=1)
+        histories = get_provider().get_histories(missing, start=target_date, end=end_date)
         
-        if not hist.empty:
-            day_data = hist.iloc[0]
+        updated = []
+        for symbol in missing:
+            hist = histories.get(symbol)
+            if hist is None or hist.empty:
+                logging.warning(f"No stock data found for {symbol} on {target_date}")
+                continue
             
+            day_data = hist.iloc[0]
             stock_data = {
                 'open': float(day_data['Open']),
                 'close': float(day_data['Close']),
@@ -93,55 +336,239 @@ def get_daily_stock_data(target_date=None):
             }
             
             # Save to database
-            if existing_data:
-                existing_data.open_price = stock_data['open']
-                existing_data.close_price = stock_data['close']
-                existing_data.high_price = stock_data['high']
-                existing_data.low_price = stock_data['low']
-                existing_data.volume = stock_data['volume']
-                existing_data.last_updated = datetime.utcnow()
-            else:
-                new_data = StockData(
-                    date=target_date,
-                    open_price=stock_data['open'],
-                    close_price=stock_data['close'],
-                    high_price=stock_data['high'],
-                    low_price=stock_data['low'],
-                    volume=stock_data['volume']
-                )
-                db.session.add(new_data)
+            row = existing.get(symbol)
+            if row is None:
+                row = StockData(symbol=symbol, date=target_date)
+                db.session.add(row)
+            row.open_price = stock_data['open']
+            row.close_price = stock_data['close']
+            row.high_price = stock_data['high']
+            row.low_price = stock_data['low']
+            row.volume = stock_data['volume']
+            row.last_updated = datetime.utcnow()
             
+            results[symbol] = stock_data
+            updated.append(symbol)
+        
+        if updated:
             db.session.commit()
-            logging.info(f"Retrieved daily stock data for {STOCK_SYMBOL} on {target_date}")
-            return stock_data
-        else:
-            logging.warning(f"No stock data found for {STOCK_SYMBOL} on {target_date}")
-            return None
+            for symbol in updated:
+                refresh_change_summary(symbol=symbol)
+            logging.info(f"Retrieved daily stock data for {updated} on {target_date}")
+        return results
             
     except Exception as e:
-        logging.error(f"Error fetching daily stock data for {STOCK_SYMBOL} on {target_date}: {e}")
+        logging.error(f"Error fetching daily stock data for {symbols} on {target_date}: {e}")
+        db.session.rollback()
+        return results
+
+# In-memory change summaries per symbol: the persisted closes ('base') plus
+# the derived percentages for the latest quote. Each entry is replaced
+# wholesale, never mutated.
+_summary_lock = threading.Lock()
+_summaries = {}
+_summary_loaded_at = {}
+
+def _eastern_today():
+    return datetime.now(pytz.timezone('US/Eastern')).date()
+
+def _percent_change(price, reference):
+    if price is None or not reference:
         return None
+    return ((price - reference) / reference) * 100
+
+def _build_summary(base, price):
+    """Combine persisted closes with the latest quote (pure arithmetic, no DB)"""
+    # After the close, compare today's official close; otherwise the live quote
+    current = base['today_close'] if base['today_close'] else price
+    if current is None:
+        current = base['current_price']
+    return dict(
+        base,
+        current_price=price if price is not None else base['current_price'],
+        daily_change_percent=_percent_change(current, base['yesterday_close']),
+        weekly_change_percent=_percent_change(current, base['week_ago_close']),
+    )
+
+def _summary_from_row(row):
+    return {
+        'symbol': row.symbol,
+        'as_of': row.as_of,
+        'current_price': row.current_price,
+        'today_close': row.today_close,
+        'yesterday_close': row.yesterday_close,
+        'week_ago_close': row.week_ago_close,
+        'daily_change_percent': row.daily_change_percent,
+        'weekly_change_percent': row.weekly_change_percent,
+    }
+
+def _set_summary(symbol, summary, loaded=True):
+    with _summary_lock:
+        _summaries[symbol] = summary
+        if loaded:
+            _summary_loaded_at[symbol] = time.monotonic()
+
+def refresh_change_summary(price=None, symbol=None):
+    """
+    Recompute the change summary for symbol from stored bars and persist it
+    Called when new bars are written; requires an app context
+    """
+    symbol = symbol or STOCK_SYMBOL
+    today = _eastern_today()
+    try:
+        # Reference sessions come from the trading calendar: on a session day
+        # "yesterday" is the previous session; on a weekend or holiday it is
+        # the last session, and the week-ago close is seven sessions back
+        calendar = get_calendar(today)
+        if calendar.is_session(today):
+            yesterday = calendar.sessions_back(today, 1)
+            week_ago = calendar.sessions_back(today, 7)
+        else:
+            yesterday = calendar.sessions_back(today, 0)
+            week_ago = calendar.sessions_back(today, 6)
+
+        # One query for the three bars
+        bars = {
+            bar.date: bar for bar in StockData.query.filter(
+                StockData.symbol == symbol,
+                StockData.date.in_([today, yesterday, week_ago])
+            )
+        }
+        today_bar = bars.get(today)
+
+        if price is None:
+            cached = _summaries.get(symbol)
+            price = cached['current_price'] if cached else None
+
+        base = {
+            'symbol': symbol,
+            'as_of': today,
+            'current_price': price,
+            'today_close': today_bar.close_price if today_bar and not is_market_open() else None,
+            'yesterday_close': bars[yesterday].close_price if yesterday in bars else None,
+            'week_ago_close': bars[week_ago].close_price if week_ago in bars else None,
+        }
+        summary = _build_summary(base, price)
+
+        row = StockSummary.query.filter_by(symbol=symbol).first()
+        if row is None:
+            row = StockSummary(symbol=symbol)
+            db.session.add(row)
+        for key, value in summary.items():
+            setattr(row, key, value)
+        row.computed_at = datetime.utcnow()
+        db.session.commit()
+
+        _set_summary(symbol, summary)
+        logging.info(f"Change summary refreshed for {symbol}: "
+                     f"daily={summary['daily_change_percent']} weekly={summary['weekly_change_percent']}")
+        return summary
+
+    except Exception as e:
+        logging.error(f"Error refreshing change summary for {symbol}: {e}")
+        db.session.rollback()
+        return _summaries.get(symbol)
+
+def _on_quote_update(symbol, price):
+    """
+    Quote cache listener: re-derive percentages for the new price in memory
+    and check the symbol's price alerts
+    """
+    from alerts import get_alert_engine
+
+    summary = _summaries.get(symbol)
+    if summary is not None:
+        _set_summary(symbol, _build_summary(summary, price), loaded=False)
+    get_alert_engine().on_quote(symbol, price, summary.get('yesterday_close') if summary else None)
+
+def get_change_summary(symbol=None):
+    """
+    Return the daily/weekly change summary for symbol (default: the primary symbol)
+    Served from memory; touches the DB only on a cold process, when the
+    trading date rolls over, or every CHANGE_SUMMARY_MAX_AGE seconds
+    """
+    symbol = symbol or STOCK_SYMBOL
+    price = get_current_stock_price(symbol=symbol)
+
+    summary = _summaries.get(symbol)
+    loaded_at = _summary_loaded_at.get(symbol)
+    stale = loaded_at is None or time.monotonic() - loaded_at > CHANGE_SUMMARY_MAX_AGE
+
+    if summary is None or stale or summary['as_of'] != _eastern_today():
+        row = StockSummary.query.filter_by(symbol=symbol).first()
+        if row is not None and row.as_of == _eastern_today():
+            _set_summary(symbol, _build_summary(_summary_from_row(row), price))
+        else:
+            refresh_change_summary(price, symbol=symbol)
+        summary = _summaries.get(symbol)
+    elif price is not None and price != summary['current_price']:
+        summary = _build_summary(summary, price)
+        _set_summary(symbol, summary, loaded=False)
+
+    return summary
+
+def get_change_summaries(symbols=None):
+    """Change summaries for several symbols (default: all watched), quotes fetched in one batch"""
+    symbols = list(symbols or WATCHED_SYMBOLS)
+    get_current_prices(symbols)
+    return [summary for summary in (get_change_summary(symbol) for symbol in symbols) if summary]
+
+def parse_market_time(value, default=None):
+    """Parse an 'HH:MM' setting into a time; default if missing or malformed"""
+    try:
+        return datetime.strptime((value or '').strip(), '%H:%M').time()
+    except ValueError:
+        if default is None:
+            raise
+        logging.warning(f"Ignoring invalid market time {value!r}, using {default:%H:%M}")
+        return default
+
+_market_hours_lock = threading.Lock()
+_market_hours = (REGULAR_OPEN, REGULAR_CLOSE)
+_market_hours_loaded_at = None
+
+def load_market_hours():
+    """Re-read (open, close) from Settings and cache it; needs an app context"""
+    global _market_hours, _market_hours_loaded_at
+    settings = Settings.get_cached()
+    hours = (
+        parse_market_time(settings.market_open_time, REGULAR_OPEN),
+        parse_market_time(settings.market_close_time, REGULAR_CLOSE),
+    )
+    with _market_hours_lock:
+        if hours != _market_hours:
+            logging.info(f"Market hours set to {hours[0]:%H:%M}-{hours[1]:%H:%M} ET")
+        _market_hours = hours
+        _market_hours_loaded_at = time.monotonic()
+    return hours
+
+def get_market_hours():
+    """
+    Configured (open, close) times in US/Eastern
+    Served from memory; re-read from Settings at most every
+    MARKET_HOURS_SYNC_INTERVAL seconds, and only inside an app context
+    """
+    loaded_at = _market_hours_loaded_at
+    if (loaded_at is None or time.monotonic() - loaded_at > MARKET_HOURS_SYNC_INTERVAL) and has_app_context():
+        try:
+            return load_market_hours()
+        except Exception as e:
+            logging.error(f"Error loading market hours: {e}")
+    return _market_hours
 
 def is_market_open():
     """
     Check if the market is currently open
-    Simplified check - assumes market is open Mon-Fri 9:30-16:00 EST
+    Uses the trading calendar and the configured market hours: closed on
+    weekends and exchange holidays, 13:00 close on early-close days
     """
     try:
         # Get current time in Eastern timezone
         eastern = pytz.timezone('US/Eastern')
         now = datetime.now(eastern)
         
-        # Check if it's a weekday (0=Monday, 6=Sunday)
-        if now.weekday() >= 5:  # Saturday or Sunday
-            return False
-        
-        # Check time in Eastern timezone
-        current_time = now.time()
-        market_open = datetime.strptime("09:30", "%H:%M").time()
-        market_close = datetime.strptime("16:00", "%H:%M").time()
-        
-        return market_open <= current_time <= market_close
+        open_time, close_time = get_market_hours()
+        return get_calendar(now.date()).is_open(now, open_time, close_time)
         
     except Exception as e:
         logging.error(f"Error checking market status: {e}")
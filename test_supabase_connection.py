@@ -38,8 +38,10 @@ def test_supabase_connection():
     
     # Test connection
     try:
-        from app import app, db
+        # The database may be empty: skip the startup schema check, the tables are created below
+        from app import create_app, db
         from models import User, Settings, NotificationLog, StockData
+        app = create_app(check_schema=False)
         
         with app.app_context():
             print("🔄 Testing database connection...")
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Configure the process-wide app before anything imports it: a scratch
+# SQLite database, no scheduler and no real Twilio account. Empty values
+# keep load_dotenv() from pulling a real database in from .env.
+_scratch = tempfile.mkdtemp(prefix='crwv_tests_')
+os.environ.update({
+    'DATABASE_URL': '',
+    'DB_HOST': '',
+    'DATABASE_PATH': os.path.join(_scratch, 'test.db'),
+    'SCHEDULER_ENABLED': '0',
+    'AUTO_UPGRADE_SCHEMA': '0',
+    'NOTIFICATION_LOG_SPOOL_DIR': os.path.join(_scratch, 'spool'),
+    'TWILIO_ACCOUNT_SID': 'ACtest',
+    'TWILIO_AUTH_TOKEN': 'test',
+    'TWILIO_PHONE_NUMBER': '+15550000000',
+    'TWILIO_PHONE_NUMBERS': '',
+    'TWILIO_MESSAGING_SERVICE_SID': '',
+    'SMS_RATE_LIMIT_PER_SECOND': '0',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Built before the test modules are collected, since some of the modules
+# they import do `from app import app`
+from app import create_app  # noqa: E402
+_app = create_app(upgrade_schema=True)
+
+@pytest.fixture(scope='session')
+def app():
+    return _app
+
+@pytest.fixture
+def db(app):
+    """The app's database inside an app context, emptied of queue, log and bucket rows"""
+    from app import db
+    from models import NotificationOutbox, NotificationLog, SmsSenderBucket
+
+    with app.app_context():
+        for model in (NotificationOutbox, NotificationLog, SmsSenderBucket):
+            db.session.query(model).delete()
+        db.session.commit()
+        yield db
+        db.session.rollback()
@@ -0,0 +1,48 @@
+import time
+import pytest
+from intraday import IntradaySampler
+from models import IntradayBar
+
+SYMBOL = 'CRWV'
+
+@pytest.fixture
+def workers(db):
+    """Two processes' samplers, each with its own ticks for the same minutes"""
+    db.session.query(IntradayBar).delete()
+    db.session.commit()
+    start = (time.time() // 60 - 10) * 60
+    first, second = IntradaySampler([SYMBOL]), IntradaySampler([SYMBOL])
+    for offset in range(0, 300, 15):
+        first.rings[SYMBOL].append(start + offset, 100.0 + offset)
+        second.rings[SYMBOL].append(start + offset + 7, 100.0 + offset)
+    # Only the leader compacts
+    assert first.compact() == 5
+    yield start, first, second
+    db.session.query(IntradayBar).delete()
+    db.session.commit()
+
+def test_since_polls_agree_across_workers(workers):
+    start, first, second = workers
+
+    snapshot = first.series(SYMBOL)
+    assert len(snapshot['points']) == 20
+    assert snapshot['cursor'] == start + 240
+
+    # The next poll may reach either worker; both answer from intraday_bar
+    cursor = start + 120
+    polls = [sampler.stored_series(SYMBOL, cursor) for sampler in (first, second)]
+    assert polls[0] == polls[1]
+    assert [point[0] for point in polls[0]['points']] == [start + 180, start + 240]
+    assert polls[0]['cursor'] == start + 240
+
+    # Nothing newer yet: the cursor stays put
+    caught_up = second.stored_series(SYMBOL, polls[0]['cursor'], resolution='minute')
+    assert caught_up['points'] == [] and caught_up['cursor'] == start + 240
+
+def test_minute_bars_from_the_table(workers):
+    start, first, second = workers
+
+    bars = second.stored_series(SYMBOL, start - 1, resolution='minute')['points']
+
+    assert [bar['t'] for bar in bars] == [start + 60 * i for i in range(5)]
+    assert bars[0] == {'t': start, 'open': 100.0, 'high': 145.0, 'low': 100.0, 'close': 145.0, 'samples': 4}
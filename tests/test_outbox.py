@@ -0,0 +1,88 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+import outbox
+import sms_service
+from models import NotificationOutbox
+from sms_service import SmsHttpError, send_with_retry
+
+NUMBERS = [f'+1555100{i:04d}' for i in range(6)]
+
+@pytest.fixture
+def queued(db):
+    outbox.enqueue_notifications(NUMBERS, 'open', 100.0, key='open:test')
+    return db
+
+def _rows(db):
+    return {row.phone_number: row for row in db.session.query(NotificationOutbox)}
+
+def test_claims_are_disjoint_and_expired_leases_return(queued):
+    first = outbox.claim_batch('worker-a', batch_size=4, lease_seconds=60)
+    second = outbox.claim_batch('worker-b', batch_size=4, lease_seconds=60)
+
+    assert len(first) == 4 and len(second) == 2
+    assert not {row.id for row in first} & {row.id for row in second}
+    assert outbox.claim_batch('worker-c') == []
+
+    # worker-a dies: its lease runs out and the rows go back to the queue
+    queued.session.query(NotificationOutbox).filter_by(lease_owner='worker-a').update(
+        {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}
+    )
+    queued.session.commit()
+    assert outbox.reclaim_expired_leases() == 4
+    assert {row.id for row in outbox.claim_batch('worker-c')} == {row.id for row in first}
+
+def test_enqueue_skips_recipients_already_queued(queued, monkeypatch):
+    """Only new rows are counted, including across chunks"""
+    monkeypatch.setattr(outbox, 'OUTBOX_ENQUEUE_CHUNK', 2)
+    report = outbox.enqueue_notifications(NUMBERS[:3] + ['+15551009999'], 'open', 100.0, key='open:test')
+    assert report == {'total': 4, 'enqueued': 1}
+    assert queued.session.query(NotificationOutbox).count() == len(NUMBERS) + 1
+
+def test_send_past_deadline_is_not_attempted(db, monkeypatch):
+    calls = []
+    monkeypatch.setattr(sms_service, 'send_twilio_message', lambda *args: calls.append(args) or 'SM1')
+
+    result = send_with_retry(NUMBERS[0], 'hi', deadline=time.monotonic() - 1)
+
+    assert calls == []
+    assert result['attempts'] == 0 and result['retryable'] and result['error']
+
+def test_throttled_send_stops_at_deadline(db, monkeypatch):
+    def throttled(*args):
+        raise SmsHttpError(429, 'Too Many Requests')
+    monkeypatch.setattr(sms_service, 'send_twilio_message', throttled)
+
+    started = time.monotonic()
+    result = send_with_retry(NUMBERS[0], 'hi', deadline=started + 1)
+
+    assert time.monotonic() - started < 2
+    assert result['attempts'] >= 1 and result['throttled'] == result['attempts']
+    assert result['retryable'] and result['message_sid'] is None
+
+def test_batch_finishes_inside_its_lease(queued, monkeypatch):
+    """Throttled and untried rows go back to pending; only tried ones use an attempt"""
+    def send(to, message, sender=None):
+        if to == NUMBERS[0]:
+            return 'SMok'
+        if to == NUMBERS[1]:
+            time.sleep(0.3)  # A slow 429 that runs past the deadline
+            raise SmsHttpError(429, 'Too Many Requests')
+        raise AssertionError(f"{to} sent after the deadline")
+    monkeypatch.setattr(sms_service, 'send_twilio_message', send)
+    monkeypatch.setattr(outbox, 'OUTBOX_LEASE_MARGIN', 0.5)
+
+    worker = outbox.OutboxWorker(batch_size=10, lease_seconds=1.5, concurrency=1)
+    rows = outbox.claim_batch(worker.identity, worker.batch_size, worker.lease_seconds)
+    started = time.monotonic()
+    # Claimed 0.8s ago: the send deadline is 0.2s away
+    worker.deliver(rows, claimed_at=started - 0.8)
+    worker._executor.shutdown()
+    assert time.monotonic() - started < worker.lease_seconds
+
+    rows = _rows(queued)
+    assert (rows[NUMBERS[0]].status, rows[NUMBERS[0]].message_sid) == ('sent', 'SMok')
+    assert (rows[NUMBERS[1]].status, rows[NUMBERS[1]].attempts) == ('pending', 1)
+    assert 'HTTP 429' in rows[NUMBERS[1]].last_error
+    untried = [rows[number] for number in NUMBERS[2:]]
+    assert all(row.status == 'pending' and row.attempts == 0 and row.lease_owner is None for row in untried)
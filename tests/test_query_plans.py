@@ -0,0 +1,5 @@
+from check_query_plans import check_query_plans
+
+def test_hot_queries_are_index_backed(db):
+    """No hot query may fall back to a full scan or an explicit sort"""
+    assert check_query_plans() == []
@@ -0,0 +1,114 @@
+import threading
+import time
+from models import SmsSenderBucket
+from sms_limits import SenderTokenBucket, AimdConcurrency
+
+SENDER = '+15557770000'
+
+def test_processes_share_one_bucket(db):
+    """Two processes' buckets for one sender draw from the same row"""
+    first = SenderTokenBucket(SENDER, rate=0.5, burst=4, lease_seconds=4)
+    second = SenderTokenBucket(SENDER, rate=0.5, burst=4, lease_seconds=4)
+    assert first.lease_size == second.lease_size == 2
+
+    assert first._lease() == 0.0 and first._reserve == 2
+    assert second._lease() == 0.0 and second._reserve == 2
+    for bucket in (first, second):
+        assert bucket._take() and bucket._take() and not bucket._take()
+    # The shared burst is spent: neither may lease again until it refills
+    assert first._lease() > 1.0
+    assert second._lease() > 1.0
+
+    row = db.session.get(SmsSenderBucket, SENDER)
+    assert row.tokens < 1 and row.version == 1
+
+def test_compare_and_swap_rejects_stale_versions(db):
+    """A lease computed from an outdated row must not be granted"""
+    bucket = SenderTokenBucket(SENDER, rate=1, burst=10, lease_seconds=2)
+    assert bucket._lease_shared(2) == (2, 0.0)  # Creates the row
+
+    real_refill = bucket._refill
+    def refill_racing_another_process(tokens, refilled_at, now):
+        # Another process commits its lease between our SELECT and UPDATE
+        if not racing:
+            racing.append(True)
+            db.session.execute(SmsSenderBucket.__table__.update().values(
+                tokens=0.0, version=SmsSenderBucket.__table__.c.version + 1
+            ))
+            db.session.commit()
+        return real_refill(tokens, refilled_at, now)
+
+    racing = []
+    bucket._refill = refill_racing_another_process
+    granted, wait = bucket._lease_shared(2)
+
+    # The stale UPDATE matched no row; the retry saw the emptied bucket
+    assert granted == 0 and wait > 0
+    row = db.session.get(SmsSenderBucket, SENDER)
+    assert row.version == 1 and row.tokens == 0.0
+
+def test_shared_rate_holds_under_contention(db, caplog):
+    """Threads on two buckets never send faster than burst + rate * elapsed"""
+    rate, burst = 20, 5
+    buckets = [SenderTokenBucket(SENDER, rate=rate, burst=burst, lease_seconds=0.1) for _ in range(2)]
+    sent = []
+    stop = time.monotonic() + 1.0
+
+    def send(bucket):
+        while time.monotonic() < stop:
+            if bucket.acquire(deadline=stop):
+                sent.append(time.monotonic())
+
+    threads = [threading.Thread(target=send, args=(bucket,)) for bucket in buckets for _ in range(3)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.monotonic() - started
+    assert len(sent) <= burst + rate * elapsed + 1
+    assert len(sent) >= rate * elapsed / 2
+    # Every lease went through the shared row, none fell back to a local bucket
+    assert 'limiting locally' not in caplog.text
+    assert db.session.get(SmsSenderBucket, SENDER).version > 0
+
+def test_penalize_empties_the_shared_bucket(db):
+    first = SenderTokenBucket(SENDER, rate=1, burst=10, lease_seconds=1)
+    second = SenderTokenBucket(SENDER, rate=1, burst=10, lease_seconds=1)
+    assert first._lease() == 0.0
+
+    first.penalize()
+
+    assert first._reserve == 0
+    assert second._lease() > 0.5
+
+def test_aimd_slow_start_then_halves_once_per_burst():
+    limit = AimdConcurrency(64, minimum=1, initial=4)
+
+    for _ in range(4):
+        assert limit.enter()
+        limit.leave(time.monotonic(), latency=0.05)
+    assert limit.limit == 8  # Slow start: +1 per success
+
+    # A burst of 429s from sends that all started before the first decrease
+    started = time.monotonic()
+    for _ in range(4):
+        limit.enter()
+    for _ in range(4):
+        limit.leave(started, throttled=True)
+    assert limit.limit == 4 and limit.decreases == 1
+
+    # After a decrease, growth is additive: about +1 per window
+    for _ in range(4):
+        limit.enter()
+        limit.leave(time.monotonic(), latency=0.05)
+    assert 4.9 < limit.limit < 5.1
+
+def test_aimd_enter_gives_up_at_deadline():
+    limit = AimdConcurrency(1, minimum=1, initial=1)
+    assert limit.enter()
+
+    started = time.monotonic()
+    assert limit.enter(deadline=started + 0.2) is False
+    assert 0.15 < time.monotonic() - started < 1.0
@@ -0,0 +1,46 @@
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+from models import User, Subscription
+
+@pytest.fixture
+def user(db, app):
+    user = User(name='Settings Test', phone_number='+15552220000', password_hash=generate_password_hash('original'))
+    db.session.add(user)
+    db.session.commit()
+    yield user
+    db.session.rollback()
+    db.session.query(Subscription).filter_by(user_id=user.id).delete()
+    db.session.query(User).filter_by(id=user.id).delete()
+    db.session.commit()
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_authenticated'] = {str(user.id): True}
+    return client
+
+def test_saving_settings_leaves_the_password_alone(db, user, client):
+    response = client.post(f'/user/settings/{user.id}', data={
+        'name': 'Renamed', 'phone_number': user.phone_number, 'notifications_active': 'on',
+    })
+    assert response.status_code == 302
+    db.session.refresh(user)
+    assert user.name == 'Renamed' and check_password_hash(user.password_hash, 'original')
+    assert user.subscription.is_active and not user.subscription.notify_open
+
+def test_empty_password_is_rejected(db, user, client):
+    response = client.post(f'/user/settings/{user.id}/password', data={'new_password': '', 'confirm_password': ''},
+                           follow_redirects=True)
+    assert b'Password cannot be empty.' in response.data
+    db.session.refresh(user)
+    assert check_password_hash(user.password_hash, 'original')
+
+def test_password_change(db, user, client):
+    client.post(f'/user/settings/{user.id}/password', data={'new_password': 'changed', 'confirm_password': 'nope'})
+    db.session.refresh(user)
+    assert check_password_hash(user.password_hash, 'original')
+
+    client.post(f'/user/settings/{user.id}/password', data={'new_password': 'changed', 'confirm_password': 'changed'})
+    db.session.refresh(user)
+    assert check_password_hash(user.password_hash, 'changed')
@@ -0,0 +1,221 @@
+import os
+import threading
+from array import array
+from datetime import date, datetime, time, timedelta
+import pytz
+
+EASTERN = pytz.timezone('US/Eastern')
+
+# Regular and early-close session hours (US/Eastern)
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# Years of sessions precomputed around the current year
+TRADING_CALENDAR_YEARS_BACK = int(os.environ.get("TRADING_CALENDAR_YEARS_BACK", "10"))
+TRADING_CALENDAR_YEARS_AHEAD = int(os.environ.get("TRADING_CALENDAR_YEARS_AHEAD", "5"))
+
+# Unscheduled closures that no rule predicts
+SPECIAL_CLOSURES = {
+    date(2012, 10, 29): "Hurricane Sandy",
+    date(2012, 10, 30): "Hurricane Sandy",
+    date(2018, 12, 5): "National Day of Mourning (George H. W. Bush)",
+    date(2025, 1, 9): "National Day of Mourning (Jimmy Carter)",
+}
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th weekday (0=Monday) of a month; n=-1 for the last one"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(day):
+    """Saturday holidays are observed Friday, Sunday holidays Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+def nyse_holidays(year):
+    """Full-day NYSE closures for a year: {date: name}"""
+    holidays = {}
+
+    # New Year's Day: a Saturday New Year is not observed on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() == 6:
+        holidays[new_year + timedelta(days=1)] = "New Year's Day"
+    elif new_year.weekday() < 5:
+        holidays[new_year] = "New Year's Day"
+
+    if year >= 1998:
+        holidays[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    holidays[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    holidays[_easter(year) - timedelta(days=2)] = "Good Friday"
+    holidays[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        holidays[_observed(date(year, 6, 19))] = "Juneteenth"
+    holidays[_observed(date(year, 7, 4))] = "Independence Day"
+    holidays[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    holidays[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    holidays[_observed(date(year, 12, 25))] = "Christmas Day"
+    holidays.update({day: name for day, name in SPECIAL_CLOSURES.items() if day.year == year})
+    return holidays
+
+def nyse_early_closes(year, holidays):
+    """13:00 closes: July 3, the day after Thanksgiving and Christmas Eve"""
+    early = set()
+    july_3 = date(year, 7, 3)
+    if july_3.weekday() < 4 and july_3 not in holidays:
+        early.add(july_3)
+    early.add(_nth_weekday(year, 11, 3, 4) + timedelta(days=1))
+    christmas_eve = date(year, 12, 24)
+    if christmas_eve.weekday() < 5 and christmas_eve not in holidays:
+        early.add(christmas_eve)
+    return early
+
+class TradingCalendar:
+    """
+    Precomputed NYSE sessions for [start_year, end_year]. Besides the sorted
+    session list, every calendar day in the window stores the index of the
+    last session on or before it, so previous/next session and "N sessions
+    back" are array lookups rather than weekday loops.
+    """
+
+    def __init__(self, start_year, end_year):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.first_day = date(start_year, 1, 1)
+        self.last_day = date(end_year, 12, 31)
+
+        self.holidays = {}
+        self.early_closes = set()
+        for year in range(start_year, end_year + 1):
+            year_holidays = nyse_holidays(year)
+            self.holidays.update(year_holidays)
+            self.early_closes |= nyse_early_closes(year, year_holidays)
+
+        self.sessions = []
+        self._session_index = {}
+        # _last_on_or_before[day offset] = index into sessions (-1 if none yet)
+        self._last_on_or_before = array('i')
+
+        day = self.first_day
+        while day <= self.last_day:
+            if day.weekday() < 5 and day not in self.holidays:
+                self._session_index[day] = len(self.sessions)
+                self.sessions.append(day)
+            self._last_on_or_before.append(len(self.sessions) - 1)
+            day += timedelta(days=1)
+
+    def _offset(self, day):
+        if not self.first_day <= day <= self.last_day:
+            raise ValueError(f"{day} is outside the trading calendar window "
+                             f"({self.start_year}-{self.end_year})")
+        return day.toordinal() - self.first_day.toordinal()
+
+    def covers(self, day):
+        return self.first_day <= day <= self.last_day
+
+    def is_session(self, day):
+        """True if the exchange trades on this date"""
+        return day in self._session_index
+
+    def is_early_close(self, day):
+        return day in self.early_closes
+
+    def holiday_name(self, day):
+        return self.holidays.get(day)
+
+    def session_close(self, day):
+        """Closing time for a session date (13:00 on early-close days)"""
+        return EARLY_CLOSE if day in self.early_closes else REGULAR_CLOSE
+
+    def last_session_on_or_before(self, day):
+        index = self._last_on_or_before[self._offset(day)]
+        if index < 0:
+            raise ValueError(f"No session on or before {day} in the calendar window")
+        return self.sessions[index]
+
+    def previous_session(self, day):
+        """Last session strictly before day"""
+        return self.last_session_on_or_before(day - timedelta(days=1))
+
+    def next_session(self, day):
+        """First session strictly after day"""
+        index = self._last_on_or_before[self._offset(day)] + 1
+        if index >= len(self.sessions):
+            raise ValueError(f"No session after {day} in the calendar window")
+        return self.sessions[index]
+
+    def sessions_back(self, day, n):
+        """The session n sessions before the last session on or before day (n=0: that session)"""
+        index = self._last_on_or_before[self._offset(day)] - n
+        if index < 0:
+            raise ValueError(f"Fewer than {n} sessions before {day} in the calendar window")
+        return self.sessions[index]
+
+    def is_open(self, now, open_time=REGULAR_OPEN, close_time=None):
+        """True while the market is in session at an Eastern datetime"""
+        today = now.date()
+        if not self.is_session(today):
+            return False
+        close_time = close_time or REGULAR_CLOSE
+        if today in self.early_closes:
+            close_time = min(close_time, EARLY_CLOSE)
+        return open_time <= now.time() < close_time
+
+    def next_open(self, now, open_time=REGULAR_OPEN):
+        """Next session open strictly after an Eastern datetime"""
+        today = now.date()
+        if self.is_session(today) and now.time() < open_time:
+            day = today
+        else:
+            day = self.next_session(today)
+        return EASTERN.localize(datetime.combine(day, open_time))
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+def get_calendar(day=None):
+    """Return the process-wide calendar, rebuilding it if day falls outside the window"""
+    global _calendar
+    day = day or datetime.now(EASTERN).date()
+    calendar = _calendar
+    if calendar is None or not calendar.covers(day):
+        with _calendar_lock:
+            calendar = _calendar
+            if calendar is None or not calendar.covers(day):
+                year = datetime.now(EASTERN).year
+                calendar = TradingCalendar(
+                    min(year, day.year) - TRADING_CALENDAR_YEARS_BACK,
+                    max(year, day.year) + TRADING_CALENDAR_YEARS_AHEAD
+                )
+                _calendar = calendar
+    return calendar
+
+def is_trading_day(day=None):
+    """True if day (default: today in New York) is an exchange session"""
+    day = day or datetime.now(EASTERN).date()
+    return get_calendar(day).is_session(day)
+
+def next_market_open(now=None, open_time=REGULAR_OPEN):
+    """Next session open after now (an Eastern datetime, default: current time)"""
+    now = now or datetime.now(EASTERN)
+    return get_calendar(now.date()).next_open(now, open_time)
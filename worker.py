@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Notification delivery worker. Drains the notification outbox that the
+scheduler fills when NOTIFICATION_DELIVERY=outbox. Run as many as needed;
+each claims its own batches, so delivery throughput scales with workers
+independently of the web tier.
+
+    python worker.py                 # poll until SIGTERM/SIGINT
+    python worker.py --once          # drain the queue and exit
+    python worker.py --batch-size 200 --concurrency 16
+    python worker.py --async --concurrency 1000   # one event loop, pooled HTTP/2
+"""
+
+import os
+import sys
+import signal
+import logging
+import argparse
+import threading
+
+# Workers only deliver; the web processes run the scheduler
+os.environ.setdefault("SCHEDULER_ENABLED", "0")
+
+from app import app
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued SMS notifications")
+    parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--concurrency', type=int, default=None)
+    parser.add_argument('--poll-interval', type=float, default=None)
+    parser.add_argument('--async', action='store_true', dest='async_mode',
+                        default=os.environ.get("OUTBOX_ASYNC", "0") != "0",
+                        help='Send from one asyncio event loop (see async_pipeline.py)')
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logging.info(f"Received signal {signum}, finishing current batch")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    if args.async_mode:
+        import asyncio
+        from async_pipeline import AsyncOutboxWorker
+
+        worker = AsyncOutboxWorker(
+            app,
+            batch_size=args.batch_size,
+            poll_interval=args.poll_interval,
+            concurrency=args.concurrency,
+        )
+        asyncio.run(worker.run(stop_event=stop_event, once=args.once))
+        totals = worker.worker
+        print(f"Delivered {totals.sent}, failed {totals.failed}, requeued {totals.requeued}")
+        return
+
+    with app.app_context():
+        from outbox import OutboxWorker
+
+        worker = OutboxWorker(
+            batch_size=args.batch_size,
+            poll_interval=args.poll_interval,
+            concurrency=args.concurrency,
+        )
+        worker.run(stop_event=stop_event, once=args.once)
+        print(f"Delivered {worker.sent}, failed {worker.failed}, requeued {worker.requeued}")
+
+if __name__ == "__main__":
+    main()
+    sys.exit(0)